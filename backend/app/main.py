@@ -2,23 +2,43 @@
 from dotenv import load_dotenv
 import base64
 import cv2
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from .services.s3_service import S3Service
 from .services.analysis_service import AnalysisService
+from .services.video_service import VideoJobService
+from .services.model_router import model_router
+from .services.rate_limiter import LANE_LIVE, priority_lane
+from .utils.executors import PoolSaturatedError, io_pool
+from .utils.metrics import REGISTRY, Counter, Histogram
+import logging
 import tempfile
+import time
 import os
 import cv2
 import base64
-import boto3
 from typing import Dict
 from botocore.exceptions import ClientError
 import requests
+import asyncio
+import json
 
 # Load environment variables
 load_dotenv()
 VAPI_AUTH_TOKEN = os.getenv('VAPI_AUTH_TOKEN')
 VAPI_PHONE_NUMBER_ID = os.getenv('VAPI_PHONE_NUMBER_ID')
+# DEBUG adds per-frame lines and timing spans (logger "app.spans"); above it neither is formatted
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+
+logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logger = logging.getLogger(__name__)
+
+HTTP_REQUESTS = Counter('http_requests_total', 'HTTP requests by route and status', ('method', 'route', 'status'))
+HTTP_REQUEST_SECONDS = Histogram(
+    'http_request_seconds', 'Time to response headers by route', ('method', 'route')
+)
 
 
 app = FastAPI()
@@ -32,36 +52,68 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # The route template, not the raw path, so ids do not multiply the series
+        route = request.scope.get("route")
+        path = getattr(route, "path", "unmatched")
+        HTTP_REQUESTS.inc(method=request.method, route=path, status=status)
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, method=request.method, route=path)
+
+@app.exception_handler(PoolSaturatedError)
+async def pool_saturated_handler(request: Request, exc: PoolSaturatedError):
+    # Shed load instead of queueing without bound
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
 # Initialize services
 try:
     s3_service = S3Service()
     analysis_service = AnalysisService()
 except ValueError as e:
-    print(f"Error initializing S3 service: {str(e)}")
+    logger.error("Error initializing S3 service: %s", e)
     raise
 
-client = boto3.client(
-    service_name="bedrock-runtime",
-    aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID1"),
-    aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY1"),
-    region_name="us-west-2",
-)
-
-from .services.dynamodb_service import DynamoDBService
+from .services.dynamodb_service import DynamoDBService, INCIDENT_PAGE_SIZE
 
 # Initialize DynamoDB service
 dynamodb_service = DynamoDBService()
 
+# Background video processing jobs
+video_job_service = VideoJobService(s3_service, analysis_service)
+
+@app.on_event("startup")
+def start_background_workers():
+    video_job_service.start()
+    dynamodb_service.start()
+
+@app.on_event("shutdown")
+def flush_incident_writes():
+    dynamodb_service.close()
+
 @app.post("/api/save-incident")
 async def save_incident(incident_data: Dict):
     try:
-        response = dynamodb_service.save_incident(incident_data)
+        response = await io_pool.run(dynamodb_service.save_incident, incident_data)
         return {
             "status": "success",
-            "message": "Incident details saved successfully"
+            "message": "Incident details saved successfully",
+            "incidentId": response["incident_id"]
         }
+    except PoolSaturatedError:
+        raise
     except Exception as e:
-        print(f"Error saving incident: {str(e)}")
+        logger.error("Error saving incident: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 @app.post("/api/get-upload-url")
 async def get_upload_url(file_info: dict):
@@ -80,7 +132,7 @@ async def get_upload_url(file_info: dict):
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        print(f"Error in get_upload_url: {str(e)}")
+        logger.error("Error in get_upload_url: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/process-video")
@@ -88,42 +140,94 @@ async def process_video(video_info: dict):
     try:
         video_key = video_info['videoKey']
         
-        print(f"Starting processing for video: {video_key}")
-        
-        # Create temporary file for video processing
-        with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as temp_file:
-            try:
-                print("Downloading video from S3...")
-                # Download video from S3
-                s3_service.download_video(video_key, temp_file.name)
-                
-                print("Processing video...")
-                # Use the new process_video method that handles everything
-                result = analysis_service.process_video(temp_file.name)
-                
-                print("Processing complete!")
-                print("API Response:", result)  # Debug log
-                
-                return {
-                    "status": "success",
-                    "frames": result["frames"],
-                    "report": result["report"],
-                    "analysis": result["analysis"],  # Add this line
-                    "keywords": result["keywords"],
-                    "frame_count": len(result["frames"])
-                }
-            
-            finally:
-                # Clean up temporary file
-                try:
-                    os.unlink(temp_file.name)
-                except Exception as e:
-                    print(f"Error deleting temporary file: {str(e)}")
-                
+        logger.info("Starting processing for video: %s", video_key)
+
+        # Fetch and Bedrock calls run on the I/O pool, decoding on the CPU pool
+        result = await io_pool.run(video_job_service.process_video, video_key)
+
+        logger.info("Processing complete for video: %s", video_key)
+        return {"status": "success", **result}
+
+    except PoolSaturatedError:
+        raise
     except Exception as e:
-        print(f"Error in process_video: {str(e)}")
+        logger.error("Error in process_video: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
-    
+
+@app.get("/api/process-video/stream")
+async def process_video_stream(videoKey: str):
+    """Server-sent events version of /api/process-video.
+
+    Streams frame thumbnails as they are decoded, per-frame observations as
+    each model call returns, the comprehensive analysis as it is generated,
+    and finally the same payload /api/process-video returns.
+    """
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+
+    def emit(event, data):
+        loop.call_soon_threadsafe(events.put_nowait, (event, data))
+
+    # Raises PoolSaturatedError (503) before any bytes are sent if the pool is full
+    io_pool.submit(video_job_service.stream_video, videoKey, emit)
+
+    async def event_stream():
+        while True:
+            event, data = await events.get()
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+            if event in ("complete", "error"):
+                break
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    return {
+        **video_job_service.result_cache.stats(),
+        "incident_feed": dynamodb_service.feed_cache.stats()
+    }
+
+@app.get("/api/models/stats")
+async def get_model_stats():
+    return model_router.stats()
+
+@app.get("/metrics")
+async def metrics():
+    # Prometheus text exposition format
+    return Response(content=REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.post("/api/jobs", status_code=202)
+async def submit_video_job(video_info: dict):
+    try:
+        if not video_info or 'videoKey' not in video_info:
+            raise HTTPException(status_code=400, detail="Missing required field: videoKey")
+
+        job_id = await io_pool.run(video_job_service.submit, video_info['videoKey'])
+        return {"status": "queued", "jobId": job_id}
+    except (HTTPException, PoolSaturatedError):
+        raise
+    except Exception as e:
+        logger.error("Error submitting video job: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/jobs/{job_id}")
+async def get_video_job(job_id: str):
+    try:
+        job = await io_pool.run(video_job_service.get_job, job_id)
+    except PoolSaturatedError:
+        raise
+    except Exception as e:
+        logger.error("Error fetching video job: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
 def create_vapi_call(first_message):
     headers = {
         'Authorization': f'Bearer {VAPI_AUTH_TOKEN}',
@@ -227,20 +331,24 @@ def generate_summary(incident_analysis):
         }
     ]
 
+    # The dispatch model; with tiered routing, small for routine incidents and large for serious hazards
+    tier = model_router.dispatch_tier(analysis_service.parser.parse(str(incident_analysis)).severity_score)
     try:
-        response = client.converse(
-            modelId="us.meta.llama3-2-3b-instruct-v1:0",
-            messages=conversation,
-            inferenceConfig={
-                "maxTokens": 512,
-                "temperature": 0.5,
-                "topP": 0.9
-            }
-        )
+        # A live incident: ahead of any queued video analysis for the Bedrock quota
+        with priority_lane(LANE_LIVE):
+            response, _ = model_router.converse(
+                analysis_service.bedrock_client, tier,
+                messages=conversation,
+                inferenceConfig={
+                    "maxTokens": 512,
+                    "temperature": 0.5,
+                    "topP": 0.9
+                }
+            )
         
         return response["output"]["message"]["content"][0]["text"]
     except (ClientError, Exception) as e:
-        print(f"Bedrock Error: {e}")
+        logger.error("Bedrock Error: %s", e)
         raise ValueError(f"Failed to generate summary: {str(e)}")
 
 @app.post("/api/phone-call")
@@ -251,8 +359,8 @@ async def initiate_phone_call(request_data: Dict):
             raise HTTPException(status_code=400, detail="Incident analysis is required")
 
         # Generate concise summary using Bedrock
-        summary = generate_summary(incident_analysis)
-        print(f"Generated summary: {summary}")
+        summary = await io_pool.run(generate_summary, incident_analysis)
+        logger.debug("Generated summary: %s", summary)
         
         # Initiate VAPI call with the summary
         #call_response = create_vapi_call(summary)
@@ -263,19 +371,39 @@ async def initiate_phone_call(request_data: Dict):
             "summary": summary,
             "call_details": call_response
         }
+    except PoolSaturatedError:
+        raise
     except Exception as e:
-        print(f"Error in initiate_phone_call: {str(e)}")
+        logger.error("Error in initiate_phone_call: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
     
 @app.get("/api/past-incidents")
-async def get_past_incidents():
+async def get_past_incidents(request: Request, limit: int = INCIDENT_PAGE_SIZE, pageToken: str = None,
+                             severity: str = None, service: str = None, keyword: str = None,
+                             since: str = None):
     try:
-        # Get incidents from DynamoDB
-        response = dynamodb_service.get_all_incidents()
-        return {
-            "status": "success",
-            "incidents": response
-        }
+        params = dict(limit=limit, page_token=pageToken, severity=severity, service=service,
+                      keyword=keyword, since=since)
+        # "no-cache" makes browsers revalidate with If-None-Match on every open
+        cache_headers = {"Cache-Control": "no-cache"}
+        if_none_match = request.headers.get("if-none-match")
+
+        # Unchanged cached page: answer without touching DynamoDB or sending the list
+        if if_none_match and if_none_match == dynamodb_service.cached_feed_etag(**params):
+            return Response(status_code=304, headers={"ETag": if_none_match, **cache_headers})
+
+        # One page from the timeline index, most recent first; with `since`, only newer incidents
+        page, etag = await io_pool.run(dynamodb_service.list_incidents, **params)
+        if if_none_match == etag:
+            return Response(status_code=304, headers={"ETag": etag, **cache_headers})
+        return JSONResponse(
+            content=jsonable_encoder({"status": "success", **page}),
+            headers={"ETag": etag, **cache_headers}
+        )
+    except PoolSaturatedError:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        print(f"Error fetching incidents: {str(e)}")
+        logger.error("Error fetching incidents: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
@@ -0,0 +1,73 @@
+import base64
+
+import cv2
+
+from ..utils.metrics import span
+
+JPEG_QUALITY = 85
+
+
+class ExtractedFrame:
+    """A sampled video frame, encoded at most once.
+
+    Holds the resized pixel array. The JPEG bytes sent to Bedrock are encoded
+    on first use and reused, and the base64 string the dashboard needs is
+    only produced when the frame is serialized for a response. `owner` is
+    whatever backs a borrowed array (e.g. a shared memory block) and is kept
+    alive as long as the frame.
+    """
+
+    # `owner` after `array`, so the view is released before its backing memory
+    __slots__ = ('id', 'timestamp', 'array', 'owner', '_jpeg_bytes', '_base64')
+
+    def __init__(self, id, timestamp, array, jpeg_bytes=None, owner=None):
+        self.id = id
+        self.timestamp = timestamp
+        self.array = array
+        self.owner = owner
+        self._jpeg_bytes = jpeg_bytes
+        self._base64 = None
+
+    @property
+    def jpeg_bytes(self):
+        if self._jpeg_bytes is None:
+            with span("encode", frame=self.id):
+                ok, buffer = cv2.imencode('.jpg', self.array, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+            if not ok:
+                raise ValueError(f"Failed to JPEG-encode frame {self.id}")
+            self._jpeg_bytes = buffer.tobytes()
+        return self._jpeg_bytes
+
+    @property
+    def image(self):
+        """Base64 JPEG as returned to the dashboard"""
+        if self._base64 is None:
+            jpeg_bytes = self.jpeg_bytes
+            with span("base64", frame=self.id, bytes=len(jpeg_bytes)):
+                self._base64 = base64.b64encode(jpeg_bytes).decode('utf-8')
+        return self._base64
+
+    def thumbnail(self, max_size=320):
+        """Small base64 JPEG for progress updates; not cached"""
+        height, width = self.array.shape[:2]
+        scale = max_size / max(height, width)
+        small = self.array
+        if scale < 1:
+            small = cv2.resize(self.array, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+        ok, buffer = cv2.imencode('.jpg', small, [cv2.IMWRITE_JPEG_QUALITY, 70])
+        if not ok:
+            raise ValueError(f"Failed to JPEG-encode thumbnail for frame {self.id}")
+        return base64.b64encode(buffer).decode('utf-8')
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "image": self.image,
+            "timestamp": self.timestamp
+        }
+
+    def __getitem__(self, key):
+        # Lets older dict-style callers (frame['id'], frame['image']) keep working
+        if key in ('id', 'timestamp', 'image'):
+            return getattr(self, key)
+        raise KeyError(key)
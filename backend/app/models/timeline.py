@@ -0,0 +1,232 @@
+import bisect
+import functools
+import re
+import threading
+
+from ..services.analysis_parser import load_rules
+
+ENTITY_TERMS = {
+    "vehicle": ("car", "cars", "vehicle", "vehicles", "truck", "trucks", "suv", "sedan", "van", "bus",
+                "motorcycle", "bike"),
+    "person": ("person", "people", "pedestrian", "pedestrians", "driver", "drivers", "occupant",
+               "occupants", "passenger", "passengers", "victim", "victims"),
+    "emergency responder": ("ambulance", "firefighter", "firefighters", "police", "paramedic", "paramedics"),
+    "debris": ("debris", "glass", "wreckage"),
+}
+# Severity of a frame is its worst hazard, nudged up for each additional one
+EXTRA_HAZARD_WEIGHT = 0.05
+
+_WORD = re.compile(r"[a-z]+")
+# "No fire", "not trapped", "without injuries": a negation this many words before a term cancels it
+_NEGATIONS = {"no", "not", "without", "none", "nor", "never"}
+_NEGATION_WINDOW = 3
+_CLAUSE_BREAK = re.compile(r"[.;:!?\n]|\bbut\b")
+
+
+def parse_timestamp(timestamp):
+    """Seconds from a "mm:ss" (or "hh:mm:ss") frame timestamp"""
+    seconds = 0.0
+    for part in str(timestamp).split(':'):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+
+def _term_index(terms_by_label):
+    """{first word: ((label, term words), ...)} for matching terms (possibly several words) word by word"""
+    index = {}
+    for label, terms in terms_by_label:
+        for term in terms:
+            words = tuple(_WORD.findall(term.lower()))
+            if words:
+                index.setdefault(words[0], []).append((label, words))
+    return {word: tuple(entries) for word, entries in index.items()}
+
+
+def _mentions(description, index):
+    """Labels in a term index whose terms appear in `description` without a nearby negation"""
+    found = set()
+    for clause in _CLAUSE_BREAK.split(description.lower()):
+        words = _WORD.findall(clause)
+        for position, word in enumerate(words):
+            for label, term in index.get(word, ()):
+                if (tuple(words[position:position + len(term)]) == term
+                        and not _NEGATIONS.intersection(words[max(0, position - _NEGATION_WINDOW):position])):
+                    found.add(label)
+    return found
+
+
+_ENTITY_INDEX = _term_index(ENTITY_TERMS.items())
+
+
+class HazardVocabulary:
+    """Hazard labels with their terms and severity weights, taken from the analysis parser's keyword rules.
+
+    The timeline and the report read the same table, so a rules file
+    (ANALYSIS_RULES_PATH) changes both. Terms match whole words here, so
+    that a negation just before them can be told apart.
+    """
+
+    __slots__ = ('weights', '_index')
+
+    def __init__(self, rules):
+        self.weights = {rule.keyword: rule.weight for rule in rules}
+        self._index = _term_index((rule.keyword, rule.terms) for rule in rules)
+
+    def detect(self, description):
+        """Hazard labels a description reports (negated mentions such as "no fire" do not count)"""
+        return _mentions(description, self._index)
+
+
+@functools.lru_cache(maxsize=None)
+def default_hazards():
+    """HazardVocabulary of the parser's default rules (DEFAULT_RULES, or the ANALYSIS_RULES_PATH file)"""
+    return HazardVocabulary(load_rules())
+
+
+def detect_hazards(description):
+    """Hazard labels a description reports under the default rules"""
+    return default_hazards().detect(description)
+
+
+def _normalize(description):
+    return " ".join(_WORD.findall(description.lower()))
+
+
+class TimelineEntry:
+    """What one analyzed frame shows, at its point in the video"""
+
+    __slots__ = ('frame_id', 'timestamp', 'seconds', 'description', 'entities', 'hazards', 'severity')
+
+    def __init__(self, frame_id, timestamp, description, hazards=None):
+        hazards = hazards or default_hazards()
+        self.frame_id = frame_id
+        self.timestamp = timestamp
+        self.seconds = parse_timestamp(timestamp)
+        self.description = description
+        self.entities = tuple(sorted(_mentions(description, _ENTITY_INDEX)))
+        self.hazards = tuple(sorted(hazards.detect(description), key=lambda h: -hazards.weights[h]))
+        weights = [hazards.weights[hazard] for hazard in self.hazards]
+        self.severity = min(1.0, max(weights) + EXTRA_HAZARD_WEIGHT * (len(weights) - 1)) if weights else 0.0
+
+    def to_dict(self):
+        return {
+            "frame_id": self.frame_id,
+            "timestamp": self.timestamp,
+            "entities": list(self.entities),
+            "hazards": list(self.hazards),
+            "severity": round(self.severity, 2)
+        }
+
+
+class IncidentTimeline:
+    """Frame observations ordered by time, indexed by hazard and entity.
+
+    Entries can be added in any order and from several threads as frame
+    results arrive; adding a frame id again replaces its entry. Interval
+    queries ("when did smoke first appear", "what happened between 01:00
+    and 02:00") are binary searches over the time order. Hazards and their
+    weights come from `rules`, the analysis parser's keyword rules (by
+    default load_rules()).
+    """
+
+    def __init__(self, rules=None):
+        self.hazards = HazardVocabulary(rules) if rules is not None else default_hazards()
+        self._lock = threading.Lock()
+        self._entries = []  # sorted by (seconds, frame_id)
+        self._keys = []
+        self._by_frame = {}
+        self._by_label = {}  # hazard or entity -> sorted [(seconds, frame_id)]
+
+    def add(self, frame_id, timestamp, description):
+        """Record a frame's observation; returns its entry"""
+        entry = TimelineEntry(frame_id, timestamp, description, self.hazards)
+        with self._lock:
+            if frame_id in self._by_frame:
+                self._remove(self._by_frame[frame_id])
+            key = (entry.seconds, frame_id)
+            position = bisect.bisect(self._keys, key)
+            self._keys.insert(position, key)
+            self._entries.insert(position, entry)
+            self._by_frame[frame_id] = entry
+            for label in entry.hazards + entry.entities:
+                bisect.insort(self._by_label.setdefault(label, []), key)
+        return entry
+
+    def _remove(self, entry):
+        key = (entry.seconds, entry.frame_id)
+        position = bisect.bisect_left(self._keys, key)
+        del self._keys[position]
+        del self._entries[position]
+        for label in entry.hazards + entry.entities:
+            self._by_label[label].remove(key)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def entries(self, start=None, end=None):
+        """Entries with start <= seconds < end, in time order"""
+        with self._lock:
+            low = 0 if start is None else bisect.bisect_left(self._keys, (start,))
+            high = len(self._keys) if end is None else bisect.bisect_left(self._keys, (end,))
+            return self._entries[low:high]
+
+    def occurrences(self, label, start=None, end=None):
+        """Entries showing hazard or entity `label` within [start, end)"""
+        with self._lock:
+            keys = self._by_label.get(label, [])
+            low = 0 if start is None else bisect.bisect_left(keys, (start,))
+            high = len(keys) if end is None else bisect.bisect_left(keys, (end,))
+            return [self._by_frame[frame_id] for _, frame_id in keys[low:high]]
+
+    def first_seen(self, label, start=None):
+        """Earliest entry showing `label` (at or after `start`), or None"""
+        found = self.occurrences(label, start=start)
+        return found[0] if found else None
+
+    def onsets(self):
+        """{hazard: timestamp it first appears}"""
+        with self._lock:
+            return {
+                label: self._by_frame[keys[0][1]].timestamp
+                for label, keys in self._by_label.items() if label in self.hazards.weights and keys
+            }
+
+    def peak_severity(self):
+        with self._lock:
+            return max((entry.severity for entry in self._entries), default=0.0)
+
+    def compact(self, start=None, end=None):
+        """Prompt lines for [start, end): consecutive repeats collapse into one span,
+        and an observation seen earlier is referenced instead of repeated."""
+        runs = []
+        for entry in self.entries(start, end):
+            normalized = _normalize(entry.description)
+            if runs and runs[-1][2] == normalized:
+                runs[-1][1] = entry
+            else:
+                runs.append([entry, entry, normalized])
+
+        lines = []
+        first_at = {}
+        for first, last, normalized in runs:
+            span = first.timestamp if first is last else f"{first.timestamp}-{last.timestamp}"
+            if normalized in first_at:
+                lines.append(f"[{span}] unchanged from {first_at[normalized]}")
+                continue
+            first_at[normalized] = span
+            tags = [f"severity {first.severity:.2f}"]
+            if first.hazards:
+                tags.append("hazards: " + ", ".join(first.hazards))
+            if first.entities:
+                tags.append("entities: " + ", ".join(first.entities))
+            text = " ".join(first.description.split())
+            lines.append(f"[{span}] {'; '.join(tags)} | {text}")
+        return lines
+
+    def to_dict(self):
+        entries = self.entries()
+        return {
+            "entries": [entry.to_dict() for entry in entries],
+            "first_seen": self.onsets(),
+            "peak_severity": round(max((entry.severity for entry in entries), default=0.0), 2)
+        }
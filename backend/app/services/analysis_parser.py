@@ -0,0 +1,141 @@
+import json
+import os
+import re
+from collections import namedtuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# JSON file with a list of keyword rules replacing DEFAULT_RULES; see load_rules
+ANALYSIS_RULES_PATH = os.getenv('ANALYSIS_RULES_PATH', '')
+
+# Section header in the summary text -> key in the response's `analysis`
+SECTION_HEADERS = {
+    "Vehicle Details": "vehicleDetails",
+    "Casualties and Trapped Persons": "casualties",
+    "Hazard Assessment": "hazards",
+    "Environmental Conditions": "environment",
+    "Emergency Services Required": "services",
+}
+
+# `terms` match as case-insensitive substrings (whole words in IncidentTimeline,
+# which reads the same rules); `services` are recommended
+# when the keyword is found; `weight` feeds the severity score, and any
+# matched rule with `high` makes the severity level HIGH
+KeywordRule = namedtuple('KeywordRule', ['keyword', 'terms', 'services', 'weight', 'high'])
+
+DEFAULT_RULES = (
+    KeywordRule("Fire Hazard", ("fire", "flames", "burning"), ("Fire Department (URGENT)",), 1.0, True),
+    KeywordRule("Smoke", ("smoke", "smoking"), ("Fire Department (URGENT)",), 0.5, False),
+    KeywordRule("Trapped Occupants", ("trapped", "pinned"), ("Emergency Medical Services",), 0.9, True),
+    KeywordRule("Injuries", ("injury", "injuries", "injured", "bleeding", "unconscious"),
+                ("Emergency Medical Services",), 0.8, False),
+    KeywordRule("Vehicle Collision", ("collision", "collided", "crash", "crashed"), ("Police",), 0.4, False),
+    KeywordRule("Fuel Leak", ("fuel", "leak", "leaking"), ("Hazmat Team",), 0.7, False),
+)
+
+ParsedAnalysis = namedtuple('ParsedAnalysis', ['sections', 'keywords', 'services', 'severity', 'severity_score'])
+
+
+def load_rules(path=ANALYSIS_RULES_PATH):
+    """Keyword rules from a JSON list of {keyword, terms, services, weight, high}, or DEFAULT_RULES"""
+    if not path:
+        return DEFAULT_RULES
+    with open(path, 'r', encoding='utf-8') as f:
+        return tuple(
+            KeywordRule(
+                rule['keyword'], tuple(rule['terms']), tuple(rule.get('services', ())),
+                float(rule.get('weight', 0.0)), bool(rule.get('high', False))
+            )
+            for rule in json.load(f)
+        )
+
+
+class AnalysisParser:
+    """Reads a comprehensive analysis with a few compiled scans instead of a per-line walk.
+
+    One scan finds the section headers and one compiled pattern per section
+    pulls out its bullet items, so lines that are not bullets never reach
+    Python code. Keyword terms are looked up in the lowercased text, which
+    in CPython beats a regex alternation for a small table; tables of
+    ALTERNATION_MIN_TERMS terms or more use a single alternation scan.
+    Keywords, services and severity for each set of matched rules are
+    worked out once and reused, and come back together with the sections.
+    """
+
+    ALTERNATION_MIN_TERMS = 32
+    MAX_OUTCOMES = 4096
+
+    def __init__(self, rules=None, sections=None):
+        self.rules = tuple(rules) if rules is not None else load_rules()
+        self.sections = dict(sections or SECTION_HEADERS)
+        self._rule_of = {}
+        for position, rule in enumerate(self.rules):
+            for term in rule.terms:
+                self._rule_of.setdefault(term.lower(), position)
+        # Terms are looked up in the UTF-8 bytes of the text: encoding and
+        # ASCII lowercasing take a fraction of str.lower() on non-Latin-1 text
+        # (LLM bullets are often "•"), and byte searches are faster too
+        self._byte_terms = tuple((term.encode('utf-8'), position) for term, position in self._rule_of.items())
+        # Matched-rule set (a bitmask over rule positions) -> (keywords, services, severity, score);
+        # there are few distinct combinations, so each is worked out once
+        self._outcomes = {}
+        self._alternation = None
+        if len(self._rule_of) >= self.ALTERNATION_MIN_TERMS:
+            # Longest first, so a term that contains another wins the alternation
+            self._alternation = re.compile(
+                b'|'.join(re.escape(term.encode('utf-8')) for term in sorted(self._rule_of, key=len, reverse=True))
+            )
+        headers = '|'.join(re.escape(header) for header in self.sections)
+        self._header = re.compile(rf"\*\*({headers}):\*\*")
+        # A line whose first non-blank character is a bullet marker; the item
+        # is the rest of the line after further markers. Scans start at a
+        # newline, so the literal prefix lets the engine skip between lines.
+        self._bullet = re.compile(r"\n[^\S\n]*[-*•][-*• ]*([^\n]*)")
+
+    def parse(self, text):
+        sections = {key: [] for key in self.sections.values()}
+        headers = list(self._header.finditer(text))
+        for i, header in enumerate(headers):
+            # A header's whole line belongs to no section, as before
+            start = text.find('\n', header.end())
+            if start < 0:
+                continue
+            end = text.rfind('\n', 0, headers[i + 1].start()) + 1 if i + 1 < len(headers) else len(text)
+            sections[self.sections[header.group(1)]].extend(
+                [item for item in map(str.strip, self._bullet.findall(text, start, end)) if item and item[-1] != ':']
+            )
+
+        lowered = text.encode('utf-8').lower()
+        found = 0
+        if self._alternation is not None:
+            for term in self._alternation.findall(lowered):
+                found |= 1 << self._rule_of[term.decode('utf-8')]
+        else:
+            for term, position in self._byte_terms:
+                # A rule already matched by an earlier term needs no further lookups
+                if not found >> position & 1 and term in lowered:
+                    found |= 1 << position
+
+        outcome = self._outcomes.get(found)
+        if outcome is None:
+            outcome = self._outcome(found)
+            if len(self._outcomes) < self.MAX_OUTCOMES:
+                self._outcomes[found] = outcome
+        keywords, services, severity, severity_score = outcome
+        return ParsedAnalysis(sections, list(keywords), list(services), severity, severity_score)
+
+    def _outcome(self, found):
+        matched = [rule for position, rule in enumerate(self.rules) if found >> position & 1]
+        services = []
+        for rule in matched:
+            for service in rule.services:
+                if service not in services:
+                    services.append(service)
+        return (
+            tuple(rule.keyword for rule in matched),
+            tuple(services),
+            "HIGH" if any(rule.high for rule in matched) else "MODERATE",
+            max((rule.weight for rule in matched), default=0.0)
+        )
@@ -1,7 +1,6 @@
 import cv2
 import tempfile
 import numpy as np
-import boto3
 from botocore.exceptions import ClientError
 import os
 from dotenv import load_dotenv
@@ -9,22 +8,191 @@ import time
 from PIL import Image
 import base64
 from io import BytesIO
-import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import contextlib
+import contextvars
+import logging
+import re
+import threading
+from ..models.frame import ExtractedFrame
+from ..models.timeline import IncidentTimeline
+from ..utils.image_hash import dhash, hamming_distance
+from .cache_service import FrameHashIndex
+from .analysis_parser import AnalysisParser
+from .model_router import model_router
+from .token_budget import TokenBudget, UsageMeter
+from .aws_clients import get_client
+from ..utils.frame_sampler import AdaptiveFrameSampler
+from ..utils.frame_triage import FrameTriage
+from ..utils.executors import PoolSaturatedError, cpu_pool
+from ..utils.metrics import record_span, span
+from ..utils.pipeline import PipelineStage, StagePipeline, StageTimings
+from ..utils.video_utils import open_video, plan_segments, segment_frame_indices, uniform_frame_indices
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Frame analysis mode: "concurrent" fans all frames out at once, "sequential" is the old one-by-one loop,
+# "batched" packs several frames into one converse call, "auto" batches when the frames fit in one call
+FRAME_ANALYSIS_MODE = os.getenv('FRAME_ANALYSIS_MODE', 'concurrent')
+# Limits for a batched call: images per message and total image bytes per request
+BEDROCK_MAX_IMAGES_PER_CALL = int(os.getenv('BEDROCK_MAX_IMAGES_PER_CALL', '8'))
+BEDROCK_MAX_REQUEST_BYTES = int(os.getenv('BEDROCK_MAX_REQUEST_BYTES', str(15 * 1024 * 1024)))
+# Per-process cap on in-flight Bedrock frame requests, shared by every AnalysisService instance
+BEDROCK_MAX_CONCURRENCY = int(os.getenv('BEDROCK_MAX_CONCURRENCY', '8'))
+# Frame sampling: "uniform" seeks to 4 evenly spaced frames, "adaptive" scans once and keeps the most informative
+SAMPLING_MODE = os.getenv('SAMPLING_MODE', 'uniform')
+# Longest side of frames sent to Bedrock
+FRAME_MAX_SIZE = 1024
+# Videos at least this long are split into segments that are sampled and analyzed in parallel,
+# each with SEGMENT_FRAMES frames, and merged into one timeline-aware analysis
+LONG_VIDEO_SECONDS = float(os.getenv('LONG_VIDEO_SECONDS', '120'))
+SEGMENT_SECONDS = float(os.getenv('SEGMENT_SECONDS', '60'))
+SEGMENT_FRAMES = int(os.getenv('SEGMENT_FRAMES', '4'))
+SEGMENT_WORKERS = int(os.getenv('SEGMENT_WORKERS', '8'))
+# Seconds a single frame analysis call may take, counted from when it starts running
+BEDROCK_CALL_TIMEOUT = float(os.getenv('BEDROCK_CALL_TIMEOUT', '30'))
+# Seconds a call may wait for one of the BEDROCK_MAX_CONCURRENCY slots shared by every request;
+# past it the request is shed with a 503 instead of being answered with frames left out
+BEDROCK_QUEUE_WAIT = float(os.getenv('BEDROCK_QUEUE_WAIT', '60'))
+# "on": download, decode, triage and frame analysis run as overlapping pipeline stages, so frames
+# are analyzed while later ones still download; "off": each step finishes before the next starts
+PIPELINE_MODE = os.getenv('PIPELINE_MODE', 'on')
+# Frames of one video in flight to Bedrock at once in the pipeline (all videos share BEDROCK_MAX_CONCURRENCY)
+PIPELINE_ANALYZE_WORKERS = int(os.getenv('PIPELINE_ANALYZE_WORKERS', str(BEDROCK_MAX_CONCURRENCY)))
+
+# Primary large vision model; names the result cache entries
+VISION_MODEL_ID = model_router.model('vision_large')
+# Bump whenever the frame or summary prompts change so cached analyses are not reused
+PROMPT_VERSION = "2"
+
+
+def frame_namespace(model_id):
+    """Frame index namespace of descriptions written by `model_id` with the current prompts"""
+    return f"{model_id}|{PROMPT_VERSION}"
+
+ANALYSIS_SECTIONS_PROMPT = """    Provide a comprehensive incident analysis with EXACTLY these sections:
+
+    **Vehicle Details:**
+    - Number and types of vehicles involved
+    - Overall damage assessment
+    - Final position of vehicles
+
+    **Casualties and Trapped Persons:**
+    - Total number of visible injuries
+    - Locations of trapped persons
+    - Overall severity assessment
+
+    **Hazard Assessment:**
+    - All identified hazards
+    - Progression of hazards across frames
+    - Current risk level
+
+    **Environmental Conditions:**
+    - Overall scene conditions
+    - Any changes visible across frames
+
+    **Emergency Services Required:**
+    - Priority services needed
+    - Special equipment requirements
+    - Recommended approach
+
+    Use bullet points for all details and maintain these EXACT section headers.
+    Focus on actionable information for emergency responders.
+    """
+
+# Markers the batched prompt asks the model to use, so the reply can be split per frame
+BATCH_FRAME_MARKER = re.compile(r'^#+\s*Frame\s+(\d+)\b.*$', re.MULTILINE | re.IGNORECASE)
+BATCH_SUMMARY_MARKER = re.compile(r'^#+\s*Comprehensive Analysis\b.*$', re.MULTILINE | re.IGNORECASE)
+
+_frame_executor = ThreadPoolExecutor(
+    max_workers=BEDROCK_MAX_CONCURRENCY,
+    thread_name_prefix='bedrock-frame'
+)
+
+
+# How often _wait_calls checks whether queued calls have started
+CALL_QUEUE_POLL_SECONDS = 0.05
+
+
+class _Call:
+    """A call on the frame executor that notes when it leaves the queue and starts running"""
+
+    def __init__(self, fn, args):
+        self.queued_at = time.monotonic()
+        self.started_at = None
+        self.timed_out = False
+        # In the caller's context, so its Bedrock calls keep the caller's priority lane
+        self.future = _frame_executor.submit(contextvars.copy_context().run, self._run, fn, args)
+
+    def _run(self, fn, args):
+        self.started_at = time.monotonic()
+        return fn(*args)
+
+
+def _submit_call(fn, *args):
+    """Run `fn(*args)` on the frame executor; wait for it with _wait_calls"""
+    return _Call(fn, args)
+
+
+def _wait_calls(calls, call_timeout, queue_wait=None):
+    """Wait until every call is done or has run for `call_timeout` seconds.
+
+    Each call's timeout starts when it starts running, so time spent queued
+    behind other requests' calls does not count against it. A call still
+    queued after `queue_wait` seconds means the process is over capacity:
+    the calls of this batch that have not started are cancelled and
+    PoolSaturatedError is raised. Calls that ran out of time are cancelled
+    and marked `timed_out`.
+    """
+    queue_wait = BEDROCK_QUEUE_WAIT if queue_wait is None else queue_wait
+    while True:
+        now = time.monotonic()
+        pending, deadlines = [], []
+        for call in calls:
+            if call.future.done() or call.timed_out:
+                continue
+            started_at = call.started_at
+            if started_at is None and now >= call.queued_at + queue_wait and call.future.cancel():
+                for other in calls:
+                    other.future.cancel()
+                raise PoolSaturatedError('bedrock-frame')
+            if started_at is not None and now >= started_at + call_timeout:
+                call.future.cancel()
+                call.timed_out = True
+                continue
+            pending.append(call.future)
+            # A queued call is looked at again shortly, to start its call timeout once it runs
+            deadlines.append(now + CALL_QUEUE_POLL_SECONDS if started_at is None else started_at + call_timeout)
+        if not pending:
+            return
+        wait(pending, timeout=max(0.0, min(deadlines) - now), return_when=FIRST_COMPLETED)
+
 
 class AnalysisService:
-    def __init__(self):
+    def __init__(self, bedrock_client=None):
         load_dotenv()
-        
-        # Initialize Bedrock client
-        self.bedrock_client = boto3.client(
-        service_name="bedrock-runtime",
-        aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID1'),
-        aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY1'),
-        region_name=os.getenv('AWS_REGION1')
-    )
-    
+
         self.model_id = os.getenv('BEDROCK_MODEL_ID')
-    
+        self.analysis_mode = FRAME_ANALYSIS_MODE
+        self.call_timeout = BEDROCK_CALL_TIMEOUT
+        self.sampling_mode = SAMPLING_MODE
+        self.sampler = AdaptiveFrameSampler()
+        self.parser = AnalysisParser()
+        self.router = model_router
+        self.triage = FrameTriage()
+        # Descriptions of frames already analyzed, reused for near-identical frames
+        self.frame_index = FrameHashIndex()
+        # Moving average of a frame call, used to estimate latency saved by reuse
+        self.average_call_seconds = 0.0
+
+        # Created on first use from the shared client registry unless injected
+        self._bedrock_client = bedrock_client
+        if bedrock_client is not None:
+            # Injected client (benchmarks, local stubs) - skip credential checks
+            return
+
         if not all([
             os.getenv('AWS_ACCESS_KEY_ID'),
             os.getenv('AWS_SECRET_ACCESS_KEY'),
@@ -36,60 +204,168 @@ class AnalysisService:
                 "Please check your .env file for AWS credentials."
             )
 
-    def extract_accident_frames(self, video_path):
+    @property
+    def bedrock_client(self):
+        if self._bedrock_client is None:
+            # Retries belong to the rate limiter, which backs off with jitter and shares the quota
+            self._bedrock_client = get_client(
+                'bedrock-runtime', profile='bedrock', read_timeout=self.call_timeout,
+                retries={'mode': 'standard', 'max_attempts': 1}
+            )
+        return self._bedrock_client
+
+    @bedrock_client.setter
+    def bedrock_client(self, client):
+        self._bedrock_client = client
+
+    @property
+    def needs_full_video(self):
+        """Adaptive sampling reads every frame, so partial (ranged) downloads cannot serve it"""
+        return self.sampling_mode == 'adaptive'
+
+    @staticmethod
+    def _format_timestamp(seconds):
+        return f"{int(seconds//60):02d}:{int(seconds%60):02d}"
+
+    def extract_accident_frames(self, video_path, on_frame=None):
+        """Sample frames from the video; `on_frame(frame)` is called as each one is decoded"""
+        if self.sampling_mode == 'adaptive':
+            return self._extract_adaptive_frames(video_path, on_frame)
+
         try:
             frames = []
-            timestamps = []
-            cap = cv2.VideoCapture(video_path)
-            
-            if not cap.isOpened():
-                raise ValueError(f"Failed to open video file: {video_path}")
-                
-            frame_rate = int(cap.get(cv2.CAP_PROP_FPS))
-            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            
-            # Get 8 evenly spaced frames instead of 4
-            frame_indices = [int(i * total_frames / 4) for i in range(4)]
-            
-            print(f"Total video frames: {total_frames}")
-            print(f"Extracting frames at indices: {frame_indices}")
-            
-            for idx in frame_indices:
-                cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
-                ret, frame = cap.read()
-                if ret:
-                    # Resize frame before adding to list
-                    resized_frame = self.resize_image(frame)
-                    frames.append(resized_frame)
-                    timestamp = idx / frame_rate
-                    timestamps.append(f"{int(timestamp//60):02d}:{int(timestamp%60):02d}")
-                    print(f"Extracted frame at timestamp: {timestamps[-1]}")
-            
-            cap.release()
-            
+            # Frames come out of the decoder already fitted to the Bedrock size
+            with open_video(video_path, max_size=FRAME_MAX_SIZE) as decoder:
+                total_frames = decoder.frame_count
+
+                frame_indices = self.select_frame_indices(total_frames)
+
+                logger.debug("Total video frames: %s (%s decoder)", total_frames, decoder.backend)
+                logger.debug("Extracting frames at indices: %s", frame_indices)
+
+                for extracted in self.read_sampled_frames(decoder, frame_indices):
+                    frames.append(extracted)
+                    if on_frame:
+                        on_frame(extracted)
+
             if not frames:
                 raise ValueError("No frames were extracted from the video")
-            
-            print(f"Successfully extracted {len(frames)} frames")
-            
-            # Convert frames to base64 for response
-            frame_data = []
-            for i, (frame, timestamp) in enumerate(zip(frames, timestamps)):
-                _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
-                base64_frame = base64.b64encode(buffer).decode('utf-8')
-                frame_data.append({
-                    "id": i + 1,
-                    "image": base64_frame,
-                    "timestamp": timestamp
-                })
-            
-            return frame_data
-            
+
+            logger.debug("Successfully extracted %s frames", len(frames))
+            return frames
+
+        except Exception as e:
+            logger.error("Error extracting frames: %s", e)
+            raise
+
+    def read_sampled_frames(self, decoder, indices, first_id=1):
+        """ExtractedFrames for `indices` from an open decoder, numbered from `first_id`"""
+        decoded = decoder.read_frames(indices)
+        while True:
+            started, cpu_started = time.perf_counter(), time.thread_time()
+            idx, frame = next(decoded, (None, None))
+            if frame is None:
+                return
+            record_span(
+                "decode", time.perf_counter() - started, time.thread_time() - cpu_started,
+                backend=decoder.backend, index=idx
+            )
+            # JPEG/base64 encoding is deferred until Bedrock or the response needs it
+            extracted = ExtractedFrame(first_id, self._format_timestamp(idx / decoder.fps), self.resize_image(frame))
+            first_id += 1
+            logger.debug("Extracted frame at timestamp: %s", extracted.timestamp)
+            yield extracted
+
+    def _extract_adaptive_frames(self, video_path, on_frame=None):
+        try:
+            with open_video(video_path, max_size=FRAME_MAX_SIZE) as decoder:
+                frame_rate = decoder.fps
+                with span("decode", backend=decoder.backend, sampling="adaptive"):
+                    sampled = self.sampler.sample_decoder(decoder)
+            if not sampled:
+                raise ValueError("No frames were extracted from the video")
+
+            logger.debug("Adaptive sampler picked frames at indices: %s", [idx for idx, _ in sampled])
+            frames = [
+                ExtractedFrame(i + 1, self._format_timestamp(idx / frame_rate), frame)
+                for i, (idx, frame) in enumerate(sampled)
+            ]
+            if on_frame:
+                for extracted in frames:
+                    on_frame(extracted)
+            return frames
         except Exception as e:
-            print(f"Error extracting frames: {str(e)}")
+            logger.error("Error extracting frames: %s", e)
             raise
 
-    def resize_image(self, frame, max_size=1024):
+    def extract_frames_in_process(self, video_path, extraction_pool, on_frame=None, block=False):
+        """extract_accident_frames in a worker process of `extraction_pool`.
+
+        The frame arrays are views into the shared memory the worker decoded
+        into; `on_frame` is called once all frames are back.
+        """
+        try:
+            sampler = self.sampler if self.sampling_mode == 'adaptive' else None
+            with span("decode", backend="process"):
+                sampled, frame_rate, shared = extraction_pool.extract(video_path, FRAME_MAX_SIZE, sampler, block=block)
+            if not sampled:
+                raise ValueError("No frames were extracted from the video")
+
+            logger.debug("Extracted frames at indices %s in a worker process", [idx for idx, _ in sampled])
+            frames = [
+                ExtractedFrame(i + 1, self._format_timestamp(idx / frame_rate), array, owner=shared)
+                for i, (idx, array) in enumerate(sampled)
+            ]
+            if on_frame:
+                for extracted in frames:
+                    on_frame(extracted)
+            return frames
+        except Exception as e:
+            logger.error("Error extracting frames: %s", e)
+            raise
+
+    def select_frame_indices(self, total_frames, fps=None):
+        """Frame indices to sample from a video with `total_frames` frames"""
+        segments = self.video_segments(total_frames, fps) if fps else None
+        if segments:
+            return [idx for start, end in segments for idx in segment_frame_indices(start, end, SEGMENT_FRAMES)]
+        # 4 evenly spaced frames
+        return uniform_frame_indices(total_frames, 4)
+
+    def video_segments(self, frame_count, fps):
+        """(start, end) frame ranges for segmented processing, or None for a normal-length video"""
+        if not frame_count or not fps or frame_count / fps < LONG_VIDEO_SECONDS:
+            return None
+        return plan_segments(frame_count, fps, SEGMENT_SECONDS)
+
+    def probe_video(self, video_path):
+        """(frame_count, fps) of a local video"""
+        with open_video(video_path) as decoder:
+            return decoder.frame_count, decoder.fps
+
+    def extract_segment_frames(self, video_path, start, end, first_id, extraction_pool=None, block=False):
+        """Sampled frames of frames [start, end), numbered from `first_id`"""
+        sampler = self.sampler if self.sampling_mode == 'adaptive' else None
+        owner = None
+        if extraction_pool is not None:
+            with span("decode", backend="process", segment=start):
+                sampled, frame_rate, owner = extraction_pool.extract(
+                    video_path, FRAME_MAX_SIZE, sampler, SEGMENT_FRAMES, block=block, start=start, end=end
+                )
+        else:
+            with open_video(video_path, max_size=FRAME_MAX_SIZE) as decoder, \
+                    span("decode", backend=decoder.backend, segment=start):
+                frame_rate = decoder.fps
+                if sampler is not None:
+                    sampled = sampler.sample_decoder(decoder, start=start, end=end)
+                else:
+                    sampled = list(decoder.read_frames(segment_frame_indices(start, end, SEGMENT_FRAMES)))
+        return [
+            ExtractedFrame(first_id + i, self._format_timestamp(idx / frame_rate), array, owner=owner)
+            for i, (idx, array) in enumerate(sampled)
+        ]
+
+    def resize_image(self, frame, max_size=FRAME_MAX_SIZE):
     
         height, width = frame.shape[:2]
         
@@ -108,14 +384,23 @@ class AnalysisService:
                 new_height = int(height * ratio)
             else:
                 return frame
-                
-        return cv2.resize(frame, (new_width, new_height), interpolation=cv2.INTER_AREA)
 
-    def analyze_with_bedrock(self, frame):
+        with span("resize", width=new_width, height=new_height):
+            return cv2.resize(frame, (new_width, new_height), interpolation=cv2.INTER_AREA)
+
+    def analyze_with_bedrock(self, frame, usage=None, tier='vision_large', stage="frames"):
+        return self._describe(frame, usage, tier, stage)[0]
+
+    def _describe(self, frame, usage=None, tier='vision_large', stage="frames"):
+        """analyze_with_bedrock, also returning the model that answered: (description, model id)"""
         try:
-            resized_frame = self.resize_image(frame)
-            _, buffer = cv2.imencode('.jpg', resized_frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
-            image_bytes = buffer.tobytes()
+            if isinstance(frame, ExtractedFrame):
+                # Already resized at extraction; reuse its single JPEG encode
+                image_bytes = frame.jpeg_bytes
+            else:
+                resized_frame = self.resize_image(frame)
+                _, buffer = cv2.imencode('.jpg', resized_frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
+                image_bytes = buffer.tobytes()
             
             # Initial analysis prompt for each frame
             frame_prompt = """
@@ -137,200 +422,716 @@ class AnalysisService:
                 ]
             }]
             
-            response = self.bedrock_client.converse(
-                modelId="us.meta.llama3-2-11b-instruct-v1:0",
+            started = time.perf_counter()
+            response, model_id = self.router.converse(
+                self.bedrock_client, tier,
                 messages=conversation,
                 inferenceConfig={
                     "maxTokens": 256,
                     "temperature": 0.3
                 }
             )
-            
-            return response["output"]["message"]["content"][0]["text"]
+            text = response["output"]["message"]["content"][0]["text"]
+            if usage is not None:
+                usage.record(stage, time.perf_counter() - started, response.get("usage"), frame_prompt, text)
+
+            return text, model_id
                 
         except Exception as e:
-            print(f"Error analyzing frame with Bedrock: {str(e)}")
+            logger.error("Error analyzing frame with Bedrock: %s", e)
             raise
 
+    def _timed_analyze(self, frame_data, usage=None, tier='vision_large', stage="frames"):
+        started = time.perf_counter()
+        description, model_id = self._describe(frame_data, usage, tier, stage)
+        if self.router.needs_escalation(tier, description):
+            # The small model reported a hazard; the large model's description is the one kept
+            try:
+                description, model_id = self._describe(frame_data, usage, 'vision_large', stage="escalate")
+            except Exception as e:
+                logger.warning(
+                    "Frame %s escalation failed, keeping the small model's description: %s", frame_data.id, e
+                )
+        return description, time.perf_counter() - started, model_id
+
+    def _call_bedrock(self, frames, on_result=None, mode=None, usage=None, tiers=None, stage="frames"):
+        """Call Bedrock for each frame; returns (description or None, seconds, model id) in frame order.
+
+        `tiers` gives each frame's vision tier (default: all large); calls are
+        recorded into `usage` under `stage`.
+        """
+        tiers = tiers or ['vision_large'] * len(frames)
+        if (mode or self.analysis_mode) == 'sequential':
+            results = []
+            for frame_data, tier in zip(frames, tiers):
+                try:
+                    results.append(self._timed_analyze(frame_data, usage, tier, stage))
+                except Exception as e:
+                    logger.warning("Frame %s analysis failed: %s", frame_data.id, e)
+                    results.append((None, 0.0, None))
+                if on_result:
+                    on_result(frame_data, results[-1][0])
+            return results
+
+        calls = [
+            _submit_call(self._timed_analyze, f, usage, tier, stage) for f, tier in zip(frames, tiers)
+        ]
+        if on_result:
+            for frame_data, call in zip(frames, calls):
+                call.future.add_done_callback(
+                    lambda fut, f=frame_data: on_result(
+                        f, None if fut.cancelled() or fut.exception() else fut.result()[0]
+                    )
+                )
+
+        _wait_calls(calls, self.call_timeout)
+
+        results = []
+        for frame_data, call in zip(frames, calls):
+            if call.timed_out:
+                logger.warning("Frame %s analysis timed out after %ss", frame_data.id, self.call_timeout)
+                results.append((None, 0.0, None))
+                continue
+            try:
+                results.append(call.future.result())
+            except Exception as e:
+                logger.warning("Frame %s analysis failed: %s", frame_data.id, e)
+                results.append((None, 0.0, None))
+        return results
+
+    def _batch_groups(self, frames):
+        """Split frames into groups that respect the per-call image and payload limits"""
+        groups, current, current_bytes = [], [], 0
+        for frame_data in frames:
+            size = len(frame_data.jpeg_bytes)
+            if current and (len(current) >= BEDROCK_MAX_IMAGES_PER_CALL
+                            or current_bytes + size > BEDROCK_MAX_REQUEST_BYTES):
+                groups.append(current)
+                current, current_bytes = [], 0
+            current.append(frame_data)
+            current_bytes += size
+        if current:
+            groups.append(current)
+        return groups
+
+    def analyze_frames_batched(self, frames, include_summary=True, usage=None, tier='vision_large'):
+        """Describe several frames, and optionally the whole scene, in one converse call.
+
+        Returns ({frame id: observation}, comprehensive analysis or None).
+        """
+        return self._describe_batch(frames, include_summary, usage, tier)[:2]
+
+    def _describe_batch(self, frames, include_summary=True, usage=None, tier='vision_large'):
+        """analyze_frames_batched, also returning the model that answered"""
+        content = []
+        for frame_data in frames:
+            content.append({"text": f"Frame {frame_data.id} ({frame_data.timestamp}):"})
+            content.append({"image": {"source": {"bytes": frame_data.jpeg_bytes}, "format": "jpeg"}})
+
+        instructions = f"""
+    These are {len(frames)} frames from a video of a vehicle accident scene, in time order.
+
+    For EACH frame write a heading "### Frame <number>" followed by brief bullet points
+    covering only what is visible in that frame: vehicles and damage, injuries or trapped
+    persons, hazards (smoke, fuel, fire), environmental conditions and emergency services needed.
+"""
+        max_tokens = 256 * len(frames)
+        if include_summary:
+            instructions += f"""
+    Then write a heading "### Comprehensive Analysis" covering all frames together.
+{ANALYSIS_SECTIONS_PROMPT}"""
+            max_tokens += 512
+        content.append({"text": instructions})
+
+        started = time.perf_counter()
+        response, model_id = self.router.converse(
+            self.bedrock_client, tier,
+            messages=[{"role": "user", "content": content}],
+            inferenceConfig={
+                "maxTokens": max_tokens,
+                "temperature": 0.3
+            }
+        )
+        text = response["output"]["message"]["content"][0]["text"]
+        if usage is not None:
+            usage.record("frames", time.perf_counter() - started, response.get("usage"), instructions, text)
+        return (*self._split_batched_response(text), model_id)
+
+    @staticmethod
+    def _split_batched_response(text):
+        summary_match = BATCH_SUMMARY_MARKER.search(text)
+        frames_text = text[:summary_match.start()] if summary_match else text
+        comprehensive = text[summary_match.end():].strip() if summary_match else None
+
+        observations = {}
+        markers = list(BATCH_FRAME_MARKER.finditer(frames_text))
+        for i, marker in enumerate(markers):
+            end = markers[i + 1].start() if i + 1 < len(markers) else len(frames_text)
+            body = frames_text[marker.end():end].strip()
+            if body:
+                observations[int(marker.group(1))] = body
+        return observations, comprehensive or None
+
+    def _call_bedrock_batched(self, frames, on_result=None, usage=None, tier='vision_large', allow_summary=True):
+        """Batched counterpart of _call_bedrock; also returns the comprehensive analysis and call count"""
+        groups = self._batch_groups(frames)
+        single_call = allow_summary and len(groups) == 1
+
+        def run_group(group):
+            started = time.perf_counter()
+            observations, comprehensive, model_id = self._describe_batch(
+                group, include_summary=single_call, usage=usage, tier=tier
+            )
+            return observations, comprehensive, model_id, time.perf_counter() - started
+
+        calls = [_submit_call(run_group, group) for group in groups]
+        _wait_calls(calls, self.call_timeout)
+
+        by_id, comprehensive = {}, None
+        for group, call in zip(groups, calls):
+            if call.timed_out:
+                logger.warning("Batched analysis of frames %s timed out", [f.id for f in group])
+                continue
+            try:
+                observations, group_summary, model_id, seconds = call.future.result()
+            except Exception as e:
+                logger.error("Batched analysis of frames %s failed: %s", [f.id for f in group], e)
+                continue
+            comprehensive = comprehensive or group_summary
+            for frame_data in group:
+                if frame_data.id in observations:
+                    # Spread the call time over its frames for the per-frame latency estimate
+                    by_id[frame_data.id] = (observations[frame_data.id], seconds / len(group), model_id)
+
+        results = [by_id.get(frame_data.id, (None, 0.0, None)) for frame_data in frames]
+        model_calls = len(groups)
+        escalate = [i for i, (description, _, _) in enumerate(results) if self.router.needs_escalation(tier, description)]
+        if escalate:
+            # Frames the small model saw a hazard in are described again, one large call each;
+            # a summary written from the small model's observations is dropped with them
+            comprehensive = None
+            for i, (description, seconds, model_id) in zip(escalate, self._call_bedrock(
+                    [frames[i] for i in escalate], mode='concurrent', usage=usage, stage="escalate")):
+                if description is not None:
+                    results[i] = (description, results[i][1] + seconds, model_id)
+            model_calls += len(escalate)
+
+        if on_result:
+            for frame_data, (description, _, _) in zip(frames, results):
+                on_result(frame_data, description)
+        return results, comprehensive, model_calls
+
+    def analyze_frames(self, frames, on_result=None, cache_stats=None, mode=None, usage=None, routing=None):
+        """Analyze frames with Bedrock.
+
+        Returns (descriptions in frame order, comprehensive analysis or None).
+        The comprehensive analysis is only produced when a single batched call
+        covered every frame that needed the model.
+
+        Frames that look the same as an already described frame, earlier in
+        this video or in any previous one, reuse that description instead of
+        calling the model. A frame whose call fails or times out yields None.
+        `on_result(frame_data, description)` is called as each frame finishes,
+        and `cache_stats`, if given, is filled with the reuse counters. Model
+        calls are recorded into `usage` (a UsageMeter) under "frames", and
+        re-checks of small-model descriptions under "escalate".
+
+        With tiered routing, the frames that need a call are triaged first:
+        unusable ones (dark, flat, blurry) are skipped and yield None without
+        a call, salient ones go to the large vision model and the rest to the
+        small one. `routing`, if given, is filled with the skipped frame ids
+        and per-tier frame counts.
+        """
+        mode = mode or self.analysis_mode
+        ledger = _FrameLedger(self, on_result)
+        leaders = [position for position in map(ledger.admit, frames) if position is not None]
+        ledger.skipped, ledger.tiers = self._triage_frames(frames, leaders)
+        leaders = list(ledger.tiers)
+        tiers = list(ledger.tiers.values())
+
+        comprehensive = None
+        if mode == 'batched':
+            call_results, comprehensive, model_calls = [None] * len(leaders), None, 0
+            # One batch per tier; a summary only comes back when a single call covered every frame
+            for tier in sorted(set(tiers)):
+                positions = [k for k, frame_tier in enumerate(tiers) if frame_tier == tier]
+                tier_results, tier_summary, tier_calls = self._call_bedrock_batched(
+                    [frames[leaders[k]] for k in positions], on_result, usage, tier, allow_summary=len(set(tiers)) == 1
+                )
+                for k, result in zip(positions, tier_results):
+                    call_results[k] = result
+                comprehensive = comprehensive or tier_summary
+                model_calls += tier_calls
+        else:
+            call_results = self._call_bedrock([frames[i] for i in leaders], on_result, mode, usage, tiers)
+            model_calls = len(leaders)
+        for i, result in zip(leaders, call_results):
+            ledger.record(i, *result)
+
+        results, frame_cache, frame_routing = ledger.finish(model_calls)
+        if routing is not None:
+            routing.update(frame_routing)
+        if cache_stats is not None:
+            cache_stats.update(frame_cache)
+        return results, comprehensive
+
+    def frame_namespaces(self):
+        """Frame index namespaces a description may be reused from, best model first.
+
+        Any model of the large vision tier will do; the small tier's models
+        only while frames are routed to them anyway.
+        """
+        tiers = ['vision_large', 'vision_small'] if self.router.tiered else ['vision_large']
+        models = [model for tier in tiers for model in self.router.tiers[tier]]
+        return [frame_namespace(model) for model in dict.fromkeys(models)]
+
+    def _triage_frames(self, frames, positions):
+        """({position: reason} of frames to skip, {position: vision tier}) for the frames at `positions`"""
+        if not self.router.tiered or not positions:
+            return {}, {i: 'vision_large' for i in positions}
+        assessments = self.triage.assess([frames[i].array for i in positions])
+        if not any(a["usable"] for a in assessments):
+            # Describe the best of a bad lot rather than nothing
+            best = max(range(len(positions)), key=lambda k: assessments[k]["sharpness"])
+            assessments[best].update(usable=True, salient=True)
+        skipped, tiers = {}, {}
+        for i, assessment in zip(positions, assessments):
+            if assessment["usable"]:
+                tiers[i] = self.router.frame_tier(assessment["salient"])
+            else:
+                skipped[i] = assessment["reason"]
+        return skipped, tiers
+
     def process_video(self, video_path):
+        # Extract frames
+        frames = self.extract_accident_frames(video_path)
+        return self.analyze_video_frames(frames)
+
+    def summarize_observations(self, timeline, on_delta=None, usage=None):
+        """Turn the frame timeline into the sectioned comprehensive analysis.
+
+        The prompt gets the compact timeline (repeated observations collapsed,
+        hazards and severity tagged), fitted to the summary token budget,
+        rather than every description in full. With `on_delta`, the reply is
+        streamed and each text chunk is passed to it as it arrives. The text
+        model is picked by the timeline's peak severity.
+        """
+        tier = self.router.summary_tier(timeline.peak_severity())
+        lines = self._fit_observations(timeline.compact(), usage, tier)
+        # Generate comprehensive analysis
+        comprehensive_prompt = f"""
+    Based on this timeline of observations from multiple frames of a vehicle accident scene:
+{chr(10).join(lines)}
+
+{ANALYSIS_SECTIONS_PROMPT}"""
+        return self._summarize(comprehensive_prompt, on_delta, usage, tier)
+
+    def summarize_timeline(self, timeline, segments, on_delta=None, usage=None):
+        """Comprehensive analysis of a segmented video.
+
+        `segments` is [(start label, end label, start seconds, end seconds)]
+        in time order; the prompt keeps that order so the model can describe
+        how the incident develops.
+        """
+        lines = []
+        for start, end, start_seconds, end_seconds in segments:
+            lines.append(f"Segment {start}-{end}:")
+            lines.extend(timeline.compact(start_seconds, end_seconds) or ["(no observations)"])
+        tier = self.router.summary_tier(timeline.peak_severity())
+        lines = self._fit_observations(lines, usage, tier)
+        timeline_prompt = f"""
+    These observations come from consecutive segments of a long video of a vehicle accident scene, in time order:
+{chr(10).join(lines)}
+
+    Describe how the incident develops over time and when the key events happen.
+{ANALYSIS_SECTIONS_PROMPT}"""
+        return self._summarize(timeline_prompt, on_delta, usage, tier)
+
+    def _fit_observations(self, lines, usage=None, tier='text_large'):
+        """Dedupe the observation lines and, over budget, condense them map-reduce style"""
+        lines, stats = TokenBudget().fit(lines, lambda groups: self._condense_observations(groups, usage, tier))
+        if usage is not None:
+            usage.details["summary_budget"] = stats
+        return lines
+
+    def _condense_observations(self, groups, usage=None, tier='text_large'):
+        """Map step: rewrite each group of observation lines shorter, concurrently; returns one text per group"""
+        def condense(group):
+            prompt = f"""
+    Condense these timestamped observations of a vehicle accident scene into a few short lines.
+    Keep the [mm:ss] timestamps, every hazard, injury and trapped person, and every change over time.
+    Drop details that repeat.
+{chr(10).join(group)}"""
+            started = time.perf_counter()
+            response, _ = self.router.converse(
+                self.bedrock_client, tier,
+                messages=[{"role": "user", "content": [{"text": prompt}]}],
+                inferenceConfig={"maxTokens": 256, "temperature": 0.2}
+            )
+            text = response["output"]["message"]["content"][0]["text"]
+            if usage is not None:
+                usage.record("condense", time.perf_counter() - started, response.get("usage"), prompt, text)
+            return " ".join(text.split())
+
+        calls = [_submit_call(condense, group) for group in groups]
+        _wait_calls(calls, self.call_timeout)
+        condensed = []
+        for group, call in zip(groups, calls):
+            try:
+                if call.timed_out:
+                    raise TimeoutError(f"timed out after {self.call_timeout}s")
+                condensed.append(call.future.result())
+            except Exception as e:
+                # Keep the group as it was rather than lose its observations
+                logger.warning("Condensing observations failed: %s", e)
+                condensed.append(" ".join(group))
+        return condensed
+
+    def _summarize(self, prompt, on_delta=None, usage=None, tier='text_large'):
+        final_conversation = [{
+            "role": "user",
+            "content": [{"text": prompt}]
+        }]
+
+        inference_config = {
+            "maxTokens": 512,
+            "temperature": 0.5,
+            "topP": 0.9
+        }
+
+        started = time.perf_counter()
+        if on_delta:
+            streaming_response, model = self.router.converse_stream(
+                self.bedrock_client, tier,
+                messages=final_conversation,
+                inferenceConfig=inference_config
+            )
+            chunks = []
+            stream_usage = None
+            for chunk in streaming_response["stream"]:
+                if "contentBlockDelta" in chunk:
+                    text = chunk["contentBlockDelta"]["delta"]["text"]
+                    chunks.append(text)
+                    on_delta(text)
+                elif "metadata" in chunk:
+                    stream_usage = chunk["metadata"].get("usage")
+            text = "".join(chunks)
+            self.router.record_usage(model, stream_usage)
+            if usage is not None:
+                usage.record("summary", time.perf_counter() - started, stream_usage, prompt, text)
+            return text
+
+        final_response, _ = self.router.converse(
+            self.bedrock_client, tier,
+            messages=final_conversation,
+            inferenceConfig=inference_config
+        )
+
+        text = final_response["output"]["message"]["content"][0]["text"]
+        if usage is not None:
+            usage.record("summary", time.perf_counter() - started, final_response.get("usage"), prompt, text)
+        return text
+
+    def _resolve_analysis_mode(self, frames):
+        if self.analysis_mode != 'auto':
+            return self.analysis_mode
+        payload = sum(len(frame_data.jpeg_bytes) for frame_data in frames)
+        if len(frames) <= BEDROCK_MAX_IMAGES_PER_CALL and payload <= BEDROCK_MAX_REQUEST_BYTES:
+            return 'batched'
+        return 'concurrent'
+
+    def analyze_video_frames(self, frames, on_frame_result=None, on_summary_delta=None):
+        """Run Bedrock analysis over already extracted frames and build the report"""
         try:
-            # Extract frames
-            frames = self.extract_accident_frames(video_path)
-            
             # Analyze frames and generate report
-            descriptions = []
-            for frame_data in frames:
-                # Convert base64 back to cv2 frame for analysis
-                img_bytes = base64.b64decode(frame_data['image'])
-                nparr = np.frombuffer(img_bytes, np.uint8)
-                frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-                
-                description = self.analyze_with_bedrock(frame)
-                descriptions.append(description)
+            frame_cache = {}
+            routing = {}
+            timeline = IncidentTimeline(self.parser.rules)
+            usage = UsageMeter()
+            mode = self._resolve_analysis_mode(frames)
+            with usage.timed("frames"):
+                results, comprehensive_analysis = self.analyze_frames(
+                    frames, on_result=self._timeline_recorder(timeline, on_frame_result),
+                    cache_stats=frame_cache, mode=mode, usage=usage, routing=routing
+                )
+            return self._complete_analysis(
+                frames, results, comprehensive_analysis, frame_cache, mode, timeline, usage, routing,
+                on_summary_delta
+            )
+
+        except Exception as e:
+            logger.error("Error processing video: %s", e)
+            raise
 
-            # Generate comprehensive analysis
-            comprehensive_prompt = f"""
-    Based on these observations from multiple frames of a vehicle accident scene:
-    {' '.join(descriptions)}
+    def _complete_analysis(self, frames, results, comprehensive_analysis, frame_cache, mode, timeline, usage,
+                           routing, on_summary_delta=None, timings=None):
+        """Summarize the described frames (unless a batched call already did) and build the response"""
+        skipped = {skip["id"] for skip in routing.get("skipped_frames", [])}
+        failed_frames = [f.id for f, r in zip(frames, results) if r is None and f.id not in skipped]
 
-    Provide a comprehensive incident analysis with EXACTLY these sections:
+        if not len(timeline):
+            raise ValueError("Bedrock analysis failed for every extracted frame")
+        if failed_frames:
+            logger.warning("Continuing without analysis for frames: %s", failed_frames)
 
-    **Vehicle Details:**
-    - Number and types of vehicles involved
-    - Overall damage assessment
-    - Final position of vehicles
+        if comprehensive_analysis is None:
+            with usage.timed("summary"), (timings.timed("summary") if timings else contextlib.nullcontext()):
+                comprehensive_analysis = self.summarize_observations(
+                    timeline, on_delta=on_summary_delta, usage=usage
+                )
+        elif on_summary_delta:
+            # Came back whole from the batched call
+            on_summary_delta(comprehensive_analysis)
 
-    **Casualties and Trapped Persons:**
-    - Total number of visible injuries
-    - Locations of trapped persons
-    - Overall severity assessment
+        return self._build_response(
+            frames, comprehensive_analysis, failed_frames, frame_cache, mode, timeline, usage, routing
+        )
 
-    **Hazard Assessment:**
-    - All identified hazards
-    - Progression of hazards across frames
-    - Current risk level
+    @property
+    def pipelined(self):
+        """Whether process_video can stream frames into analysis as they are decoded.
 
-    **Environmental Conditions:**
-    - Overall scene conditions
-    - Any changes visible across frames
+        Adaptive sampling needs the whole video before it picks frames, and
+        batched calls need every frame before the first call.
+        """
+        return PIPELINE_MODE == 'on' and not self.needs_full_video and self.analysis_mode in ('concurrent', 'sequential')
 
-    **Emergency Services Required:**
-    - Priority services needed
-    - Special equipment requirements
-    - Recommended approach
+    def analyze_video_pipelined(self, video_path, fetch, on_frame_extracted=None, on_frame_result=None,
+                                on_summary_delta=None, block=False):
+        """Download, decode and analyze a video as overlapping stages, then summarize.
 
-    Use bullet points for all details and maintain these EXACT section headers.
-    Focus on actionable information for emergency responders.
-    """
+        `fetch(on_ready)` fills `video_path` and calls `on_ready(indices, stats)`
+        as sampled frames become decodable (indices None: the whole file is
+        there), as S3Service.fetch_video does. Each frame is decoded on the CPU
+        pool as soon as its bytes land, triaged, and handed to Bedrock while
+        later frames are still downloading; stage queues are bounded, so a
+        slow stage holds the ones before it back. Only the summary waits for
+        every frame.
 
-            final_conversation = [{
-                "role": "user",
-                "content": [{"text": comprehensive_prompt}]
-            }]
+        Returns the analysis with a "pipeline" entry of per-stage timings, or
+        None if `fetch` stopped the pipeline (PipelineStopped). Long videos
+        are downloaded in the pipeline and then handed to analyze_long_video.
+        """
+        timeline = IncidentTimeline(self.parser.rules)
+        usage = UsageMeter()
+        timings = StageTimings()
+        stream = FrameStreamAnalysis(self, self._timeline_recorder(timeline, on_frame_result), usage)
+        decoding = {"decoder": None, "segments": None, "next_id": 1}
 
-            final_response = self.bedrock_client.converse(
-                modelId="us.meta.llama3-2-11b-instruct-v1:0",
-                messages=final_conversation,
-                inferenceConfig={
-                    "maxTokens": 512,
-                    "temperature": 0.5,
-                    "topP": 0.9
-                }
+        def download(_, emit):
+            fetch(lambda indices, stats: emit(indices))
+
+        def decode(indices, emit):
+            if decoding["decoder"] is None:
+                decoding["decoder"] = open_video(video_path, max_size=FRAME_MAX_SIZE)
+                decoder = decoding["decoder"]
+                logger.debug("Total video frames: %s (%s decoder)", decoder.frame_count, decoder.backend)
+                decoding["segments"] = self.video_segments(decoder.frame_count, decoder.fps)
+            decoder = decoding["decoder"]
+            if decoding["segments"]:
+                # Sampled per segment once the download is complete
+                return
+            if indices is None:
+                indices = self.select_frame_indices(decoder.frame_count)
+            for idx in indices:
+                # One frame per task, so the first is analyzed while the next decodes
+                frames = cpu_pool.submit(
+                    lambda: list(self.read_sampled_frames(decoder, [idx], decoding["next_id"])), block=block
+                ).result()
+                for extracted in frames:
+                    decoding["next_id"] += 1
+                    if on_frame_extracted:
+                        on_frame_extracted(extracted)
+                    emit(extracted)
+
+        def triage(frame_data, emit):
+            if stream.admit(frame_data):
+                emit(frame_data)
+
+        def analyze(frame_data, emit):
+            stream.analyze(frame_data)
+
+        workers = 1 if self.analysis_mode == 'sequential' else PIPELINE_ANALYZE_WORKERS
+        pipeline = StagePipeline([
+            PipelineStage("download", download),
+            PipelineStage("decode", decode),
+            PipelineStage("triage", triage),
+            PipelineStage("analyze", analyze, workers=workers)
+        ], timings)
+        try:
+            pipeline.run([video_path])
+        finally:
+            if decoding["decoder"] is not None:
+                decoding["decoder"].close()
+        if pipeline.stopped:
+            return None
+
+        if decoding["segments"]:
+            return self.analyze_long_video(
+                video_path, decoding["segments"], on_frame_extracted=on_frame_extracted,
+                on_frame_result=on_frame_result, on_summary_delta=on_summary_delta
             )
+        if not stream.frames:
+            raise ValueError("No frames were extracted from the video")
 
-            comprehensive_analysis = final_response["output"]["message"]["content"][0]["text"]
-            
-            # Format the analysis into structured sections
-            formatted_analysis = self.format_analysis_response(comprehensive_analysis)
-            print("Formatted analysis before return:", formatted_analysis)
-            print("Analysis section being returned:", formatted_analysis["analysis"])
-
-            # Generate keywords and report
-            keywords = self.extract_keywords([comprehensive_analysis])
-            report = self.generate_report([comprehensive_analysis], keywords)
-
-            response_data = {
-                "status": "success",
-                "frames": frames,
-                "report": report,
-                "analysis": formatted_analysis["analysis"],
-                "keywords": keywords
-            }
-            
-            print("Final response data:", response_data)
-            return response_data
+        try:
+            frames, results, frame_cache, routing = stream.finish()
+            response = self._complete_analysis(
+                frames, results, None, frame_cache, self.analysis_mode, timeline, usage, routing,
+                on_summary_delta, timings
+            )
+        except Exception as e:
+            logger.error("Error processing video: %s", e)
+            raise
+        response["pipeline"] = timings.to_dict()
+        return response
+
+    def analyze_long_video(self, video_path, segments, on_frame_extracted=None, on_frame_result=None,
+                           on_summary_delta=None, extraction_pool=None):
+        """Process a long video segment by segment, in parallel, then merge along the timeline.
+
+        Each segment is sampled and its frames analyzed independently, so the
+        wall clock is close to one segment's time as long as SEGMENT_WORKERS
+        and the Bedrock concurrency cap cover the segments. Decoding goes
+        through the CPU pool (or `extraction_pool`) and Bedrock calls through
+        the shared frame executor, so both stay within the process limits;
+        segments wait for pool capacity rather than failing part way through.
+        """
+        try:
+            timeline = IncidentTimeline(self.parser.rules)
+            usage = UsageMeter()
+            record = self._timeline_recorder(timeline, on_frame_result)
+            frames_per_segment = self.sampler.max_frames if self.sampling_mode == 'adaptive' else SEGMENT_FRAMES
+
+            def run_segment(number, start, end):
+                first_id = number * frames_per_segment + 1
+                if extraction_pool is not None:
+                    frames = self.extract_segment_frames(video_path, start, end, first_id, extraction_pool, True)
+                else:
+                    frames = cpu_pool.submit(
+                        self.extract_segment_frames, video_path, start, end, first_id, block=True
+                    ).result()
+                if on_frame_extracted:
+                    for extracted in frames:
+                        on_frame_extracted(extracted)
+                stats, routing = {}, {}
+                mode = self._resolve_analysis_mode(frames)
+                # Segments are merged by summarize_timeline, so a batched segment's own summary goes unused
+                results, _ = self.analyze_frames(
+                    frames, on_result=record, cache_stats=stats, mode=mode, usage=usage, routing=routing
+                )
+                return frames, results, stats, mode, routing
+
+            with usage.timed("segments"), \
+                    ThreadPoolExecutor(max_workers=min(SEGMENT_WORKERS, len(segments))) as segment_pool:
+                futures = [
+                    segment_pool.submit(contextvars.copy_context().run, run_segment, number, start, end)
+                    for number, (start, end) in enumerate(segments)
+                ]
+                outputs = [future.result() for future in futures]
+
+            frame_rate = self.probe_video(video_path)[1]
+            frames, failed_frames, spans = [], [], []
+            frame_cache = {"frames": 0, "hits": 0, "model_calls": 0, "model_calls_avoided": 0,
+                           "latency_saved_seconds": 0.0}
+            routing = {"skipped_frames": [], "vision_large": 0, "vision_small": 0}
+            for (start, end), (segment_frames, results, stats, _, segment_routing) in zip(segments, outputs):
+                frames.extend(segment_frames)
+                skipped = {skip["id"] for skip in segment_routing.get("skipped_frames", [])}
+                failed_frames.extend(f.id for f, r in zip(segment_frames, results) if r is None and f.id not in skipped)
+                for name in routing:
+                    routing[name] += segment_routing.get(name, [] if name == "skipped_frames" else 0)
+                # Whole seconds, the resolution of frame timestamps
+                start_seconds, end_seconds = int(start / frame_rate), int(end / frame_rate)
+                spans.append((
+                    self._format_timestamp(start_seconds), self._format_timestamp(end_seconds),
+                    start_seconds, end_seconds
+                ))
+                for name in frame_cache:
+                    frame_cache[name] += stats.get(name, 0)
+            frame_cache["hit_rate"] = frame_cache["hits"] / frame_cache["frames"] if frame_cache["frames"] else 0.0
+
+            if not len(timeline):
+                raise ValueError("Bedrock analysis failed for every extracted frame")
+            if failed_frames:
+                logger.warning("Continuing without analysis for frames: %s", failed_frames)
+
+            with usage.timed("summary"):
+                comprehensive_analysis = self.summarize_timeline(timeline, spans, on_delta=on_summary_delta, usage=usage)
+            modes = {output[3] for output in outputs}
+            response = self._build_response(
+                frames, comprehensive_analysis, failed_frames, frame_cache,
+                modes.pop() if len(modes) == 1 else 'mixed', timeline, usage, routing
+            )
+            response["segments"] = [
+                {"start": start, "end": end, "frames": [f.id for f in output[0]]}
+                for (start, end, _, _), output in zip(spans, outputs)
+            ]
+            return response
 
         except Exception as e:
-            print(f"Error processing video: {str(e)}")
+            logger.error("Error processing video: %s", e)
             raise
 
+    @staticmethod
+    def _timeline_recorder(timeline, on_frame_result=None):
+        """on_result callback that adds each described frame to `timeline` as it finishes"""
+        def record(frame_data, description):
+            if description is not None:
+                timeline.add(frame_data.id, frame_data.timestamp, description)
+            if on_frame_result:
+                on_frame_result(frame_data, description)
+        return record
 
+    def _build_response(self, frames, comprehensive_analysis, failed_frames, frame_cache, mode, timeline, usage,
+                        routing):
+        # Sections, keywords, services and severity in one pass over the text
+        with span("parse", chars=len(comprehensive_analysis)):
+            parsed = self.parser.parse(comprehensive_analysis)
+        logger.debug("Analysis sections: %s", list(parsed.sections))
+        keywords = parsed.keywords
+        report = self.generate_report([comprehensive_analysis], keywords, parsed)
 
-    def format_analysis_response(self, analysis_text):
-        """Format the analysis text into structured sections"""
-        sections = {
-            'analysis': {
-                'vehicleDetails': [],
-                'casualties': [],
-                'hazards': [],
-                'environment': [],
-                'services': []
-            }
+        response_data = {
+            "status": "success",
+            "frames": frames,
+            "report": report,
+            "analysis": parsed.sections,
+            "keywords": keywords,
+            "severity": parsed.severity,
+            "severity_score": parsed.severity_score,
+            "failed_frames": failed_frames,
+            # Dropped by triage as unusable (dark, flat, blurry); not failures
+            "skipped_frames": [skip["id"] for skip in routing.get("skipped_frames", [])],
+            "frame_cache": frame_cache,
+            "routing": {"mode": self.router.mode, **routing},
+            "analysis_mode": mode,
+            "timeline": timeline.to_dict(),
+            "usage": usage.to_dict()
         }
-        
-        current_section = None
-        lines = analysis_text.split('\n')
-        in_bullet_list = False
-        
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-                
-            # Check for section headers
-            if "**Vehicle Details:**" in line:
-                current_section = 'vehicleDetails'
-                in_bullet_list = False
-                continue
-            elif "**Casualties and Trapped Persons:**" in line:
-                current_section = 'casualties'
-                in_bullet_list = False
-                continue
-            elif "**Hazard Assessment:**" in line:
-                current_section = 'hazards'
-                in_bullet_list = False
-                continue
-            elif "**Environmental Conditions:**" in line:
-                current_section = 'environment'
-                in_bullet_list = False
-                continue
-            elif "**Emergency Services Required:**" in line:
-                current_section = 'services'
-                in_bullet_list = False
-                continue
-                
-            # Process bullet points
-            if current_section and (line.startswith('-') or line.startswith('*') or line.startswith('•')):
-                in_bullet_list = True
-                # Clean up the bullet point
-                cleaned_line = line.lstrip('-*• ').strip()
-                if cleaned_line and not cleaned_line.endswith(':'):
-                    sections['analysis'][current_section].append(cleaned_line)
-            # Handle nested bullet points
-            elif current_section and in_bullet_list and line.strip().startswith('*'):
-                cleaned_line = line.lstrip('*• ').strip()
-                if cleaned_line and not cleaned_line.endswith(':'):
-                    sections['analysis'][current_section].append(cleaned_line)
-        
-        return sections
 
+        # Never the frames themselves: their base64 would cost more to log than to analyze
+        logger.info(
+            "Analysis done: %d frames, %d failed, %d skipped, severity %s",
+            len(frames), len(failed_frames), len(response_data["skipped_frames"]), parsed.severity
+        )
+        return response_data
 
+    def format_analysis_response(self, analysis_text):
+        """Format the analysis text into structured sections"""
+        return {'analysis': self.parser.parse(analysis_text).sections}
 
     def extract_keywords(self, descriptions):
-            """Extract keywords from descriptions"""
-            keywords = []
-            combined_text = " ".join(descriptions).lower()
-            
-            if "fire" in combined_text or "flames" in combined_text:
-                keywords.append("Fire Hazard")
-            if "smoke" in combined_text:
-                keywords.append("Smoke")
-            if "trapped" in combined_text:
-                keywords.append("Trapped Occupants")
-            if "injury" in combined_text or "injured" in combined_text:
-                keywords.append("Injuries")
-            if "collision" in combined_text or "crash" in combined_text:
-                keywords.append("Vehicle Collision")
-            if "fuel" in combined_text or "leak" in combined_text:
-                keywords.append("Fuel Leak")
-                
-            return list(set(keywords))
+        """Extract keywords from descriptions"""
+        return self.parser.parse(" ".join(descriptions)).keywords
 
-    def generate_report(self, descriptions, keywords):
-            """Generate comprehensive report"""
-            severity = "HIGH" if any(k in ["Fire Hazard", "Trapped Occupants"] for k in keywords) else "MODERATE"
-            
-            report = f"""URGENT: Vehicle Incident Report
+    def generate_report(self, descriptions, keywords, parsed=None):
+        """Generate comprehensive report; `parsed` is the ParsedAnalysis the keywords came from, if at hand"""
+        severity = parsed.severity if parsed else (
+            "HIGH" if any(rule.high for rule in self.parser.rules if rule.keyword in keywords) else "MODERATE"
+        )
+
+        report = f"""URGENT: Vehicle Incident Report
     Severity Level: {severity}
     Time of Report: {time.strftime('%H:%M:%S')}
 
@@ -341,18 +1142,183 @@ class AnalysisService:
     {chr(10).join(f'Frame {i+1}: {desc}' for i, desc in enumerate(descriptions))}
 
     RECOMMENDED SERVICES:
-    {self.get_recommended_services(keywords)}
+    {self.get_recommended_services(keywords, parsed)}
     """
-            return report
+        return report
 
-    def get_recommended_services(self, keywords):
+    def get_recommended_services(self, keywords, parsed=None):
+        if parsed is not None:
+            services = parsed.services
+        else:
             services = []
-            if "Fire Hazard" in keywords or "Smoke" in keywords:
-                services.append("- Fire Department (URGENT)")
-            if "Injuries" in keywords or "Trapped Occupants" in keywords:
-                services.append("- Emergency Medical Services")
-            if "Vehicle Collision" in keywords:
-                services.append("- Police")
-            if "Fuel Leak" in keywords:
-                services.append("- Hazmat Team")
-            return "\n".join(services)
\ No newline at end of file
+            for rule in self.parser.rules:
+                if rule.keyword in keywords:
+                    services.extend(service for service in rule.services if service not in services)
+        return "\n".join(f"- {service}" for service in services)
+
+
+class _FrameLedger:
+    """Per-frame reuse decisions and accounting shared by analyze_frames and FrameStreamAnalysis.
+
+    `admit(frame)`, called in time order, reuses a description from the
+    frame index or pairs the frame with a similar earlier one of this
+    video; it returns the frame's position when the frame needs a model
+    call (subject to triage), else None. The caller fills `tiers` with the
+    frames it sends to the model and `skipped` with those triage drops,
+    and `record`s each call's result. `finish` settles the followers and
+    returns (descriptions, cache stats, routing).
+    """
+
+    def __init__(self, service, on_result=None):
+        self.service = service
+        self.on_result = on_result
+        self.namespaces = service.frame_namespaces()
+        self.frames = []
+        self.tiers = {}    # position -> vision tier, for frames sent to the model
+        self.skipped = {}  # position -> triage reason
+        self.leaders = []  # positions of frames that were not reused or paired
+        self._hashes = []
+        self._results = {}
+        self._reused = 0
+        self._followers = {}  # position -> position of a similar frame in this video
+        self._lock = threading.Lock()
+
+    def admit(self, frame_data):
+        position = len(self.frames)
+        self.frames.append(frame_data)
+        frame_hash = dhash(frame_data.array)
+        self._hashes.append(frame_hash)
+
+        index = self.service.frame_index
+        description = next(
+            (found for found in (index.lookup(frame_hash, namespace) for namespace in self.namespaces)
+             if found is not None),
+            None
+        )
+        if description is not None:
+            self._reused += 1
+            self._settle(position, description)
+            return None
+        leader = next(
+            (j for j in self.leaders if hamming_distance(self._hashes[j], frame_hash) <= index.max_distance), None
+        )
+        if leader is not None:
+            self._followers[position] = leader
+            return None
+        self.leaders.append(position)
+        return position
+
+    def record(self, position, description, seconds, model_id):
+        """Result of the model call for the frame at `position`; on_result is left to the caller"""
+        with self._lock:
+            self._results[position] = description
+            if description is None:
+                return
+            # Under the model that wrote it, which with routing or fallback is not always the large one
+            self.service.frame_index.add(self._hashes[position], frame_namespace(model_id), description)
+            average = self.service.average_call_seconds
+            self.service.average_call_seconds = seconds if not average else 0.8 * average + 0.2 * seconds
+
+    def _settle(self, position, description):
+        self._results[position] = description
+        if self.on_result:
+            self.on_result(self.frames[position], description)
+
+    def finish(self, model_calls=None):
+        """(descriptions in frame order, cache stats, routing); `model_calls` defaults to one per tiered frame"""
+        for i, leader in self._followers.items():
+            if leader in self.skipped:
+                self.skipped[i] = self.skipped[leader]
+                continue
+            self._settle(i, self._results.get(leader))
+
+        tiers = list(self.tiers.values())
+        routing = {
+            "skipped_frames": [{"id": self.frames[i].id, "reason": reason} for i, reason in sorted(self.skipped.items())],
+            "vision_large": tiers.count('vision_large'),
+            "vision_small": tiers.count('vision_small')
+        }
+        avoided = self._reused + len(self._followers)
+        cache_stats = {
+            "frames": len(self.frames),
+            "hits": avoided,
+            "hit_rate": avoided / len(self.frames) if self.frames else 0.0,
+            "model_calls": len(tiers) if model_calls is None else model_calls,
+            "model_calls_avoided": avoided,
+            "latency_saved_seconds": avoided * self.service.average_call_seconds
+        }
+        return [self._results.get(i) for i in range(len(self.frames))], cache_stats, routing
+
+
+class FrameStreamAnalysis:
+    """AnalysisService.analyze_frames for frames that arrive one at a time, as a pipeline decodes them.
+
+    `admit(frame)` is called in time order and does the cheap part: reuse
+    from the frame index, pairing with a similar earlier frame of this
+    video, and triage. It returns True when the frame needs a model call,
+    which `analyze(frame)` then makes, from any number of threads at once.
+    `finish` settles the frames that followed a similar one and the case
+    where triage found nothing usable, and returns (frames, descriptions,
+    cache stats, routing) as analyze_frames fills them.
+    """
+
+    def __init__(self, service, on_result=None, usage=None):
+        self.service = service
+        self.on_result = on_result
+        self.usage = usage
+        self._ledger = _FrameLedger(service, on_result)
+        self._positions = {}
+        self._assessments = {}
+        self._previous = None
+
+    @property
+    def frames(self):
+        return self._ledger.frames
+
+    def admit(self, frame_data):
+        position = self._ledger.admit(frame_data)
+        if position is None:
+            return False
+        self._positions[frame_data.id] = position
+
+        if not self.service.router.tiered:
+            self._ledger.tiers[position] = 'vision_large'
+            return True
+        assessment, grey = self.service.triage.assess_frame(frame_data.array, self._previous)
+        if grey is None:
+            self._ledger.skipped[position] = assessment["reason"]
+            self._assessments[position] = assessment
+            return False
+        self._previous = grey
+        self._ledger.tiers[position] = self.service.router.frame_tier(assessment["salient"])
+        return True
+
+    def analyze(self, frame_data):
+        """Describe one admitted frame; None if the call fails or times out"""
+        position = self._positions[frame_data.id]
+        call = _submit_call(self.service._timed_analyze, frame_data, self.usage, self._ledger.tiers[position], "frames")
+        _wait_calls([call], self.service.call_timeout)
+        try:
+            if call.timed_out:
+                raise TimeoutError(f"timed out after {self.service.call_timeout}s")
+            description, seconds, model_id = call.future.result()
+        except Exception as e:
+            logger.warning("Frame %s analysis failed: %s", frame_data.id, e)
+            description, seconds, model_id = None, 0.0, None
+
+        self._ledger.record(position, description, seconds, model_id)
+        if self.on_result:
+            self.on_result(frame_data, description)
+        return description
+
+    def finish(self):
+        ledger = self._ledger
+        if ledger.leaders and not ledger.tiers:
+            # Describe the best of a bad lot rather than nothing
+            best = max(ledger.skipped, key=lambda i: self._assessments[i]["sharpness"])
+            del ledger.skipped[best]
+            ledger.tiers[best] = self.service.router.frame_tier(True)
+            self.analyze(ledger.frames[best])
+
+        results, cache_stats, routing = ledger.finish()
+        return ledger.frames, results, cache_stats, routing
@@ -0,0 +1,93 @@
+import os
+import threading
+
+import boto3
+from botocore.config import Config
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Connection pool per client; should cover the largest thread pool that shares it
+AWS_MAX_POOL_CONNECTIONS = int(os.getenv('AWS_MAX_POOL_CONNECTIONS', '50'))
+AWS_CONNECT_TIMEOUT = float(os.getenv('AWS_CONNECT_TIMEOUT', '5'))
+AWS_READ_TIMEOUT = float(os.getenv('AWS_READ_TIMEOUT', '60'))
+# "adaptive" adds client-side rate limiting on throttling errors on top of standard retries
+AWS_RETRY_MODE = os.getenv('AWS_RETRY_MODE', 'adaptive')
+AWS_MAX_ATTEMPTS = int(os.getenv('AWS_MAX_ATTEMPTS', '3'))
+AWS_TCP_KEEPALIVE = os.getenv('AWS_TCP_KEEPALIVE', 'true').lower() == 'true'
+
+# Credential sets in the .env file. Bedrock runs under a separate account (the *1 variables).
+_PROFILES = {
+    'default': ('AWS_ACCESS_KEY_ID', 'AWS_SECRET_ACCESS_KEY', 'AWS_REGION', None),
+    'bedrock': ('AWS_ACCESS_KEY_ID1', 'AWS_SECRET_ACCESS_KEY1', 'AWS_REGION1', 'us-west-2'),
+}
+
+_lock = threading.Lock()
+_sessions = {}
+_clients = {}
+_resources = {}
+
+
+def _base_config(**overrides):
+    settings = {
+        'max_pool_connections': AWS_MAX_POOL_CONNECTIONS,
+        'connect_timeout': AWS_CONNECT_TIMEOUT,
+        'read_timeout': AWS_READ_TIMEOUT,
+        'retries': {'mode': AWS_RETRY_MODE, 'max_attempts': AWS_MAX_ATTEMPTS},
+        'tcp_keepalive': AWS_TCP_KEEPALIVE,
+    }
+    settings.update(overrides)
+    return Config(**settings)
+
+
+def get_session(profile='default'):
+    """boto3 Session for a credential profile, created on first use"""
+    with _lock:
+        session = _sessions.get(profile)
+        if session is None:
+            key_var, secret_var, region_var, default_region = _PROFILES[profile]
+            session = boto3.session.Session(
+                aws_access_key_id=os.getenv(key_var),
+                aws_secret_access_key=os.getenv(secret_var),
+                region_name=os.getenv(region_var) or default_region
+            )
+            _sessions[profile] = session
+        return session
+
+
+def get_client(service_name, profile='default', **config_overrides):
+    """Shared, lazily created client; clients are thread-safe and reuse their connection pool.
+
+    `config_overrides` are botocore Config options (e.g. read_timeout) and
+    give a separate client per distinct combination.
+    """
+    # repr, since some options (e.g. retries) are dicts
+    key = (service_name, profile, repr(sorted(config_overrides.items(), key=lambda item: item[0])))
+    client = _clients.get(key)
+    if client is not None:
+        return client
+
+    session = get_session(profile)
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            # Session.client is not thread-safe, hence the lock
+            client = session.client(service_name, config=_base_config(**config_overrides))
+            _clients[key] = client
+        return client
+
+
+def get_resource(service_name, profile='default'):
+    """Shared, lazily created boto3 resource (e.g. DynamoDB)"""
+    key = (service_name, profile)
+    resource = _resources.get(key)
+    if resource is not None:
+        return resource
+
+    session = get_session(profile)
+    with _lock:
+        resource = _resources.get(key)
+        if resource is None:
+            resource = session.resource(service_name, config=_base_config())
+            _resources[key] = resource
+        return resource
@@ -0,0 +1,313 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+from ..utils.image_hash import hamming_distance
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+class ResultCache:
+    """Two-tier cache for finished video analyses.
+
+    The memory tier is an LRU bounded by the JSON size of its entries; the
+    optional disk tier (one JSON file per key under `disk_dir`) survives
+    restarts. Both tiers honour the same TTL. Values must be JSON-serializable.
+    """
+
+    def __init__(self, max_bytes=None, ttl=None, disk_dir=None):
+        self.max_bytes = max_bytes or int(os.getenv('RESULT_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+        self.ttl = ttl or float(os.getenv('RESULT_CACHE_TTL', str(24 * 3600)))
+        self.disk_dir = disk_dir if disk_dir is not None else os.getenv('RESULT_CACHE_DIR')
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, size, value)
+        self._aliases = OrderedDict()  # alias -> (expires_at, content_hash)
+        self._bytes = 0
+        self.counters = {
+            "hits_memory": 0,
+            "hits_disk": 0,
+            "misses": 0,
+            "evictions": 0,
+            "alias_hits": 0,
+        }
+
+    @staticmethod
+    def make_key(content_hash, model_id, prompt_version):
+        return hashlib.sha256(f"{content_hash}|{model_id}|{prompt_version}".encode()).hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, size, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.counters["hits_memory"] += 1
+                    return value
+                self._drop(key)
+
+        value = self._disk_get(key, now)
+        with self._lock:
+            if value is None:
+                self.counters["misses"] += 1
+                return None
+            self.counters["hits_disk"] += 1
+        # Promote so the next hit is served from memory
+        self._memory_put(key, value, now + self.ttl)
+        return value
+
+    def put(self, key, value):
+        expires_at = time.time() + self.ttl
+        self._memory_put(key, value, expires_at)
+        self._disk_put(key, value, expires_at)
+
+    def get_alias(self, alias):
+        """Content hash previously recorded for a cheap identity such as (S3 key, ETag)"""
+        with self._lock:
+            entry = self._aliases.get(alias)
+            if entry is None:
+                return None
+            expires_at, content_hash = entry
+            if expires_at <= time.time():
+                del self._aliases[alias]
+                return None
+            self._aliases.move_to_end(alias)
+            self.counters["alias_hits"] += 1
+            return content_hash
+
+    def set_alias(self, alias, content_hash, max_aliases=10000):
+        with self._lock:
+            self._aliases[alias] = (time.time() + self.ttl, content_hash)
+            self._aliases.move_to_end(alias)
+            while len(self._aliases) > max_aliases:
+                self._aliases.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self.counters,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def _memory_put(self, key, value, expires_at):
+        size = len(json.dumps(value))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (expires_at, size, value)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.counters["evictions"] += 1
+
+    def _drop(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _disk_get(self, key, now):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get("expires_at", 0) <= now:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            return None
+        return entry.get("value")
+
+    def _disk_put(self, key, value, expires_at):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        temp_path = f"{path}.tmp"
+        try:
+            with open(temp_path, 'w') as f:
+                json.dump({"expires_at": expires_at, "value": value}, f)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.error("Error writing result cache entry to disk: %s", e)
+
+
+class FrameHashIndex:
+    """Perceptual-hash index of frames that already have a model description.
+
+    A frame whose hash is within `reuse_distance` bits of an indexed frame
+    (same model and prompt version) reuses that frame's description instead
+    of another Bedrock call. The index is shared across videos, where a few
+    bits can be the difference between smoke and none, so reuse defaults to
+    exact matches; `max_distance`, the looser threshold for near-duplicate
+    frames of one video, is what the callers group followers by and caps
+    `reuse_distance`.
+
+    Hashes are split into `reuse_distance + 1` bands, each indexed exactly:
+    two hashes within that distance agree on at least one band, so a lookup
+    only measures the entries sharing a band instead of scanning the index.
+    Entries expire after `ttl` seconds, and the oldest are dropped once
+    `max_entries` is reached.
+    """
+
+    HASH_BITS = 64
+
+    def __init__(self, max_distance=None, max_entries=None, reuse_distance=None, ttl=None):
+        self.max_distance = max_distance if max_distance is not None else int(os.getenv('FRAME_HASH_MAX_DISTANCE', '6'))
+        reuse_distance = reuse_distance if reuse_distance is not None else int(os.getenv('FRAME_HASH_REUSE_DISTANCE', '0'))
+        self.reuse_distance = min(reuse_distance, self.max_distance)
+        self.max_entries = max_entries or int(os.getenv('FRAME_HASH_INDEX_SIZE', '5000'))
+        self.ttl = ttl or float(os.getenv('FRAME_HASH_TTL', '3600'))
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # (namespace, hash) -> (expires_at, description), oldest first
+        self._bands = {}  # (namespace, band, bits of the hash in that band) -> {hash}
+        # Exact reuse needs no bands: the entries dict is the index
+        self._band_masks = []
+        if self.reuse_distance > 0:
+            band_count = min(self.reuse_distance + 1, self.HASH_BITS)
+            edges = [band * self.HASH_BITS // band_count for band in range(band_count + 1)]
+            self._band_masks = [(low, (1 << (high - low)) - 1) for low, high in zip(edges, edges[1:])]
+
+    def _band_keys(self, frame_hash, namespace):
+        return [(namespace, band, frame_hash >> shift & mask) for band, (shift, mask) in enumerate(self._band_masks)]
+
+    def lookup(self, frame_hash, namespace):
+        if self.reuse_distance < 0:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get((namespace, frame_hash))
+            if entry is not None:
+                if entry[0] > now:
+                    return entry[1]
+                self._drop((namespace, frame_hash))
+            candidates = set()
+            for band_key in self._band_keys(frame_hash, namespace):
+                candidates.update(self._bands.get(band_key, ()))
+            best, best_distance = None, self.reuse_distance + 1
+            for entry_hash in candidates:
+                distance = hamming_distance(frame_hash, entry_hash)
+                if distance < best_distance:
+                    expires_at, description = self._entries[(namespace, entry_hash)]
+                    if expires_at > now:
+                        best, best_distance = description, distance
+            return best
+
+    def add(self, frame_hash, namespace, description):
+        now = time.time()
+        key = (namespace, frame_hash)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (now + self.ttl, description)
+            for band_key in self._band_keys(frame_hash, namespace):
+                self._bands.setdefault(band_key, set()).add(frame_hash)
+            # Entries share one TTL, so the expired ones are at the front
+            while self._entries and (len(self._entries) > self.max_entries or next(iter(self._entries.values()))[0] <= now):
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, key):
+        del self._entries[key]
+        namespace, frame_hash = key
+        for band_key in self._band_keys(frame_hash, namespace):
+            bucket = self._bands[band_key]
+            bucket.discard(frame_hash)
+            if not bucket:
+                del self._bands[band_key]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class IncidentFeedCache:
+    """Read-through cache for pages of the past-incidents feed.
+
+    Entries are keyed by the page's query parameters and carry an ETag
+    derived from their content. `invalidate` (called on every save) drops
+    all pages; a load that raced with an invalidation is returned but not
+    stored. The TTL bounds staleness from writers in other processes.
+    """
+
+    def __init__(self, max_entries=None, ttl=None):
+        self.max_entries = max_entries or int(os.getenv('INCIDENT_CACHE_SIZE', '256'))
+        self.ttl = ttl or float(os.getenv('INCIDENT_CACHE_TTL', '60'))
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, etag, value)
+        self._generation = 0
+        self.counters = {
+            "hits": 0,
+            "misses": 0,
+            "invalidations": 0,
+        }
+
+    @staticmethod
+    def make_etag(value):
+        digest = hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()
+        return f'"{digest[:32]}"'
+
+    def peek_etag(self, key):
+        """ETag of a fresh cached page, without loading it"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.time():
+                return None
+            self.counters["hits"] += 1
+            return entry[1]
+
+    def get_or_load(self, key, loader):
+        """(value, etag) for `key`, calling `loader()` on a miss"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.counters["hits"] += 1
+                return entry[2], entry[1]
+            self.counters["misses"] += 1
+            generation = self._generation
+
+        value = loader()
+        etag = self.make_etag(value)
+        with self._lock:
+            if generation == self._generation:
+                self._entries[key] = (time.time() + self.ttl, etag, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return value, etag
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self.counters["invalidations"] += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self.counters,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+            }
@@ -1,17 +1,194 @@
-import boto3
-from datetime import datetime
+from datetime import datetime, timedelta
+import base64
+import json
+import logging
+import math
+import re
+import threading
+import time
 import uuid
 import os
+import zlib
+from boto3.dynamodb.conditions import Attr, Key
+from botocore.exceptions import ClientError
+from .analysis_parser import AnalysisParser
+from .aws_clients import get_resource
+from .cache_service import IncidentFeedCache
+from .incident_writer import WriteBehindBuffer, to_dynamodb
+from ..utils.metrics import span
+
+logger = logging.getLogger(__name__)
+
+# Time-ordered GSI partitioned by month of the incident timestamp and a shard, sorted by
+# "<timestamp>#<incident_id>": "latest N" walks the buckets backwards, reading N items per shard
+# at most, and writes spread over INCIDENT_BUCKET_SHARDS partitions instead of one hot one
+INCIDENT_INDEX_NAME = os.getenv('INCIDENT_INDEX_NAME', 'timeline-bucket-index')
+# Changing this needs backfill_index_attributes(rebucket=True) before reads see every incident
+INCIDENT_BUCKET_SHARDS = int(os.getenv('INCIDENT_BUCKET_SHARDS', '4'))
+# Oldest month (YYYY-MM) the timeline walk visits; a walk past the newest incidents stops here
+INCIDENT_TIMELINE_START = os.getenv('INCIDENT_TIMELINE_START', '2020-01')
+# Month buckets one page may visit, each costing INCIDENT_BUCKET_SHARDS queries; a page that
+# reaches it ends early with a token, like one that reaches INCIDENT_MAX_EVALUATED
+INCIDENT_MAX_BUCKETS = int(os.getenv('INCIDENT_MAX_BUCKETS', '6'))
+# Seconds a process trusts its copy of the timeline range; a month first written by
+# another process becomes visible here after at most this long
+TIMELINE_RANGE_TTL = float(os.getenv('TIMELINE_RANGE_TTL', '60'))
+# Key of the item holding the oldest and newest month with incidents; it has no
+# timeline attributes, so it stays out of the index
+TIMELINE_RANGE_ID = '#timeline-range'
+# The attributes the past-incidents list shows; the only ones copied into the index besides its keys
+INCIDENT_LIST_ATTRIBUTES = ['timestamp', 'incident_report', 'selected_services', 'notes', 'severity', 'created_at']
+INCIDENT_PAGE_SIZE = int(os.getenv('INCIDENT_PAGE_SIZE', '50'))
+INCIDENT_MAX_PAGE_SIZE = 200
+# Upper bound on items evaluated per request when filters discard most of them;
+# the caller gets a page token to continue instead of an unbounded read
+INCIDENT_MAX_EVALUATED = int(os.getenv('INCIDENT_MAX_EVALUATED', '1000'))
+
+# "buffered": saves are journaled locally and written in batches by a background thread;
+# "direct": one put_item per save on the request path
+INCIDENT_WRITE_MODE = os.getenv('INCIDENT_WRITE_MODE', 'buffered')
+
+SERVICE_NAMES = ('police', 'ambulance', 'fire')
+SEVERITY_LEVELS = ('HIGH', 'MODERATE')
+
+_severity_parser = AnalysisParser()
+
+
+class InvalidPageTokenError(ValueError):
+    pass
+
+
+def encode_page_token(last_evaluated_key):
+    if not last_evaluated_key:
+        return None
+    raw = json.dumps(last_evaluated_key, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_page_token(token):
+    try:
+        key = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+    except (ValueError, UnicodeError) as e:
+        raise InvalidPageTokenError(f"Invalid page token: {e}")
+    if not isinstance(key, dict) or not all(isinstance(v, str) for v in key.values()):
+        raise InvalidPageTokenError("Invalid page token")
+    return key
+
+
+def _bucket_month(timestamp, fallback):
+    """YYYY-MM of an ISO timestamp, or of `fallback` when the timestamp is not one"""
+    for value in (timestamp, fallback):
+        if isinstance(value, str) and re.match(r'\d{4}-\d{2}', value):
+            return value[:7]
+    return datetime.utcnow().strftime('%Y-%m')
+
+
+def _previous_month(month):
+    year, number = int(month[:4]), int(month[5:7])
+    return f"{year - 1}-12" if number == 1 else f"{year}-{number - 1:02d}"
+
+
+def _month_of(item):
+    return item['timeline_bucket'].split('#', 1)[0]
+
+
+def _flatten_text(value):
+    """All strings in a nested report, for keyword search and severity"""
+    if isinstance(value, str):
+        return [value]
+    if isinstance(value, dict):
+        return [text for item in value.values() for text in _flatten_text(item)]
+    if isinstance(value, (list, tuple)):
+        return [text for item in value for text in _flatten_text(item)]
+    return []
+
 
 class DynamoDBService:
     def __init__(self):
-        self.dynamodb = boto3.resource(
-            'dynamodb',
-            aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
-            aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
-            region_name=os.getenv('AWS_REGION')
+        self.table_name = 'EmergencyIncidents'
+        self.index_name = INCIDENT_INDEX_NAME
+        self.write_mode = INCIDENT_WRITE_MODE
+        self.feed_cache = IncidentFeedCache()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        self._range = None  # (expires_at, (oldest, newest) or None)
+        self._range_lock = threading.Lock()
+
+    @property
+    def dynamodb(self):
+        # Shared, pooled resource created on first use
+        return get_resource('dynamodb')
+
+    @property
+    def table(self):
+        return self.dynamodb.Table(self.table_name)
+
+    @property
+    def writer(self):
+        if self._writer is None:
+            with self._writer_lock:
+                if self._writer is None:
+                    self._writer = WriteBehindBuffer(
+                        self.dynamodb,
+                        self.table_name,
+                        on_written=self._on_written
+                    )
+        return self._writer
+
+    def start(self):
+        """Replay journaled incidents from a previous run and start the background writer"""
+        if self.write_mode == 'buffered':
+            self.writer.start()
+
+    def close(self, timeout=30):
+        """Write out everything still buffered"""
+        if self._writer is not None:
+            self._writer.close(timeout)
+
+    def ensure_table(self):
+        """Create the incidents table with its timeline index if it does not exist (DynamoDB Local, tests)"""
+        try:
+            self.dynamodb.meta.client.describe_table(TableName=self.table_name)
+            return False
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ResourceNotFoundException':
+                raise
+        self.dynamodb.create_table(
+            TableName=self.table_name,
+            KeySchema=[{'AttributeName': 'incident_id', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[
+                {'AttributeName': 'incident_id', 'AttributeType': 'S'},
+                {'AttributeName': 'timeline_bucket', 'AttributeType': 'S'},
+                {'AttributeName': 'timeline_key', 'AttributeType': 'S'},
+            ],
+            GlobalSecondaryIndexes=[{
+                'IndexName': self.index_name,
+                'KeySchema': [
+                    {'AttributeName': 'timeline_bucket', 'KeyType': 'HASH'},
+                    {'AttributeName': 'timeline_key', 'KeyType': 'RANGE'},
+                ],
+                'Projection': {'ProjectionType': 'INCLUDE', 'NonKeyAttributes': INCIDENT_LIST_ATTRIBUTES},
+            }],
+            BillingMode='PAY_PER_REQUEST'
         )
-        self.table = self.dynamodb.Table('EmergencyIncidents')
+        self.table.wait_until_exists()
+        return True
+
+    @staticmethod
+    def _search_text(item):
+        return ' '.join(_flatten_text(item.get('incident_report')) + _flatten_text(item.get('notes'))).lower()
+
+    @classmethod
+    def index_attributes(cls, item):
+        """Attributes the timeline index and its filters rely on, derived from a stored incident"""
+        # Same rules generate_report uses for its severity level
+        severity = _severity_parser.parse(cls._search_text(item)).severity
+        shard = zlib.crc32(item['incident_id'].encode('utf-8')) % INCIDENT_BUCKET_SHARDS
+        return {
+            'timeline_bucket': f"{_bucket_month(item.get('timestamp'), item.get('created_at'))}#{shard}",
+            'timeline_key': f"{item['timestamp']}#{item['incident_id']}",
+            'severity': severity,
+        }
 
     def save_incident(self, incident_data):
         try:
@@ -23,23 +200,291 @@ class DynamoDBService:
                 'notes': incident_data['notes'],
                 'created_at': datetime.utcnow().isoformat()
             }
-            
-            response = self.table.put_item(Item=item)
-            return response
-            
+            item.update(self.index_attributes(item))
+            if incident_data.get('severity'):
+                item['severity'] = str(incident_data['severity']).upper()
+
+            if self.write_mode == 'buffered':
+                # Durable once journaled; reaches the table within WRITE_BUFFER_FLUSH_INTERVAL,
+                # and the writer invalidates the feed cache when it does
+                self.writer.put(item)
+                return {'incident_id': item['incident_id']}
+
+            with span("dynamodb_put"):
+                self.table.put_item(Item=to_dynamodb(item))
+            self.record_months([_month_of(item)])
+            self.feed_cache.invalidate()
+            return {'incident_id': item['incident_id']}
+
         except Exception as e:
-            print(f"Error saving to DynamoDB: {str(e)}")
+            logger.error("Error saving to DynamoDB: %s", e)
             raise
 
+    def _on_written(self, items):
+        try:
+            self.record_months({_month_of(item) for item in items})
+        except Exception as e:
+            # The range stays narrow in this process too, so the next write to the month retries
+            logger.error("Error recording the timeline range: %s", e)
+        self.feed_cache.invalidate()
+
+    def timeline_range(self):
+        """(oldest, newest) month with incidents, or None when nothing was recorded"""
+        with self._range_lock:
+            if self._range is not None and self._range[0] > time.monotonic():
+                return self._range[1]
+        with span("dynamodb_get"):
+            item = self.table.get_item(Key={'incident_id': TIMELINE_RANGE_ID}, ConsistentRead=True).get('Item')
+        months = (item['oldest_month'], item['newest_month']) if item else None
+        with self._range_lock:
+            self._range = (time.monotonic() + TIMELINE_RANGE_TTL, months)
+        return months
+
+    def record_months(self, months):
+        """Widen the stored timeline range to cover `months` (YYYY-MM)"""
+        known = self.timeline_range()
+        months = [month for month in months if known is None or not known[0] <= month <= known[1]]
+        if not months:
+            return
+        for attribute, month, older in (('oldest_month', min(months), '>'), ('newest_month', max(months), '<')):
+            try:
+                self.table.update_item(
+                    Key={'incident_id': TIMELINE_RANGE_ID},
+                    UpdateExpression=f'SET {attribute} = :m',
+                    ConditionExpression=f'attribute_not_exists({attribute}) OR {attribute} {older} :m',
+                    ExpressionAttributeValues={':m': month}
+                )
+            except ClientError as e:
+                # Another writer already recorded a wider range
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    raise
+        with self._range_lock:
+            self._range = None
+
+    @staticmethod
+    def _feed_key(**params):
+        return json.dumps(params, sort_keys=True)
+
+    def cached_feed_etag(self, **params):
+        """ETag of a cached feed page, or None if it would have to be loaded"""
+        return self.feed_cache.peek_etag(self._feed_key(**params))
+
+    def list_incidents(self, **params):
+        """query_incidents through the feed cache: ({incidents, nextPageToken}, etag)"""
+        def load():
+            items, next_page_token = self.query_incidents(**params)
+            return {'incidents': items, 'nextPageToken': next_page_token}
+        return self.feed_cache.get_or_load(self._feed_key(**params), load)
+
+    def query_incidents(self, limit=INCIDENT_PAGE_SIZE, page_token=None, severity=None, service=None,
+                        keyword=None, since=None):
+        """One page of incidents, most recent first, read through the timeline index.
+
+        Returns (items, next_page_token); the token is None on the last page.
+        Month buckets are read newest first, each by querying its shards and
+        merging them, from the newest month with incidents down to the
+        oldest (see timeline_range), and at most INCIDENT_MAX_BUCKETS per
+        page. Severity and service filters are applied by DynamoDB
+        after the key lookup and the keyword here, so a selective filter may
+        return a short page with a token to continue from. With `since`,
+        only incidents with a later timestamp are returned.
+        """
+        limit = max(1, min(int(limit), INCIDENT_MAX_PAGE_SIZE))
+        if service is not None and service not in SERVICE_NAMES:
+            raise ValueError(f"Unknown service: {service}")
+        if severity is not None and severity.upper() not in SEVERITY_LEVELS:
+            raise ValueError(f"Unknown severity: {severity}")
+
+        conditions = []
+        if severity:
+            conditions.append(Attr('severity').eq(severity.upper()))
+        if service:
+            conditions.append(Attr(f'selected_services.{service}').eq(True))
+        params = {'IndexName': self.index_name, 'ScanIndexForward': False}
+        # Filtered pages read ahead to save round trips and are trimmed back below
+        read_ahead = min(max(limit * 4, 100), INCIDENT_MAX_EVALUATED) if conditions or keyword else 0
+        if conditions:
+            filter_expression = conditions[0]
+            for condition in conditions[1:]:
+                filter_expression = filter_expression & condition
+            params['FilterExpression'] = filter_expression
+        # The report is not copied into a search attribute; match it on the projected text
+        keep = (lambda item: keyword.lower() in self._search_text(item)) if keyword else (lambda item: True)
+
+        if page_token:
+            position = decode_page_token(page_token)
+            if set(position) != {'bucket', 'after'} or not re.fullmatch(r'\d{4}-\d{2}', position['bucket']):
+                raise InvalidPageTokenError("Invalid page token")
+            bucket, after = position['bucket'], position['after'] or None
+        else:
+            # A day ahead, for timestamps in time zones east of UTC
+            bucket, after = (datetime.utcnow() + timedelta(days=1)).strftime('%Y-%m'), None
+        months = self.timeline_range()
+        if months is None:
+            return [], None
+        bucket = min(bucket, months[1])
+        oldest = max(INCIDENT_TIMELINE_START, months[0])
+        # Keys sort as "<timestamp>#<id>", so "<since>$" sorts after every key at `since` itself
+        lower = f"{since}$" if since else ''
+        if since and re.match(r'\d{4}-\d{2}', since):
+            oldest = max(oldest, since[:7])
+
+        items = []
+        budget = {'evaluated': 0}
+        visited = 0
+        try:
+            while bucket >= oldest:
+                page, after, complete = self._read_bucket(
+                    bucket, after, lower, limit - len(items), read_ahead, params, keep, budget
+                )
+                items.extend(page)
+                if not complete:
+                    return self._strip(items), encode_page_token({'bucket': bucket, 'after': after})
+                bucket, after = _previous_month(bucket), None
+                visited += 1
+                if len(items) >= limit or budget['evaluated'] >= INCIDENT_MAX_EVALUATED or visited >= INCIDENT_MAX_BUCKETS:
+                    if bucket < oldest:
+                        break
+                    return self._strip(items), encode_page_token({'bucket': bucket, 'after': ''})
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ValidationException' and page_token:
+                raise InvalidPageTokenError(f"Invalid page token: {e}")
+            logger.error("Error querying DynamoDB: %s", e)
+            raise
+        return self._strip(items), None
+
+    def _read_bucket(self, bucket, after, lower, needed, read_ahead, params, keep, budget):
+        """Up to `needed` incidents of one month with keys between `lower` and `after`, newest first.
+
+        Returns (items, after, complete): `after` is the key to resume below and
+        `complete` is True once nothing older is left in the bucket. The shards
+        are merged lazily: each is read a chunk at a time, and only the shard
+        that is furthest behind reads again, until `needed` items are certain
+        (no shard could still hold a newer one), every shard ran out, or the
+        evaluation budget is spent.
+        """
+        key_condition = None
+        if after and lower:
+            # Inclusive: the item the last page ended on comes back and is skipped below
+            key_condition = Key('timeline_key').between(lower, after)
+        elif after:
+            key_condition = Key('timeline_key').lt(after)
+        elif lower:
+            key_condition = Key('timeline_key').gt(lower)
+        # Items spread evenly over the shards; a margin saves most second reads
+        chunk = max(5, math.ceil(1.5 * max(needed, read_ahead) / INCIDENT_BUCKET_SHARDS))
+
+        shards = []
+        for number in range(INCIDENT_BUCKET_SHARDS):
+            shard_key = Key('timeline_bucket').eq(f"{bucket}#{number}")
+            shards.append({
+                'params': dict(params, KeyConditionExpression=(
+                    shard_key if key_condition is None else shard_key & key_condition
+                )),
+                'matched': [],
+                # Every item of the shard from this key up has been read; None once it ran out
+                'frontier': None,
+                'done': False,
+            })
+
+        def read(shard):
+            with span("dynamodb_query", limit=chunk):
+                response = self.table.query(Limit=chunk, **shard['params'])
+            budget['evaluated'] += response.get('ScannedCount', chunk)
+            shard['matched'].extend(
+                item for item in response.get('Items', []) if item['timeline_key'] != after and keep(item)
+            )
+            last = response.get('LastEvaluatedKey')
+            if last:
+                shard['params']['ExclusiveStartKey'] = last
+                shard['frontier'] = last['timeline_key']
+            else:
+                shard['done'], shard['frontier'] = True, None
+
+        for shard in shards:
+            read(shard)
+        while True:
+            open_shards = [shard for shard in shards if not shard['done']]
+            cutoff = max((shard['frontier'] for shard in open_shards), default=None)
+            certain = sorted(
+                (item for shard in shards for item in shard['matched']
+                 if cutoff is None or item['timeline_key'] >= cutoff),
+                key=lambda item: item['timeline_key'], reverse=True
+            )
+            if len(certain) >= needed or not open_shards or budget['evaluated'] >= INCIDENT_MAX_EVALUATED:
+                break
+            read(max(open_shards, key=lambda shard: shard['frontier']))
+
+        page = certain[:needed]
+        if len(page) == needed:
+            return page, page[-1]['timeline_key'], not open_shards and len(certain) == needed
+        if not open_shards:
+            return page, None, True
+        # Evaluation budget spent before the page filled: resume below the furthest-behind shard
+        return page, cutoff, False
+
+    @staticmethod
+    def _strip(items):
+        for item in items:
+            item.pop('timeline_bucket', None)
+            item.pop('timeline_key', None)
+        return items
+
+    def backfill_index_attributes(self, rebucket=False):
+        """Add the timeline index attributes to incidents saved without them.
+
+        Also drops the `record_type` and `search_text` attributes of the
+        earlier single-partition index, and records the months of every
+        incident in the timeline range. With `rebucket`, every incident is
+        rewritten, e.g. after INCIDENT_BUCKET_SHARDS changed.
+        """
+        updated = 0
+        months = set()
+        scan_kwargs = {}
+        while True:
+            response = self.table.scan(**scan_kwargs)
+            for item in response.get('Items', []):
+                if item['incident_id'] == TIMELINE_RANGE_ID:
+                    continue
+                if 'timeline_bucket' in item and not rebucket:
+                    months.add(_month_of(item))
+                    continue
+                attributes = self.index_attributes(item)
+                self.table.update_item(
+                    Key={'incident_id': item['incident_id']},
+                    UpdateExpression='SET timeline_bucket = :b, timeline_key = :k, severity = :s '
+                                     'REMOVE record_type, search_text',
+                    ExpressionAttributeValues={
+                        ':b': attributes['timeline_bucket'],
+                        ':k': attributes['timeline_key'],
+                        ':s': attributes['severity'],
+                    }
+                )
+                months.add(_month_of(attributes))
+                updated += 1
+            if 'LastEvaluatedKey' not in response:
+                self.record_months(months)
+                return updated
+            scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
     def get_all_incidents(self):
         try:
-            response = self.table.scan()
-            items = response.get('Items', [])
-            
+            items = []
+            scan_kwargs = {}
+            # A single scan stops at 1 MB; follow LastEvaluatedKey to the end
+            while True:
+                with span("dynamodb_scan"):
+                    response = self.table.scan(**scan_kwargs)
+                items.extend(item for item in response.get('Items', []) if item['incident_id'] != TIMELINE_RANGE_ID)
+                if 'LastEvaluatedKey' not in response:
+                    break
+                scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+            self._strip(items)
             # Sort by timestamp in descending order (most recent first)
             items.sort(key=lambda x: x['timestamp'], reverse=True)
-            
+
             return items
         except Exception as e:
-            print(f"Error scanning DynamoDB: {str(e)}")
-            raise
\ No newline at end of file
+            logger.error("Error scanning DynamoDB: %s", e)
+            raise
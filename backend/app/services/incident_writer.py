@@ -0,0 +1,412 @@
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from decimal import Decimal
+
+from boto3.dynamodb.types import TypeSerializer
+from botocore.exceptions import BotoCoreError, ClientError, ParamValidationError
+
+from ..utils.executors import PoolSaturatedError
+from ..utils.metrics import span
+
+logger = logging.getLogger(__name__)
+
+WRITE_BUFFER_MAX_ITEMS = int(os.getenv('WRITE_BUFFER_MAX_ITEMS', '25'))
+WRITE_BUFFER_FLUSH_INTERVAL = float(os.getenv('WRITE_BUFFER_FLUSH_INTERVAL', '0.2'))
+# Saves beyond this many unwritten incidents are refused (503) rather than buffered
+WRITE_BUFFER_MAX_PENDING = int(os.getenv('WRITE_BUFFER_MAX_PENDING', '20000'))
+WRITE_RETRY_BASE_DELAY = float(os.getenv('WRITE_RETRY_BASE_DELAY', '0.05'))
+WRITE_RETRY_MAX_DELAY = float(os.getenv('WRITE_RETRY_MAX_DELAY', '5'))
+# Attempts per batch before its unwritten items go back to the queue, behind a backoff of up
+# to WRITE_RETRY_MAX_DELAY that pauses the writer until DynamoDB takes writes again
+WRITE_MAX_ATTEMPTS = int(os.getenv('WRITE_MAX_ATTEMPTS', '3'))
+INCIDENT_JOURNAL_PATH = os.getenv('INCIDENT_JOURNAL_PATH', 'incident_writes.journal')
+# "always": fsync before acknowledging a save; "off": leave it to the OS (survives a process crash, not power loss)
+INCIDENT_JOURNAL_FSYNC = os.getenv('INCIDENT_JOURNAL_FSYNC', 'always')
+INCIDENT_JOURNAL_COMPACT_BYTES = int(os.getenv('INCIDENT_JOURNAL_COMPACT_BYTES', str(16 * 1024 * 1024)))
+
+# DynamoDB's BatchWriteItem limit
+BATCH_WRITE_MAX_ITEMS = 25
+# Errors that say the item itself can never be stored; anything else is retried until it succeeds
+PERMANENT_ERRORS = {'ValidationException', 'ItemCollectionSizeLimitExceededException'}
+
+_serializer = TypeSerializer()
+
+
+def to_dynamodb(value):
+    """`value` with floats as Decimal, the only number type the DynamoDB serializer takes.
+
+    Raises TypeError or ValueError for anything DynamoDB cannot store, so a
+    bad item is refused on the caller's thread instead of the writer's.
+    """
+    if isinstance(value, float):
+        value = Decimal(str(value))
+    elif isinstance(value, dict):
+        value = {key: to_dynamodb(item) for key, item in value.items()}
+    elif isinstance(value, (list, tuple)):
+        value = [to_dynamodb(item) for item in value]
+    if isinstance(value, Decimal) and not value.is_finite():
+        raise ValueError(f"DynamoDB cannot store {value}")
+    _serializer.serialize(value)
+    return value
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    return str(value)
+
+
+class IncidentJournal:
+    """Append-only JSON-lines log of accepted incidents.
+
+    A "put" record is written (and fsynced, with concurrent savers sharing
+    one fsync) before a save is acknowledged; a "done" record follows once
+    DynamoDB has the item. On startup every put without a matching done is
+    handed back for writing. Once the file has grown past
+    INCIDENT_JOURNAL_COMPACT_BYTES, everything before the oldest
+    outstanding put is cut off (when that frees at least half of it), so
+    steady traffic does not grow it without bound. Items that can never be written go to `dead_letter_path` (default:
+    the journal path plus ".dead"), one JSON line each for replay by hand,
+    and are marked done here.
+    """
+
+    def __init__(self, path=INCIDENT_JOURNAL_PATH, fsync=INCIDENT_JOURNAL_FSYNC == 'always', dead_letter_path=None):
+        self.path = path
+        self.fsync = fsync
+        self.dead_letter_path = dead_letter_path or f"{path}.dead"
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._outstanding = OrderedDict()  # incident_id -> offset of its put record, oldest first
+        self._file = None
+        self._written = 0
+        self._synced = 0
+
+    def open(self):
+        """Open for appending; returns the items that were accepted but never written"""
+        pending = OrderedDict()
+        offsets = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'rb') as f:
+                offset = 0
+                for line in f:
+                    start, offset = offset, offset + len(line)
+                    try:
+                        record = json.loads(line, parse_float=Decimal)
+                    except ValueError:
+                        # Torn last line from a crash mid-append; it was never acknowledged
+                        continue
+                    if record['op'] == 'put':
+                        incident_id = record['item']['incident_id']
+                        pending[incident_id] = record['item']
+                        offsets.setdefault(incident_id, start)
+                    elif record['op'] == 'done':
+                        for incident_id in record['ids']:
+                            pending.pop(incident_id, None)
+                            offsets.pop(incident_id, None)
+        with self._lock:
+            self._file = open(self.path, 'a', encoding='utf-8')
+            self._written = self._synced = self._file.tell()
+            self._outstanding = OrderedDict(sorted(offsets.items(), key=lambda entry: entry[1]))
+        return list(pending.values())
+
+    def append_put(self, item):
+        self._append({'op': 'put', 'item': item}, add=item['incident_id'])
+
+    def append_done(self, incident_ids):
+        # Losing a done record only means a harmless re-put on replay, so no fsync
+        self._append({'op': 'done', 'ids': list(incident_ids)}, remove=incident_ids, sync=False)
+
+    def dead_letter(self, items, reason):
+        """Set `items` aside in the dead-letter file, then stop replaying them"""
+        lines = ''.join(
+            json.dumps({'reason': reason, 'item': item}, separators=(',', ':'), default=_json_default) + '\n'
+            for item in items
+        )
+        with self._lock:
+            with open(self.dead_letter_path, 'a', encoding='utf-8') as f:
+                f.write(lines)
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+        self.append_done([item['incident_id'] for item in items])
+
+    def _append(self, record, add=None, remove=(), sync=True):
+        line = json.dumps(record, separators=(',', ':'), default=_json_default) + '\n'
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            if add is not None and add not in self._outstanding:
+                self._outstanding[add] = self._written
+            self._written += len(line.encode('utf-8'))
+            offset = self._written
+            for incident_id in remove:
+                self._outstanding.pop(incident_id, None)
+            if self._written >= INCIDENT_JOURNAL_COMPACT_BYTES:
+                oldest = next(iter(self._outstanding.values()), self._written)
+                if oldest >= self._written // 2:
+                    self._compact(oldest)
+                    return
+        if sync and self.fsync:
+            self._sync(offset)
+
+    def _compact(self, oldest):
+        """Drop everything before byte `oldest`; called with _lock held"""
+        # _sync_lock too, so no fsync runs on the file being replaced
+        with self._sync_lock:
+            if oldest >= self._written:
+                self._file.truncate(0)
+                self._file.seek(0)
+                self._written = self._synced = 0
+                return
+            self._file.close()
+            with open(self.path, 'rb') as f:
+                f.seek(oldest)
+                tail = f.read()
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(tail)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+            self._file = open(self.path, 'a', encoding='utf-8')
+            self._written = self._synced = len(tail)
+            for incident_id in self._outstanding:
+                self._outstanding[incident_id] -= oldest
+
+    def _sync(self, offset):
+        # Group commit: whoever holds the lock fsyncs everything flushed so far,
+        # and savers whose records that covered return without another fsync
+        with self._sync_lock:
+            if self._synced >= offset:
+                return
+            target = self._written
+            os.fsync(self._file.fileno())
+            self._synced = target
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class WriteBehindBuffer:
+    """Coalesces incident puts into BatchWriteItem calls made by one background thread.
+
+    `put` journals the item and returns; the flusher writes when
+    `max_items` are waiting or the oldest has waited `flush_interval`.
+    UnprocessedItems, throttling, outages and connection errors are retried
+    with decorrelated jitter backoff, WRITE_MAX_ATTEMPTS times in a row;
+    items still unwritten then go back to the front of the queue, and when
+    nothing of the batch got in, the writer pauses for a backoff that grows
+    up to WRITE_RETRY_MAX_DELAY for as long as DynamoDB keeps failing. They stay in the journal meanwhile,
+    so an acknowledged save is never dropped. Only items DynamoDB rejects
+    as invalid (PERMANENT_ERRORS) go to the journal's dead-letter file, so
+    one bad item neither stops the writer nor is retried forever.
+    `on_written(items)` runs after each successful write.
+    """
+
+    def __init__(self, dynamodb, table_name, journal=None, max_items=WRITE_BUFFER_MAX_ITEMS,
+                 flush_interval=WRITE_BUFFER_FLUSH_INTERVAL, max_pending=WRITE_BUFFER_MAX_PENDING,
+                 on_written=None):
+        self.dynamodb = dynamodb
+        self.table_name = table_name
+        self.journal = journal or IncidentJournal()
+        self.max_items = max(1, min(max_items, BATCH_WRITE_MAX_ITEMS))
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.on_written = on_written
+        self._pending = OrderedDict()
+        self._oldest = None
+        self._in_flight = 0
+        # While DynamoDB keeps failing: no batch is taken before _retry_at
+        self._retry_at = None
+        self._retry_delay = WRITE_RETRY_BASE_DELAY
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        self.stats = {
+            'accepted': 0, 'written': 0, 'batches': 0, 'unprocessed_retries': 0, 'errors': 0, 'requeued': 0,
+            'dead_lettered': 0
+        }
+
+    def start(self):
+        if self._thread is not None:
+            return
+        replay = self.journal.open()
+        with self._condition:
+            for item in replay:
+                self._pending[item['incident_id']] = item
+            if replay:
+                self._oldest = time.monotonic()
+        if replay:
+            logger.info("Replaying %s journaled incident(s)", len(replay))
+        self._thread = threading.Thread(target=self._flush_loop, name='incident-writer', daemon=True)
+        self._thread.start()
+
+    def put(self, item):
+        item = to_dynamodb(item)
+        if self._thread is None:
+            self.start()
+        with self._condition:
+            if len(self._pending) + self._in_flight >= self.max_pending:
+                raise PoolSaturatedError('incident-writer')
+        self.journal.append_put(item)
+        with self._condition:
+            first = not self._pending
+            if first:
+                self._oldest = time.monotonic()
+            self._pending[item['incident_id']] = item
+            self.stats['accepted'] += 1
+            # The first item starts the flush_interval clock of an idle writer
+            if first or len(self._pending) >= self.max_items:
+                self._condition.notify()
+
+    def pending_count(self):
+        with self._condition:
+            return len(self._pending) + self._in_flight
+
+    def flush(self, timeout=None):
+        """Block until everything accepted so far is in DynamoDB"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            self._condition.notify_all()
+            while self._pending or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def close(self, timeout=30):
+        flushed = self.flush(timeout)
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.journal.close()
+        return flushed
+
+    def _take_batch(self):
+        with self._condition:
+            while True:
+                # Stopping while DynamoDB is failing: what is left stays journaled for the next start
+                if self._stopping and (not self._pending or self._retry_at is not None):
+                    return None
+                if self._retry_at is not None and not self._stopping:
+                    backoff = self._retry_at - time.monotonic()
+                    if backoff > 0:
+                        self._condition.wait(backoff)
+                        continue
+                if self._pending:
+                    waited = time.monotonic() - self._oldest
+                    if len(self._pending) >= self.max_items or waited >= self.flush_interval or self._stopping:
+                        break
+                    self._condition.wait(self.flush_interval - waited)
+                else:
+                    # put() notifies on the first item; the timeout is a backstop
+                    self._condition.wait(self.flush_interval)
+            batch = []
+            while self._pending and len(batch) < self.max_items:
+                batch.append(self._pending.popitem(last=False)[1])
+            self._in_flight += len(batch)
+            self._oldest = time.monotonic() if self._pending else None
+            return batch
+
+    def _flush_loop(self):
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+            try:
+                unwritten = self._write_batch(batch)
+            except Exception as e:
+                # Whatever went wrong, the writer thread has to survive it; a re-put of
+                # anything already written is harmless
+                logger.error("Error writing %s incident(s), retrying them: %s", len(batch), e)
+                unwritten = batch
+            with self._condition:
+                self._in_flight -= len(batch)
+                if len(unwritten) < len(batch):
+                    # Progress: DynamoDB is taking writes, so no pause
+                    self._retry_at, self._retry_delay = None, WRITE_RETRY_BASE_DELAY
+                self._requeue(unwritten, pause=len(unwritten) == len(batch))
+                self._condition.notify_all()
+
+    def _requeue(self, items, pause):
+        """Put `items` back at the front of the queue, holding the writer off if `pause`; called with _condition held"""
+        if not items:
+            return
+        for item in reversed(items):
+            if item['incident_id'] not in self._pending:
+                self._pending[item['incident_id']] = item
+                self._pending.move_to_end(item['incident_id'], last=False)
+        if self._oldest is None:
+            self._oldest = time.monotonic()
+        self.stats['requeued'] += len(items)
+        if not pause:
+            return
+        self._retry_delay = min(WRITE_RETRY_MAX_DELAY, random.uniform(WRITE_RETRY_BASE_DELAY, self._retry_delay * 3))
+        self._retry_at = time.monotonic() + self._retry_delay
+        logger.warning("%s incident(s) still unwritten, retrying in %.2fs", len(items), self._retry_delay)
+
+    def _dead_letter(self, items, reason):
+        try:
+            self.journal.dead_letter(items, reason)
+        except Exception as e:
+            # Still journaled as put, so the next start replays them
+            logger.error("Error dead-lettering %s incident(s): %s", len(items), e)
+        self.stats['dead_lettered'] += len(items)
+
+    def _write_batch(self, batch):
+        """Write `batch`; returns the items still unwritten after WRITE_MAX_ATTEMPTS attempts"""
+        requests = [{'PutRequest': {'Item': item}} for item in batch]
+        delay = WRITE_RETRY_BASE_DELAY
+        for attempt in range(1, WRITE_MAX_ATTEMPTS + 1):
+            try:
+                with span("dynamodb_batch_write", items=len(requests)):
+                    response = self.dynamodb.batch_write_item(RequestItems={self.table_name: requests})
+                unprocessed = response.get('UnprocessedItems', {}).get(self.table_name, [])
+                self.stats['batches'] += 1
+            except (ClientError, BotoCoreError) as e:
+                self.stats['errors'] += 1
+                code = e.response['Error']['Code'] if isinstance(e, ClientError) else None
+                if isinstance(e, ParamValidationError) or code in PERMANENT_ERRORS:
+                    return self._reject([request['PutRequest']['Item'] for request in requests], e)
+                logger.warning("Error writing incidents to DynamoDB: %s", e)
+                unprocessed = requests
+
+            left = {request['PutRequest']['Item']['incident_id'] for request in unprocessed}
+            written = [request['PutRequest']['Item'] for request in requests
+                       if request['PutRequest']['Item']['incident_id'] not in left]
+            if written:
+                self.journal.append_done([item['incident_id'] for item in written])
+                self.stats['written'] += len(written)
+                if self.on_written:
+                    self.on_written(written)
+            if not unprocessed:
+                return []
+            requests = unprocessed
+            if attempt == WRITE_MAX_ATTEMPTS:
+                break
+            self.stats['unprocessed_retries'] += 1
+            # Decorrelated jitter: spreads retries from many writers instead of syncing them up
+            delay = min(WRITE_RETRY_MAX_DELAY, random.uniform(WRITE_RETRY_BASE_DELAY, delay * 3))
+            time.sleep(delay)
+
+        return [request['PutRequest']['Item'] for request in requests]
+
+    def _reject(self, items, error):
+        """DynamoDB refused the batch: write the items one by one so only the bad ones are set aside"""
+        if len(items) > 1:
+            return [unwritten for item in items for unwritten in self._write_batch([item])]
+        logger.error("DynamoDB rejected incident %s: %s", items[0]['incident_id'], error)
+        self._dead_letter(items, f"{type(error).__name__}: {error}")
+        return []
@@ -0,0 +1,200 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from botocore.exceptions import ClientError
+from dotenv import load_dotenv
+
+from ..models.timeline import detect_hazards
+from ..utils.metrics import Counter, Histogram, span
+from .rate_limiter import CircuitOpenError, RateLimitedError, bedrock_limiter
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# "tiered": triage frames on CPU, describe salient frames with the large vision model and the rest
+# with the small one, and pick the summary model by how serious the scene is; "off": large models only.
+# Opt-in: tiered needs access to the small models' Bedrock ids as well
+MODEL_ROUTING = os.getenv('MODEL_ROUTING', 'off')
+
+# Models of each tier, tried in order: a throttled or unavailable model falls back to the next
+MODEL_TIERS = {
+    'vision_large': os.getenv('MODEL_VISION_LARGE', 'us.meta.llama3-2-11b-instruct-v1:0,us.meta.llama3-2-90b-instruct-v1:0'),
+    'vision_small': os.getenv('MODEL_VISION_SMALL', 'us.amazon.nova-lite-v1:0,us.meta.llama3-2-11b-instruct-v1:0'),
+    'text_large': os.getenv('MODEL_TEXT_LARGE', 'us.meta.llama3-2-11b-instruct-v1:0,us.meta.llama3-2-90b-instruct-v1:0'),
+    'text_small': os.getenv('MODEL_TEXT_SMALL', 'us.meta.llama3-2-3b-instruct-v1:0,us.meta.llama3-2-11b-instruct-v1:0'),
+    # The dispatch alert read out on phone calls when routing is off: short, so the small model as always
+    'dispatch': os.getenv('MODEL_DISPATCH', 'us.meta.llama3-2-3b-instruct-v1:0,us.meta.llama3-2-11b-instruct-v1:0'),
+}
+# Summaries of scenes at least this severe (IncidentTimeline scale, 0-1) use the large text model
+ROUTING_LARGE_SEVERITY = float(os.getenv('ROUTING_LARGE_SEVERITY', '0.5'))
+
+# Errors that send a call on to the tier's next model
+FALLBACK_ERROR_CODES = {
+    'ThrottlingException', 'TooManyRequestsException', 'ServiceUnavailableException',
+    'ModelNotReadyException', 'ModelTimeoutException', 'AccessDeniedException', 'ResourceNotFoundException',
+    'CircuitOpenError', 'RateLimitedError',
+}
+# Calls kept per tier for the latency percentiles
+LATENCY_WINDOW = 500
+
+BEDROCK_CALLS = Counter(
+    'bedrock_calls_total', 'Bedrock calls per model once retries are done, by outcome (ok or error code)',
+    ('tier', 'model', 'outcome')
+)
+BEDROCK_REQUEST_SECONDS = Histogram(
+    'bedrock_request_seconds', 'Latency of single Bedrock requests, retries counted separately', ('model',)
+)
+BEDROCK_TOKENS = Counter(
+    'bedrock_tokens_total', 'Tokens Bedrock reported using, by model and direction', ('model', 'direction')
+)
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class ModelRouter:
+    """Picks the Bedrock model for each call and falls back within its tier.
+
+    Calls name a tier rather than a model. A tier is an ordered list of
+    model ids. Each model is called through `limiter` (its quota, retries
+    and circuit breaker); when a model is still throttled after its
+    retries, unavailable, or its circuit is open, the call moves on to the
+    next one, so a burst that exhausts one model's quota spills over
+    instead of failing. Per-tier calls, fallbacks, errors and latency are
+    kept process-wide for `stats`.
+    """
+
+    def __init__(self, tiers=None, mode=MODEL_ROUTING, large_severity=ROUTING_LARGE_SEVERITY, limiter=None):
+        tiers = tiers or MODEL_TIERS
+        self.tiers = {
+            tier: [model.strip() for model in models.split(',') if model.strip()] if isinstance(models, str) else list(models)
+            for tier, models in tiers.items()
+        }
+        self.mode = mode
+        self.large_severity = large_severity
+        self.limiter = limiter or bedrock_limiter
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    @property
+    def tiered(self):
+        return self.mode == 'tiered'
+
+    def model(self, tier):
+        """Primary model of a tier"""
+        return self.tiers[tier][0]
+
+    def frame_tier(self, salient):
+        return 'vision_large' if salient or not self.tiered else 'vision_small'
+
+    def summary_tier(self, severity):
+        return 'text_large' if severity >= self.large_severity or not self.tiered else 'text_small'
+
+    def dispatch_tier(self, severity):
+        """Tier of the dispatch alert: picked by severity when tiered, else the fixed dispatch tier"""
+        return self.summary_tier(severity) if self.tiered else 'dispatch'
+
+    def needs_escalation(self, tier, description):
+        """A small-model description that reports a hazard is checked again by the large model"""
+        return tier == 'vision_small' and description is not None and bool(detect_hazards(description))
+
+    def _tier_stats(self, tier):
+        return self._stats.setdefault(tier, {
+            "calls": 0, "fallbacks": 0, "throttled": 0, "errors": 0, "models": {},
+            "latencies": deque(maxlen=LATENCY_WINDOW)
+        })
+
+    def _record(self, tier, model, seconds=None, error_code=None, fell_back=False):
+        BEDROCK_CALLS.inc(tier=tier, model=model, outcome='ok' if seconds is not None else error_code or 'error')
+        with self._lock:
+            stats = self._tier_stats(tier)
+            if fell_back:
+                stats["fallbacks"] += 1
+            if error_code in ('ThrottlingException', 'TooManyRequestsException'):
+                stats["throttled"] += 1
+            if seconds is None:
+                stats["errors"] += 1
+                return
+            stats["calls"] += 1
+            stats["models"][model] = stats["models"].get(model, 0) + 1
+            stats["latencies"].append(seconds)
+
+    @staticmethod
+    def record_usage(model, usage):
+        """Count the tokens of a converse `usage` (or a stream's metadata usage) against `model`"""
+        if not usage:
+            return
+        BEDROCK_TOKENS.inc(usage.get('inputTokens') or 0, model=model, direction='input')
+        BEDROCK_TOKENS.inc(usage.get('outputTokens') or 0, model=model, direction='output')
+
+    def _timed(self, tier, operation):
+        """`operation` with every request, retries included, timed as a bedrock_call span"""
+        def request(modelId, **kwargs):
+            started = time.perf_counter()
+            try:
+                with span("bedrock_call", tier=tier, model=modelId) as fields:
+                    response = operation(modelId=modelId, **kwargs)
+                    usage = response.get("usage")
+                    if usage:
+                        fields.update(input_tokens=usage.get("inputTokens"), output_tokens=usage.get("outputTokens"))
+            finally:
+                BEDROCK_REQUEST_SECONDS.observe(time.perf_counter() - started, model=modelId)
+            self.record_usage(modelId, usage)
+            return response
+        return request
+
+    def call(self, tier, operation, **kwargs):
+        """Run `operation(modelId=..., **kwargs)` on the tier's models in order; returns (response, model)
+
+        Token usage in a converse response is counted here; a stream reports
+        it at the end, so its reader passes it to `record_usage`.
+        """
+        models = self.tiers[tier]
+        for position, model in enumerate(models):
+            started = time.perf_counter()
+            try:
+                response = self.limiter.call(model, self._timed(tier, operation), **kwargs)
+            except (ClientError, CircuitOpenError, RateLimitedError) as e:
+                code = e.response.get('Error', {}).get('Code') if isinstance(e, ClientError) else type(e).__name__
+                last = position == len(models) - 1
+                self._record(tier, model, error_code=code, fell_back=not last and code in FALLBACK_ERROR_CODES)
+                if last or code not in FALLBACK_ERROR_CODES:
+                    raise
+                logger.warning("%s unavailable (%s), falling back to %s", model, code, models[position + 1])
+                continue
+            except Exception:
+                self._record(tier, model)
+                raise
+            self._record(tier, model, time.perf_counter() - started)
+            return response, model
+
+    def converse(self, client, tier, **kwargs):
+        return self.call(tier, client.converse, **kwargs)
+
+    def converse_stream(self, client, tier, **kwargs):
+        # Throttling surfaces when the stream is opened, so only that part is retried elsewhere
+        return self.call(tier, client.converse_stream, **kwargs)
+
+    def stats(self):
+        """{tier: {models, calls, fallbacks, throttled, errors, p50/p95 latency}}"""
+        with self._lock:
+            snapshot = {tier: (dict(stats), list(stats["latencies"])) for tier, stats in self._stats.items()}
+        result = {}
+        for tier, (stats, latencies) in snapshot.items():
+            stats.pop("latencies")
+            stats["models"] = dict(stats["models"])
+            if latencies:
+                stats["p50_seconds"] = round(_percentile(latencies, 0.5), 3)
+                stats["p95_seconds"] = round(_percentile(latencies, 0.95), 3)
+            result[tier] = stats
+        return {"mode": self.mode, "tiers": {tier: list(models) for tier, models in self.tiers.items()},
+                "usage": result, "limits": self.limiter.stats()}
+
+
+model_router = ModelRouter()
@@ -0,0 +1,361 @@
+import contextvars
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from botocore.exceptions import ClientError
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Per-model Bedrock quota this process keeps under; 0 turns that limit off
+BEDROCK_RPM = int(os.getenv('BEDROCK_RPM', '400'))
+BEDROCK_TPM = int(os.getenv('BEDROCK_TPM', '300000'))
+# Longest a call waits for its turn before giving up with RateLimitedError
+BEDROCK_QUEUE_TIMEOUT = float(os.getenv('BEDROCK_QUEUE_TIMEOUT', '30'))
+# Attempts per model, and the decorrelated jitter bounds (seconds) between them
+BEDROCK_RETRY_ATTEMPTS = int(os.getenv('BEDROCK_RETRY_ATTEMPTS', '4'))
+BEDROCK_RETRY_BASE = float(os.getenv('BEDROCK_RETRY_BASE', '0.25'))
+BEDROCK_RETRY_CAP = float(os.getenv('BEDROCK_RETRY_CAP', '8'))
+# Consecutive throttled or unavailable attempts that open a model's circuit, and how long it stays open
+BREAKER_FAILURE_THRESHOLD = int(os.getenv('BREAKER_FAILURE_THRESHOLD', '8'))
+BREAKER_RESET_SECONDS = float(os.getenv('BREAKER_RESET_SECONDS', '15'))
+
+# Priority lanes, most urgent first: dispatch summaries for live incidents, requests a user is
+# waiting on, and background jobs / re-analysis
+LANE_LIVE = 0
+LANE_INTERACTIVE = 1
+LANE_BATCH = 2
+LANE_NAMES = {LANE_LIVE: 'live', LANE_INTERACTIVE: 'interactive', LANE_BATCH: 'batch'}
+# Share of each bucket a lane must leave untouched, so background work cannot starve live calls
+LANE_RESERVE = {LANE_LIVE: 0.0, LANE_INTERACTIVE: 0.0, LANE_BATCH: 0.2}
+
+RETRYABLE_ERROR_CODES = {
+    'ThrottlingException', 'TooManyRequestsException', 'ServiceUnavailableException',
+    'ModelNotReadyException', 'InternalServerException',
+}
+THROTTLING_ERROR_CODES = {'ThrottlingException', 'TooManyRequestsException'}
+# Input tokens counted for an image when estimating a request before it is sent
+IMAGE_TOKENS = 1600
+CHARS_PER_TOKEN = 4
+
+_lane = contextvars.ContextVar('bedrock_lane', default=LANE_INTERACTIVE)
+
+
+class RateLimitedError(Exception):
+    """Raised when a call waited BEDROCK_QUEUE_TIMEOUT for rate limit capacity without getting it"""
+
+    def __init__(self, model_id, waited):
+        super().__init__(f"Rate limit for {model_id} not available after {waited:.1f}s")
+        self.model_id = model_id
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a model whose circuit breaker is open"""
+
+    def __init__(self, model_id, retry_after):
+        super().__init__(f"{model_id} is failing, circuit open for another {retry_after:.0f}s")
+        self.model_id = model_id
+        self.retry_after = retry_after
+
+
+@contextmanager
+def priority_lane(lane):
+    """Run the Bedrock calls made in this block (and in work submitted with its context) in `lane`"""
+    token = _lane.set(lane)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+def current_lane():
+    return _lane.get()
+
+
+def estimate_request_tokens(messages, inference_config=None):
+    """Tokens a converse request may use: its input, estimated, plus the output allowance"""
+    tokens = 0
+    for message in messages:
+        for block in message.get("content", []):
+            if "image" in block:
+                tokens += IMAGE_TOKENS
+            else:
+                tokens += len(block.get("text", "")) // CHARS_PER_TOKEN
+    return tokens + (inference_config or {}).get("maxTokens", 512)
+
+
+class RequestBudget:
+    """Token buckets for requests and tokens per minute, granted in priority order.
+
+    Both buckets refill continuously and hold at most one quota window's
+    worth (`period` seconds, a minute as Bedrock counts it).
+    Waiting calls queue by (lane, arrival): only the head of the queue may
+    take capacity, so a live call that arrives while batch calls are
+    waiting is served before them, and a lane may not dip into its
+    LANE_RESERVE share of either bucket.
+    """
+
+    def __init__(self, rpm=BEDROCK_RPM, tpm=BEDROCK_TPM, period=60.0):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.period = period
+        self._requests = float(rpm)
+        self._tokens = float(tpm)
+        self._updated = time.monotonic()
+        self._condition = threading.Condition()
+        self._waiting = []  # heap of (lane, sequence)
+        self._sequence = itertools.count()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed, self._updated = now - self._updated, now
+        if self.rpm:
+            self._requests = min(float(self.rpm), self._requests + elapsed * self.rpm / self.period)
+        if self.tpm:
+            self._tokens = min(float(self.tpm), self._tokens + elapsed * self.tpm / self.period)
+
+    def _shortfall_seconds(self, tokens, lane):
+        """Seconds until both buckets can grant the request, 0 if they can now"""
+        reserve = LANE_RESERVE.get(lane, 0.0)
+        waits = [0.0]
+        if self.rpm:
+            waits.append((1 + reserve * self.rpm - self._requests) * self.period / self.rpm)
+        if self.tpm:
+            # A request bigger than the whole bucket is let through once the bucket is full
+            needed = min(tokens, self.tpm * (1 - reserve)) + reserve * self.tpm
+            waits.append((needed - self._tokens) * self.period / self.tpm)
+        return max(waits)
+
+    def acquire(self, tokens, lane=LANE_INTERACTIVE, timeout=BEDROCK_QUEUE_TIMEOUT):
+        """Wait for one request and `tokens` tokens; returns the seconds waited, or None on timeout"""
+        if not self.rpm and not self.tpm:
+            return 0.0
+        started = time.monotonic()
+        ticket = (lane, next(self._sequence))
+        with self._condition:
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    self._refill()
+                    wait = self._shortfall_seconds(tokens, lane) if self._waiting[0] == ticket else None
+                    if wait is not None and wait <= 0:
+                        self._requests -= 1 if self.rpm else 0
+                        self._tokens -= min(tokens, self.tpm) if self.tpm else 0
+                        return time.monotonic() - started
+                    remaining = timeout - (time.monotonic() - started)
+                    if remaining <= 0:
+                        return None
+                    # Not at the head: wait to be notified; at the head: until the buckets refill enough
+                    self._condition.wait(remaining if wait is None else min(wait, remaining))
+            finally:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._condition.notify_all()
+
+    def settle(self, reserved, used):
+        """Return the part of a reservation the call did not use"""
+        if not self.tpm or used is None or used >= reserved:
+            return
+        with self._condition:
+            self._tokens = min(float(self.tpm), self._tokens + reserved - used)
+            self._condition.notify_all()
+
+    def throttled(self):
+        """Bedrock pushed back: empty the request bucket so every caller slows down, not just this one"""
+        with self._condition:
+            self._refill()
+            self._requests = min(self._requests, 0.0)
+
+    def levels(self):
+        with self._condition:
+            self._refill()
+            return {
+                "requests": round(self._requests, 1), "tokens": round(self._tokens),
+                "waiting": {LANE_NAMES[lane]: sum(1 for l, _ in self._waiting if l == lane) for lane in LANE_NAMES}
+            }
+
+
+class CircuitBreaker:
+    """Stops calling a model after BREAKER_FAILURE_THRESHOLD consecutive retryable failures.
+
+    Open for `reset_seconds`, then half open: one trial call goes through,
+    and its success closes the circuit while a failure opens it again.
+    """
+
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_seconds=BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self.opened = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            return 'open' if time.monotonic() - self._opened_at < self.reset_seconds else 'half_open'
+
+    def before_call(self, model_id):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            remaining = self.reset_seconds - (time.monotonic() - self._opened_at)
+            if remaining > 0 or self._trial_running:
+                raise CircuitOpenError(model_id, max(remaining, 0.0))
+            self._trial_running = True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or self._failures >= self.failure_threshold:
+                if self._opened_at is None or self._trial_running:
+                    self.opened += 1
+                self._opened_at = time.monotonic()
+                self._trial_running = False
+
+    def release(self):
+        """A trial call ended without telling anything about the model's health (e.g. a bad request)"""
+        with self._lock:
+            self._trial_running = False
+
+
+class BedrockRateLimiter:
+    """Process-wide gate in front of every Bedrock call: quota, retries and circuit breaking per model.
+
+    `call` waits for the model's RequestBudget in the current priority lane,
+    makes the call, and retries throttled or unavailable attempts after a
+    decorrelated-jitter delay (each delay random between the base and three
+    times the previous one, capped), so concurrent callers that were
+    throttled together do not retry in lockstep. Repeated failures open the
+    model's circuit and further calls fail fast with CircuitOpenError until
+    it half opens.
+    """
+
+    def __init__(self, rpm=BEDROCK_RPM, tpm=BEDROCK_TPM, max_attempts=BEDROCK_RETRY_ATTEMPTS,
+                 retry_base=BEDROCK_RETRY_BASE, retry_cap=BEDROCK_RETRY_CAP, queue_timeout=BEDROCK_QUEUE_TIMEOUT,
+                 failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_seconds=BREAKER_RESET_SECONDS,
+                 period=60.0, sleep=time.sleep):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.period = period
+        self.max_attempts = max(1, max_attempts)
+        self.retry_base = retry_base
+        self.retry_cap = retry_cap
+        self.queue_timeout = queue_timeout
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._sleep = sleep
+        self._random = random.Random()
+        self._lock = threading.Lock()
+        self._budgets = {}
+        self._breakers = {}
+        self._stats = {}
+
+    def budget(self, model_id):
+        with self._lock:
+            budget = self._budgets.get(model_id)
+            if budget is None:
+                budget = self._budgets[model_id] = RequestBudget(self.rpm, self.tpm, self.period)
+            return budget
+
+    def breaker(self, model_id):
+        with self._lock:
+            breaker = self._breakers.get(model_id)
+            if breaker is None:
+                breaker = self._breakers[model_id] = CircuitBreaker(self.failure_threshold, self.reset_seconds)
+            return breaker
+
+    def _count(self, model_id, name, amount=1):
+        with self._lock:
+            stats = self._stats.setdefault(model_id, {
+                "calls": 0, "retries": 0, "throttled": 0, "rate_limited": 0, "circuit_rejected": 0,
+                "queue_seconds": {name: 0.0 for name in LANE_NAMES.values()}
+            })
+            if name in LANE_NAMES.values():
+                stats["queue_seconds"][name] += amount
+            else:
+                stats[name] += amount
+
+    def backoff(self, previous):
+        """Next decorrelated-jitter delay after `previous` seconds"""
+        return min(self.retry_cap, self._random.uniform(self.retry_base, max(self.retry_base, previous * 3)))
+
+    def call(self, model_id, operation, **kwargs):
+        """`operation(modelId=model_id, **kwargs)` within the model's quota, with retries"""
+        lane = current_lane()
+        budget, breaker = self.budget(model_id), self.breaker(model_id)
+        reserved = estimate_request_tokens(kwargs.get("messages", []), kwargs.get("inferenceConfig"))
+        delay = self.retry_base
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                breaker.before_call(model_id)
+            except CircuitOpenError:
+                self._count(model_id, "circuit_rejected")
+                raise
+            waited = budget.acquire(reserved, lane, self.queue_timeout)
+            if waited is None:
+                breaker.release()
+                self._count(model_id, "rate_limited")
+                raise RateLimitedError(model_id, self.queue_timeout)
+            self._count(model_id, LANE_NAMES.get(lane, 'interactive'), waited)
+            if breaker.state == 'open':
+                # Opened by other calls while this one was queued
+                self._count(model_id, "circuit_rejected")
+                raise CircuitOpenError(model_id, breaker.reset_seconds)
+            self._count(model_id, "calls")
+            try:
+                response = operation(modelId=model_id, **kwargs)
+            except ClientError as e:
+                code = e.response.get('Error', {}).get('Code')
+                if code not in RETRYABLE_ERROR_CODES:
+                    breaker.release()
+                    raise
+                breaker.record_failure()
+                if code in THROTTLING_ERROR_CODES:
+                    self._count(model_id, "throttled")
+                    budget.throttled()
+                if attempt == self.max_attempts:
+                    raise
+                delay = self.backoff(delay)
+                self._count(model_id, "retries")
+                self._sleep(delay)
+                continue
+            except Exception:
+                breaker.release()
+                raise
+            breaker.record_success()
+            usage = response.get("usage") if isinstance(response, dict) else None
+            budget.settle(reserved, (usage or {}).get("totalTokens"))
+            return response
+
+    def stats(self):
+        with self._lock:
+            models = {model_id: {**stats, "queue_seconds": dict(stats["queue_seconds"])}
+                      for model_id, stats in self._stats.items()}
+            breakers = dict(self._breakers)
+            budgets = dict(self._budgets)
+        for model_id, stats in models.items():
+            stats["queue_seconds"] = {lane: round(seconds, 3) for lane, seconds in stats["queue_seconds"].items()}
+            if model_id in breakers:
+                stats["circuit"] = breakers[model_id].state
+                stats["circuit_opened"] = breakers[model_id].opened
+            if model_id in budgets:
+                stats["available"] = budgets[model_id].levels()
+        return {"rpm": self.rpm, "tpm": self.tpm, "models": models}
+
+
+bedrock_limiter = BedrockRateLimiter()
@@ -1,12 +1,29 @@
-import boto3
+import hashlib
+import logging
 import os
-from botocore.client import Config
-from typing import Tuple
+import time
+from typing import Callable, Dict, List, Optional, Tuple
 from dotenv import load_dotenv
+from .aws_clients import get_client
+from ..utils.metrics import Counter, span
+from ..utils.mp4_index import MP4IndexError, merge_ranges, parse_video_track, scan_top_level_boxes
 
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# "ranged" fetches only the MP4 index and the bytes around sampled frames, "full" downloads everything
+S3_DOWNLOAD_MODE = os.getenv('S3_DOWNLOAD_MODE', 'ranged')
+# First request of a ranged fetch; usually covers ftyp and, for faststart files, moov
+RANGED_HEAD_BYTES = 256 * 1024
+# Ranges closer than this are fetched as one request
+RANGED_MERGE_GAP = 256 * 1024
+# Past this share of the object a full download is cheaper than many ranges
+RANGED_MAX_FRACTION = 0.6
+
+S3_BYTES = Counter('s3_bytes_transferred_total', 'Video bytes read from S3, by fetch mode', ('mode',))
+
 class S3Service:
     def __init__(self):
         # Check if environment variables exist
@@ -22,13 +39,10 @@ class S3Service:
                 "AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, AWS_REGION, AWS_BUCKET_NAME"
             )
 
-        self.client = boto3.client(
-            's3',
-            aws_access_key_id=self.aws_access_key,
-            aws_secret_access_key=self.aws_secret_key,
-            region_name=self.region,
-            config=Config(signature_version='s3v4')
-        )
+    @property
+    def client(self):
+        # Shared, pooled client created on first use
+        return get_client('s3', signature_version='s3v4')
 
     def get_upload_url(self, file_name: str, content_type: str) -> Tuple[str, str]:
         if not file_name or not content_type:
@@ -47,27 +61,172 @@ class S3Service:
             )
             return url, video_key
         except Exception as e:
-            print(f"Error generating presigned URL: {str(e)}")
+            logger.error("Error generating presigned URL: %s", e)
             raise
 
     def download_video(self, video_key: str, local_path: str):
         """Download a video from S3 to a local path"""
         try:
-            print(f"Downloading video {video_key} from S3...")
-            self.client.download_file(
-                self.bucket_name,
-                video_key,
-                local_path
-            )
-            print(f"Video downloaded successfully to {local_path}")
+            logger.debug("Downloading video %s from S3...", video_key)
+            with span("s3_download") as fields:
+                self.client.download_file(
+                    self.bucket_name,
+                    video_key,
+                    local_path
+                )
+                fields["bytes"] = os.path.getsize(local_path)
+            S3_BYTES.inc(fields["bytes"], mode='full')
+            logger.debug("Video downloaded successfully to %s", local_path)
         except Exception as e:
-            print(f"Error downloading video from S3: {str(e)}")
+            logger.error("Error downloading video from S3: %s", e)
             raise
 
+    def fetch_video(
+        self,
+        video_key: str,
+        local_path: str,
+        frame_selector: Optional[Callable[[int, Optional[float]], List[int]]] = None,
+        on_ready: Optional[Callable[[Optional[List[int]], Dict], None]] = None
+    ) -> Dict:
+        """Make a video readable by OpenCV at local_path and return transfer stats.
+
+        In ranged mode only the container index and the samples needed to decode
+        the frames picked by `frame_selector(total_frames, fps)` are fetched, written
+        at their original offsets in a sparse file. Anything that cannot be
+        indexed falls back to a full download.
+
+        `on_ready(indices, stats)` is called as soon as the file can be opened
+        and the listed frames decoded, while later ranges are still being
+        fetched; `indices` is None once the whole file is there. `stats` is the
+        transfer so far, content hash included.
+        """
+        started = time.perf_counter()
+        stats = {"mode": "ranged", "object_size": 0, "bytes_transferred": 0, "requests": 0}
+
+        if S3_DOWNLOAD_MODE == 'ranged' and frame_selector is not None:
+            try:
+                if self._download_ranges(video_key, local_path, frame_selector, stats, started, on_ready):
+                    return stats
+            except MP4IndexError as e:
+                logger.warning("Ranged fetch not possible for %s (%s), downloading in full", video_key, e)
+
+        # Bytes spent probing the index before falling back still count
+        self.download_video(video_key, local_path)
+        elapsed = time.perf_counter() - started
+        size = os.path.getsize(local_path)
+        stats.update({
+            "mode": "full",
+            "object_size": size,
+            "bytes_transferred": stats["bytes_transferred"] + size,
+            "requests": stats["requests"] + 1,
+            "time_to_first_frame": elapsed,
+            "total_seconds": elapsed,
+            "content_hash": self._hash_file(local_path)
+        })
+        if on_ready:
+            on_ready(None, stats)
+        return stats
+
+    def get_etag(self, video_key: str) -> str:
+        """ETag of the stored object, a cheap identity check before any download"""
+        response = self.client.head_object(Bucket=self.bucket_name, Key=video_key)
+        return response['ETag'].strip('"')
+
+    @staticmethod
+    def _hash_file(path: str) -> str:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _read_range(self, video_key: str, start: int, end: int, stats: Dict) -> Tuple[bytes, int]:
+        with span("s3_get_range", bytes=end - start + 1):
+            response = self.client.get_object(
+                Bucket=self.bucket_name,
+                Key=video_key,
+                Range=f"bytes={start}-{end}"
+            )
+            data = response['Body'].read()
+        S3_BYTES.inc(len(data), mode='ranged')
+        stats["bytes_transferred"] += len(data)
+        stats["requests"] += 1
+        # Content-Range: bytes start-end/total
+        total = int(response.get('ContentRange', '').rsplit('/', 1)[-1] or response['ContentLength'])
+        return data, total
+
+    def _download_ranges(self, video_key: str, local_path: str, frame_selector, stats: Dict, started: float,
+                         on_ready=None) -> bool:
+        head, size = self._read_range(video_key, 0, RANGED_HEAD_BYTES - 1, stats)
+        stats["object_size"] = size
+        read = lambda start, end: self._read_range(video_key, start, end, stats)[0]
+
+        boxes = scan_top_level_boxes(read, size, head)
+        moov = next((box for box in boxes if box[0] == b'moov'), None)
+        if moov is None:
+            raise MP4IndexError("No moov box")
+        _, moov_offset, moov_size, _ = moov
+        if moov_offset + moov_size <= len(head):
+            moov_bytes = head[moov_offset:moov_offset + moov_size]
+        else:
+            moov_bytes = read(moov_offset, moov_offset + moov_size - 1)
+
+        index = parse_video_track(moov_bytes)
+        # The sample table records the size and position of every sample, so
+        # together with the head bytes it fingerprints the content without
+        # reading the whole object
+        digest = hashlib.sha256(str(size).encode())
+        digest.update(head)
+        digest.update(moov_bytes)
+        stats["content_hash"] = f"mp4index:{digest.hexdigest()}"
+        indices = sorted(frame_selector(index.sample_count, index.fps))
+        # Sample 0 is always fetched too: the decoder probes the first packets on open
+        probe_range, *frame_ranges = index.byte_ranges_for([0] + indices)
+        ranges = merge_ranges([probe_range] + frame_ranges, RANGED_MERGE_GAP)
+        waiting = list(zip(indices, frame_ranges))
+
+        remaining = sum(end - start + 1 for start, end in ranges)
+        if stats["bytes_transferred"] + remaining > size * RANGED_MAX_FRACTION:
+            logger.info("Sampled ranges cover most of %s, downloading in full", video_key)
+            return False
+
+        with open(local_path, 'wb') as f:
+            # Sparse file with the real layout; untouched regions read as zeros
+            f.truncate(size)
+            f.write(head)
+            for _, offset, _, header in boxes:
+                f.seek(offset)
+                f.write(header)
+            f.seek(moov_offset)
+            f.write(moov_bytes)
+            for i, (start, end) in enumerate(ranges):
+                f.seek(start)
+                f.write(read(start, end))
+                if i == 0:
+                    stats["time_to_first_frame"] = time.perf_counter() - started
+                if on_ready and waiting:
+                    written = ranges[:i + 1]
+                    covered = lambda r: any(start <= r[0] and r[1] <= end for start, end in written)
+                    ready = [idx for idx, frame_range in waiting if covered(frame_range)]
+                    if ready and covered(probe_range):
+                        # Readable by a decoder opening the file from here on. Separate ranges
+                        # are at least RANGED_MERGE_GAP apart, well past what the demuxer
+                        # reads ahead, so it never buffers a range before it is written.
+                        f.flush()
+                        waiting = [(idx, frame_range) for idx, frame_range in waiting if idx not in ready]
+                        on_ready(ready, stats)
+
+        stats["total_seconds"] = time.perf_counter() - started
+        logger.info(
+            "Ranged fetch of %s: %s of %s bytes in %s requests",
+            video_key, stats['bytes_transferred'], size, stats['requests']
+        )
+        return True
+
     def upload_frame(self, local_path: str, frame_key: str) -> str:
         """Upload a frame to S3 and return its URL"""
         try:
-            print(f"Uploading frame {frame_key} to S3...")
+            logger.debug("Uploading frame %s to S3...", frame_key)
             self.client.upload_file(
                 local_path,
                 self.bucket_name,
@@ -80,10 +239,10 @@ class S3Service:
             
             # Generate public URL for the frame
             frame_url = f"https://{self.bucket_name}.s3.amazonaws.com/{frame_key}"
-            print(f"Frame uploaded successfully. URL: {frame_url}")
+            logger.debug("Frame uploaded successfully. URL: %s", frame_url)
             return frame_url
         except Exception as e:
-            print(f"Error uploading frame to S3: {str(e)}")
+            logger.error("Error uploading frame to S3: %s", e)
             raise
 
     def get_video_url(self, video_key: str) -> str:
@@ -92,5 +251,5 @@ class S3Service:
             url = f"https://{self.bucket_name}.s3.amazonaws.com/{video_key}"
             return url
         except Exception as e:
-            print(f"Error generating video URL: {str(e)}")
+            logger.error("Error generating video URL: %s", e)
             raise
\ No newline at end of file
@@ -0,0 +1,165 @@
+import math
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Observation tokens the comprehensive summary prompt may carry; beyond this they are condensed first
+SUMMARY_INPUT_TOKEN_BUDGET = int(os.getenv('SUMMARY_INPUT_TOKEN_BUDGET', '1500'))
+# Size of each group of observations condensed by one map call
+SUMMARY_CHUNK_TOKENS = int(os.getenv('SUMMARY_CHUNK_TOKENS', '1000'))
+# Map-reduce rounds before the summary runs with whatever is left
+SUMMARY_MAX_LEVELS = int(os.getenv('SUMMARY_MAX_LEVELS', '3'))
+# Rough characters per token for English text under the Llama tokenizer
+CHARS_PER_TOKEN = 4
+
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+|\s+-\s+")
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def estimate_tokens(text):
+    """Approximate token count of `text`, without a tokenizer round trip"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+class TokenBudget:
+    """Keeps the observations sent to the summary call within a token budget.
+
+    Works on prompt lines, where the observation text follows the first
+    " | " (the IncidentTimeline.compact format); other lines pass through
+    unchanged. `fit` drops sentences already stated on an earlier line, and
+    while the lines are still over budget, groups them into chunks and has
+    `condense(chunks)` rewrite each chunk shorter (map), repeating on the
+    condensed output (reduce) up to `max_levels` times.
+    """
+
+    def __init__(self, budget=SUMMARY_INPUT_TOKEN_BUDGET, chunk_tokens=SUMMARY_CHUNK_TOKENS,
+                 max_levels=SUMMARY_MAX_LEVELS):
+        self.budget = budget
+        self.chunk_tokens = chunk_tokens
+        self.max_levels = max_levels
+
+    @staticmethod
+    def estimate(lines):
+        return sum(estimate_tokens(line) + 1 for line in lines)
+
+    def dedupe(self, lines):
+        """Remove sentences that repeat, word for word, one on an earlier line"""
+        seen = set()
+        deduped = []
+        for line in lines:
+            header, separator, text = line.partition(" | ")
+            if not separator:
+                deduped.append(line)
+                continue
+            kept = []
+            for sentence in _SENTENCE_BREAK.split(text):
+                normalized = " ".join(_WORD.findall(sentence.lower()))
+                if not normalized:
+                    continue
+                if normalized not in seen:
+                    seen.add(normalized)
+                    kept.append(sentence.strip())
+            deduped.append(f"{header} | {' '.join(kept)}" if kept else f"{header} | no new details")
+        return deduped
+
+    def chunks(self, lines):
+        """Consecutive groups of lines of at most `chunk_tokens` each (a longer line is its own group)"""
+        groups, current, size = [], [], 0
+        for line in lines:
+            tokens = estimate_tokens(line) + 1
+            if current and size + tokens > self.chunk_tokens:
+                groups.append(current)
+                current, size = [], 0
+            current.append(line)
+            size += tokens
+        if current:
+            groups.append(current)
+        return groups
+
+    def fit(self, lines, condense):
+        """(lines within budget where possible, stats)"""
+        deduped = self.dedupe(lines)
+        stats = {
+            "budget_tokens": self.budget,
+            "raw_tokens": self.estimate(lines),
+            "deduped_tokens": self.estimate(deduped),
+            "levels": 0
+        }
+        lines = deduped
+        while self.estimate(lines) > self.budget and stats["levels"] < self.max_levels:
+            groups = self.chunks(lines)
+            condensed = [text for text in condense(groups) if text]
+            if not condensed or self.estimate(condensed) >= self.estimate(lines):
+                # No progress; summarize what there is rather than loop
+                break
+            lines = condensed
+            stats["levels"] += 1
+        stats["final_tokens"] = self.estimate(lines)
+        return lines, stats
+
+
+class UsageMeter:
+    """Model usage of one analysis, per stage: calls, input and output tokens, and call seconds.
+
+    Token counts come from the converse response's `usage` when present and
+    are estimated from the text otherwise (counted under `estimated_calls`).
+    `seconds` adds up call latencies; `wall_seconds` is the elapsed time of
+    stages run under `timed`. Safe to record into from the frame executor
+    threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._wall = {}
+        self.details = {}
+
+    def _stage(self, stage):
+        return self._stages.setdefault(stage, {
+            "calls": 0, "input_tokens": 0, "output_tokens": 0, "seconds": 0.0, "estimated_calls": 0
+        })
+
+    @contextmanager
+    def timed(self, stage):
+        """Measure the wall time of a stage, which for concurrent calls is less than their sum"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._wall[stage] = self._wall.get(stage, 0.0) + time.perf_counter() - started
+
+    def record(self, stage, seconds, usage=None, prompt_text='', output_text=''):
+        usage = usage or {}
+        input_tokens = usage.get('inputTokens')
+        output_tokens = usage.get('outputTokens')
+        estimated = input_tokens is None or output_tokens is None
+        if input_tokens is None:
+            input_tokens = estimate_tokens(prompt_text)
+        if output_tokens is None:
+            output_tokens = estimate_tokens(output_text)
+        with self._lock:
+            stage_stats = self._stage(stage)
+            stage_stats["calls"] += 1
+            stage_stats["input_tokens"] += input_tokens
+            stage_stats["output_tokens"] += output_tokens
+            stage_stats["seconds"] += seconds
+            stage_stats["estimated_calls"] += estimated
+
+    def to_dict(self):
+        with self._lock:
+            for stage in self._wall:
+                self._stage(stage)
+            stages = {stage: dict(stats) for stage, stats in self._stages.items()}
+            wall = dict(self._wall)
+        for stage, stats in stages.items():
+            stats["seconds"] = round(stats["seconds"], 3)
+            if stage in wall:
+                stats["wall_seconds"] = round(wall[stage], 3)
+        return {"stages": stages, **self.details}
@@ -0,0 +1,462 @@
+import json
+import logging
+import os
+import queue
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+
+from dotenv import load_dotenv
+
+from .analysis_service import (
+    LONG_VIDEO_SECONDS, PROMPT_VERSION, SEGMENT_FRAMES, SEGMENT_SECONDS, VISION_MODEL_ID
+)
+from .cache_service import ResultCache
+from .rate_limiter import LANE_BATCH, priority_lane
+from ..utils.executors import cpu_pool
+from ..utils.pipeline import PipelineStopped, StageTimings
+from ..utils.shared_frames import ProcessExtractionPool
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Where frames are decoded: "thread" in this process's CPU pool, "process" in a pool of worker processes
+EXTRACTION_MODE = os.getenv('EXTRACTION_MODE', 'thread')
+# Least seconds between progress writes of a running job; updates in between go out together in the next one
+JOB_PROGRESS_INTERVAL = float(os.getenv('VIDEO_JOB_PROGRESS_INTERVAL', '0.5'))
+
+JOB_STATUS_QUEUED = 'queued'
+JOB_STATUS_RUNNING = 'running'
+JOB_STATUS_COMPLETED = 'completed'
+JOB_STATUS_FAILED = 'failed'
+
+
+class JobStore:
+    """SQLite-backed store so submitted jobs survive a restart"""
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or os.getenv('VIDEO_JOB_DB', 'video_jobs.db')
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                video_key TEXT NOT NULL,
+                status TEXT NOT NULL,
+                partial TEXT,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def create(self, video_key):
+        job_id = str(uuid.uuid4())
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (job_id, video_key, status, partial, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, video_key, JOB_STATUS_QUEUED, json.dumps({}), now, now)
+            )
+            self._conn.commit()
+        return job_id
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT job_id, video_key, status, partial, result, error, created_at, updated_at "
+                "FROM jobs WHERE job_id = ?",
+                (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "jobId": row[0],
+            "videoKey": row[1],
+            "status": row[2],
+            "partial": json.loads(row[3]) if row[3] else {},
+            "result": json.loads(row[4]) if row[4] else None,
+            "error": row[5],
+            "createdAt": row[6],
+            "updatedAt": row[7],
+        }
+
+    def update(self, job_id, status=None, partial=None, result=None, error=None):
+        fields, values = ["updated_at = ?"], [time.time()]
+        if status is not None:
+            fields.append("status = ?")
+            values.append(status)
+        if partial is not None:
+            fields.append("partial = ?")
+            values.append(json.dumps(partial))
+        if result is not None:
+            fields.append("result = ?")
+            values.append(json.dumps(result))
+        if error is not None:
+            fields.append("error = ?")
+            values.append(error)
+        values.append(job_id)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {', '.join(fields)} WHERE job_id = ?", values)
+            self._conn.commit()
+
+    def unfinished(self):
+        """Jobs that were queued or mid-run when the process last stopped, oldest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT job_id FROM jobs WHERE status IN (?, ?) ORDER BY created_at",
+                (JOB_STATUS_QUEUED, JOB_STATUS_RUNNING)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+
+class JobProgress:
+    """Partial result of a running job, written to a JobStore at most every `interval` seconds.
+
+    Holds the stage, the frames extracted so far (id and timestamp only; the
+    images are stored once, with the result) and the observations. A change
+    within `interval` of the last write is written when the interval is up,
+    together with any that follow it; stage changes are written at once.
+    """
+
+    def __init__(self, store, job_id, interval=JOB_PROGRESS_INTERVAL):
+        self.store = store
+        self.job_id = job_id
+        self.interval = interval
+        self.partial = {"stage": "queued", "frames": [], "observations": {}}
+        self._lock = threading.Lock()
+        self._written_at = None
+        self._timer = None
+        self._closed = False
+
+    def stage(self, stage, frames=None):
+        with self._lock:
+            self.partial["stage"] = stage
+            if frames is not None:
+                self.partial["frames"] = [self._frame(frame) for frame in frames]
+            self._write()
+
+    def frame_extracted(self, frame_data):
+        with self._lock:
+            self.partial["frames"].append(self._frame(frame_data))
+            self._changed()
+
+    def frame_result(self, frame_data, description):
+        with self._lock:
+            self.partial["observations"][str(frame_data.id)] = description
+            self._changed()
+
+    def finish(self, **fields):
+        """Write the final partial along with `fields` (status, result) and stop writing progress"""
+        with self._lock:
+            self._close()
+            self.partial["stage"] = "done"
+            self.store.update(self.job_id, partial=self.partial, **fields)
+
+    def cancel(self):
+        with self._lock:
+            self._close()
+
+    @staticmethod
+    def _frame(frame_data):
+        return {"id": frame_data.id, "timestamp": frame_data.timestamp}
+
+    def _changed(self):
+        wait = 0 if self._written_at is None else self._written_at + self.interval - time.monotonic()
+        if wait <= 0:
+            self._write()
+        elif self._timer is None:
+            self._timer = threading.Timer(wait, self._flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _flush(self):
+        with self._lock:
+            self._timer = None
+            if not self._closed:
+                self._write()
+
+    def _write(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self.store.update(self.job_id, partial=self.partial)
+        self._written_at = time.monotonic()
+
+    def _close(self):
+        self._closed = True
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+
+class VideoJobService:
+    """Runs the fetch -> extract -> analyze pipeline, directly or as background jobs.
+
+    `submit` only records the job and returns its id; a fixed set of worker
+    threads pulls job ids off a queue, so throughput is set by the number of
+    workers rather than by how many clients are connected. Finished analyses
+    are cached by video content, so resubmitting a clip skips the pipeline.
+    """
+
+    def __init__(self, s3_service, analysis_service, store=None, num_workers=None, result_cache=None,
+                 extraction_pool=None):
+        self.s3_service = s3_service
+        self.analysis_service = analysis_service
+        self.store = store or JobStore()
+        self.result_cache = result_cache or ResultCache()
+        if extraction_pool is None and EXTRACTION_MODE == 'process':
+            extraction_pool = ProcessExtractionPool()
+        self.extraction_pool = extraction_pool
+        self.num_workers = num_workers or int(os.getenv('VIDEO_JOB_WORKERS', '4'))
+        self._queue = queue.Queue()
+        self._workers = []
+
+    def start(self):
+        if self._workers:
+            return
+        # Pick back up anything that was interrupted by a restart
+        for job_id in self.store.unfinished():
+            self.store.update(job_id, status=JOB_STATUS_QUEUED)
+            self._queue.put(job_id)
+
+        for i in range(self.num_workers):
+            worker = threading.Thread(target=self._worker_loop, name=f"video-job-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, video_key):
+        job_id = self.store.create(video_key)
+        self._queue.put(job_id)
+        return job_id
+
+    def get_job(self, job_id):
+        return self.store.get(job_id)
+
+    def _cache_key(self, content_hash):
+        # Sampling picks the frames and routing picks the models, so both are part of the analysis version
+        version = (
+            f"{PROMPT_VERSION}/{self.analysis_service.sampling_mode}"
+            f"/{LONG_VIDEO_SECONDS:g}:{SEGMENT_SECONDS:g}:{SEGMENT_FRAMES}/{self.analysis_service.router.mode}"
+        )
+        return self.result_cache.make_key(content_hash, VISION_MODEL_ID, version)
+
+    def process_video(self, video_key, on_stage=None, on_frame_result=None, block=False,
+                      on_frame_extracted=None, on_summary_delta=None):
+        """Analyze a video end to end and return the JSON-ready result.
+
+        `on_stage(stage, frames)` reports progress; `frames` is only set once
+        extraction is done. `on_frame_extracted(frame)`, `on_frame_result(frame,
+        description)` and `on_summary_delta(text)` report finer-grained progress
+        for streaming. `block` waits for CPU pool capacity instead of raising
+        PoolSaturatedError.
+
+        When the analysis service can pipeline, frames are decoded and analyzed
+        while the rest of the video is still downloading; `pipeline` in the
+        result has the per-stage timings either way.
+        """
+        started = time.perf_counter()
+
+        # Same object as before (S3 key + ETag): answer from cache with a single HEAD request
+        alias = None
+        try:
+            alias = f"{self.s3_service.bucket_name}/{video_key}@{self.s3_service.get_etag(video_key)}"
+        except Exception as e:
+            logger.warning("Could not read ETag for %s: %s", video_key, e)
+        if alias:
+            content_hash = self.result_cache.get_alias(alias)
+            if content_hash:
+                cached = self.result_cache.get(self._cache_key(content_hash))
+                if cached is not None:
+                    return {**cached, "cache": {"hit": True, "seconds": time.perf_counter() - started}}
+
+        if on_stage:
+            on_stage("downloading", None)
+        fd, temp_path = tempfile.mkstemp(suffix='.mp4')
+        os.close(fd)
+        timings = StageTimings()
+        transfer, found = {}, {}
+
+        def lookup(stats):
+            """Cached result for the content just fetched, if any; notes the cache key"""
+            found["key"] = self._cache_key(stats["content_hash"])
+            if alias:
+                self.result_cache.set_alias(alias, stats["content_hash"])
+            # Same bytes under another key: skip decoding and model calls
+            found["cached"] = self.result_cache.get(found["key"])
+            return found["cached"]
+
+        try:
+            frame_selector = None if self.analysis_service.needs_full_video else self.analysis_service.select_frame_indices
+            if self.extraction_pool is None and self.analysis_service.pipelined:
+                def fetch(on_ready):
+                    def ready(indices, stats):
+                        transfer.update(stats)
+                        if "key" not in found and lookup(stats) is not None:
+                            raise PipelineStopped()
+                        on_ready(indices, stats)
+                    transfer.update(self.s3_service.fetch_video(video_key, temp_path, frame_selector, ready))
+                    if "key" not in found and lookup(transfer) is not None:
+                        raise PipelineStopped()
+
+                analyzing = []
+
+                def frame_extracted(frame_data):
+                    if on_stage and not analyzing:
+                        analyzing.append(True)
+                        on_stage("analyzing", None)
+                    if on_frame_extracted:
+                        on_frame_extracted(frame_data)
+
+                # Frames are analyzed as they download; None means the content was found in the cache
+                result = self.analysis_service.analyze_video_pipelined(
+                    temp_path, fetch, on_frame_extracted=frame_extracted, on_frame_result=on_frame_result,
+                    on_summary_delta=on_summary_delta, block=block
+                )
+            else:
+                with timings.timed("download"):
+                    transfer.update(self.s3_service.fetch_video(video_key, temp_path, frame_selector))
+                lookup(transfer)
+                result = None
+
+            if found["cached"] is not None:
+                return {
+                    **found["cached"],
+                    "transfer": transfer,
+                    "cache": {"hit": True, "seconds": time.perf_counter() - started}
+                }
+
+            segments = None
+            if result is None:
+                segments = self.analysis_service.video_segments(*self.analysis_service.probe_video(temp_path))
+            if segments:
+                # Long video: segments are extracted and analyzed in parallel, so the file is needed throughout
+                if on_stage:
+                    on_stage("analyzing", None)
+                result = self.analysis_service.analyze_long_video(
+                    temp_path, segments, on_frame_extracted=on_frame_extracted,
+                    on_frame_result=on_frame_result, on_summary_delta=on_summary_delta,
+                    extraction_pool=self.extraction_pool
+                )
+            elif result is None:
+                if on_stage:
+                    on_stage("extracting", None)
+                with timings.timed("decode"):
+                    if self.extraction_pool is not None:
+                        frames = self.analysis_service.extract_frames_in_process(
+                            temp_path, self.extraction_pool, on_frame=on_frame_extracted, block=block
+                        )
+                    else:
+                        frames = cpu_pool.submit(
+                            self.analysis_service.extract_accident_frames, temp_path,
+                            block=block, on_frame=on_frame_extracted
+                        ).result()
+        finally:
+            try:
+                os.unlink(temp_path)
+            except Exception as e:
+                logger.warning("Error deleting temporary file: %s", e)
+
+        if result is None:
+            if on_stage:
+                on_stage("analyzing", frames)
+            with timings.timed("analyze"):
+                result = self.analysis_service.analyze_video_frames(
+                    frames, on_frame_result=on_frame_result, on_summary_delta=on_summary_delta
+                )
+
+        response = {
+            # Base64 is produced here, once, as the result is serialized
+            "frames": [frame.to_dict() for frame in result["frames"]],
+            "report": result["report"],
+            "analysis": result["analysis"],
+            "keywords": result["keywords"],
+            "severity": result["severity"],
+            "failed_frames": result["failed_frames"],
+            "skipped_frames": result["skipped_frames"],
+            "frame_count": len(result["frames"]),
+            "timeline": result["timeline"]
+        }
+        if "segments" in result:
+            response["segments"] = result["segments"]
+        # Only cache complete analyses; a retry may recover the failed frames
+        if not result["failed_frames"]:
+            self.result_cache.put(found["key"], response)
+
+        return {
+            **response,
+            "frame_cache": result["frame_cache"],
+            "routing": result["routing"],
+            "usage": result["usage"],
+            # Per-stage timings: overlapping stages when pipelined, one after another otherwise
+            "pipeline": result.get("pipeline") or timings.to_dict(),
+            "transfer": transfer,
+            "cache": {"hit": False, "seconds": time.perf_counter() - started}
+        }
+
+    def stream_video(self, video_key, emit):
+        """Run process_video, reporting each step through `emit(event, data)` as it happens.
+
+        Events: status, frame (thumbnail), observation, analysis_delta, then
+        exactly one of complete or error.
+        """
+        try:
+            emit("status", {"stage": "downloading", "videoKey": video_key})
+            result = self.process_video(
+                video_key,
+                on_stage=lambda stage, frames: emit("status", {"stage": stage}),
+                on_frame_extracted=lambda frame: emit("frame", {
+                    "id": frame.id,
+                    "timestamp": frame.timestamp,
+                    "thumbnail": frame.thumbnail()
+                }),
+                on_frame_result=lambda frame, description: emit("observation", {
+                    "frameId": frame.id,
+                    "text": description
+                }),
+                on_summary_delta=lambda text: emit("analysis_delta", {"text": text})
+            )
+            emit("complete", {"status": "success", **result})
+        except Exception as e:
+            logger.error("Error streaming video %s: %s", video_key, e)
+            emit("error", {"detail": str(e)})
+
+    def _worker_loop(self):
+        while True:
+            job_id = self._queue.get()
+            try:
+                self._run_job(job_id)
+            except Exception as e:
+                logger.error("Video job %s failed: %s", job_id, e)
+                self.store.update(job_id, status=JOB_STATUS_FAILED, error=str(e))
+            finally:
+                self._queue.task_done()
+
+    def _run_job(self, job_id):
+        job = self.store.get(job_id)
+        if job is None:
+            return
+
+        self.store.update(job_id, status=JOB_STATUS_RUNNING)
+        # Each write serializes the whole partial, so the frame images stay out of it and writes are spaced out
+        progress = JobProgress(self.store, job_id)
+
+        try:
+            # Background work: live and interactive Bedrock calls go first
+            with priority_lane(LANE_BATCH):
+                result = self.process_video(
+                    job["videoKey"], on_stage=progress.stage, on_frame_result=progress.frame_result, block=True,
+                    on_frame_extracted=progress.frame_extracted
+                )
+        except Exception:
+            progress.cancel()
+            raise
+
+        progress.finish(status=JOB_STATUS_COMPLETED, result=result)
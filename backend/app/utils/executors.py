@@ -0,0 +1,86 @@
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class PoolSaturatedError(Exception):
+    """Raised when a pool has no free worker or queue slot for new work"""
+
+    def __init__(self, pool_name, retry_after=1):
+        super().__init__(f"{pool_name} pool is saturated, retry later")
+        self.pool_name = pool_name
+        self.retry_after = retry_after
+
+
+class BoundedPool:
+    """Thread pool with a hard cap on running + queued tasks.
+
+    `run` hands blocking work to the pool from async code. Once `max_workers`
+    tasks are running and `max_queue` more are waiting, further submissions
+    fail fast with PoolSaturatedError instead of growing the queue. Pass
+    `executor` to put the same cap in front of another executor (e.g. a
+    process pool).
+    """
+
+    def __init__(self, name, max_workers, max_queue, executor=None):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = executor or ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+
+    def submit(self, func, *args, block=False, **kwargs):
+        """Submit work; with block=True wait for a free slot instead of raising"""
+        if not self._slots.acquire(blocking=block):
+            raise PoolSaturatedError(self.name)
+        with self._lock:
+            self._in_flight += 1
+        try:
+            future = self._executor.submit(func, *args, **kwargs)
+        except Exception:
+            self._release()
+            raise
+        # Release on completion, not when the caller stops waiting, so
+        # cancelled requests still count until their thread is free again
+        future.add_done_callback(lambda _: self._release())
+        return future
+
+    async def run(self, func, *args, **kwargs):
+        future = self.submit(functools.partial(func, *args, **kwargs))
+        return await asyncio.wrap_future(future)
+
+    def _release(self):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": self._in_flight,
+        }
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+# Decoding/resizing/encoding frames. OpenCV releases the GIL inside its codecs,
+# so threads sized to the core count keep every core busy.
+cpu_pool = BoundedPool(
+    'cpu',
+    max_workers=int(os.getenv('CPU_POOL_WORKERS', str(os.cpu_count() or 2))),
+    max_queue=int(os.getenv('CPU_POOL_QUEUE', '8'))
+)
+
+# Blocking network calls: S3, DynamoDB, Bedrock, VAPI
+io_pool = BoundedPool(
+    'io',
+    max_workers=int(os.getenv('IO_POOL_WORKERS', '32')),
+    max_queue=int(os.getenv('IO_POOL_QUEUE', '64'))
+)
@@ -0,0 +1,97 @@
+import heapq
+import os
+
+import cv2
+import numpy as np
+from dotenv import load_dotenv
+
+from .image_hash import dhash, hamming_distance
+from .video_utils import open_video
+
+load_dotenv()
+
+
+class AdaptiveFrameSampler:
+    """Picks the most informative frames of a video in one sequential pass.
+
+    Frames are decoded in order (no seeking) and only every `stride`-th one
+    is scored, at roughly `scan_fps`. Each scored frame gets a change score
+    from a small grey thumbnail: mean absolute pixel difference plus
+    histogram distance to the previous scored frame. The top-scoring frames
+    that are at least `min_gap_seconds` apart and not perceptually identical
+    are kept, up to `max_frames`; the first frame is always kept as the
+    establishing shot.
+    """
+
+    def __init__(self, max_frames=None, scan_fps=None, min_gap_seconds=None, thumb_width=160):
+        self.max_frames = max_frames or int(os.getenv('SAMPLER_MAX_FRAMES', '4'))
+        self.scan_fps = scan_fps or float(os.getenv('SAMPLER_SCAN_FPS', '2'))
+        self.min_gap_seconds = min_gap_seconds if min_gap_seconds is not None else float(
+            os.getenv('SAMPLER_MIN_GAP_SECONDS', '1.0')
+        )
+        self.thumb_width = thumb_width
+        # Candidates kept while scanning; bounds memory on long videos
+        self.candidate_pool = self.max_frames * 4
+
+    def _thumbnail(self, frame):
+        grey = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        height, width = grey.shape
+        thumb_height = max(1, int(height * self.thumb_width / width))
+        return cv2.resize(grey, (self.thumb_width, thumb_height), interpolation=cv2.INTER_AREA)
+
+    @staticmethod
+    def _change_score(thumb, previous):
+        pixel_change = np.abs(thumb.astype(np.int16) - previous.astype(np.int16)).mean() / 255.0
+        hist = np.bincount((thumb >> 2).ravel(), minlength=64) / thumb.size
+        previous_hist = np.bincount((previous >> 2).ravel(), minlength=64) / previous.size
+        hist_change = np.abs(hist - previous_hist).sum() / 2.0
+        return float(pixel_change + hist_change)
+
+    def sample(self, video_path, prepare=None):
+        """Return [(frame_index, frame)] in time order.
+
+        `prepare(frame)` is applied to kept frames as they are found (e.g. a
+        resize) so only small frames are held in memory during the scan.
+        """
+        with open_video(video_path) as decoder:
+            return self.sample_decoder(decoder, prepare)
+
+    def sample_decoder(self, decoder, prepare=None, start=0, end=None):
+        """`sample` over an already open VideoDecoder, optionally only frames [start, end)"""
+        stride = max(1, int(round(decoder.fps / self.scan_fps)))
+        min_gap_frames = self.min_gap_seconds * decoder.fps
+
+        first = None
+        heap = []  # (score, index, frame, hash) min-heap of the best candidates
+        previous = None
+        # Only every stride-th frame is converted to BGR; the rest are just decoded
+        for index, frame in decoder.iter_frames(stride, start, end):
+            thumb = self._thumbnail(frame)
+            if previous is None:
+                kept = prepare(frame) if prepare else frame
+                first = (index, kept, dhash(thumb))
+            else:
+                score = self._change_score(thumb, previous)
+                if len(heap) < self.candidate_pool or score > heap[0][0]:
+                    kept = prepare(frame) if prepare else frame
+                    entry = (score, index, kept, dhash(thumb))
+                    if len(heap) < self.candidate_pool:
+                        heapq.heappush(heap, entry)
+                    else:
+                        heapq.heapreplace(heap, entry)
+            previous = thumb
+
+        if first is None:
+            return []
+
+        selected = [first]
+        for score, idx, frame, frame_hash in sorted(heap, key=lambda c: (-c[0], c[1])):
+            if len(selected) >= self.max_frames:
+                break
+            if any(abs(idx - s[0]) < min_gap_frames for s in selected):
+                continue
+            if any(hamming_distance(frame_hash, s[2]) <= 2 for s in selected):
+                continue
+            selected.append((idx, frame, frame_hash))
+
+        return [(idx, frame) for idx, frame, _ in sorted(selected, key=lambda s: s[0])]
@@ -0,0 +1,109 @@
+import os
+
+import cv2
+import numpy as np
+from dotenv import load_dotenv
+
+from .frame_sampler import AdaptiveFrameSampler
+
+load_dotenv()
+
+# Below this grey level (0-255) at the BRIGHTNESS_PERCENTILE a frame is too dark to describe
+TRIAGE_MIN_BRIGHTNESS = float(os.getenv('TRIAGE_MIN_BRIGHTNESS', '20'))
+# Variance of the Laplacian of the thumbnail; lower means motion blur or an out of focus lens
+TRIAGE_MIN_SHARPNESS = float(os.getenv('TRIAGE_MIN_SHARPNESS', '15'))
+# Grey-level standard deviation; lower is a blank, washed out or covered frame
+TRIAGE_MIN_CONTRAST = float(os.getenv('TRIAGE_MIN_CONTRAST', '8'))
+# Change score against the previous kept frame (as in AdaptiveFrameSampler) that marks a frame as salient
+TRIAGE_SALIENT_CHANGE = float(os.getenv('TRIAGE_SALIENT_CHANGE', '0.25'))
+# Share of saturated red-orange-yellow pixels (fire, flames, warning lights) that marks a frame as salient
+TRIAGE_SALIENT_HOT_FRACTION = float(os.getenv('TRIAGE_SALIENT_HOT_FRACTION', '0.02'))
+
+THUMB_WIDTH = 160
+# Darkness is judged on the bright end of the frame, so a night scene lit in one corner is kept
+BRIGHTNESS_PERCENTILE = 95
+
+
+class FrameTriage:
+    """Cheap CPU checks that decide which frames are worth a model call, and which model.
+
+    Each frame is reduced to a small thumbnail. Frames that are too dark,
+    too blurry or too flat to describe are dropped, unless any of the
+    thumbnail is fire-coloured: a night frame with flames is never dropped.
+    Of the rest, a frame is salient when it is the first kept frame (the
+    establishing shot), when it changed a lot since the previous kept frame,
+    or when a noticeable share of it is fire-coloured; salient frames go to
+    the large vision model and the others to the small one.
+    """
+
+    def __init__(self, min_brightness=TRIAGE_MIN_BRIGHTNESS, min_sharpness=TRIAGE_MIN_SHARPNESS,
+                 min_contrast=TRIAGE_MIN_CONTRAST, salient_change=TRIAGE_SALIENT_CHANGE,
+                 salient_hot_fraction=TRIAGE_SALIENT_HOT_FRACTION):
+        self.min_brightness = min_brightness
+        self.min_sharpness = min_sharpness
+        self.min_contrast = min_contrast
+        self.salient_change = salient_change
+        self.salient_hot_fraction = salient_hot_fraction
+
+    @staticmethod
+    def _thumbnail(frame):
+        height, width = frame.shape[:2]
+        thumb_height = max(1, int(height * THUMB_WIDTH / width))
+        return cv2.resize(frame, (THUMB_WIDTH, thumb_height), interpolation=cv2.INTER_AREA)
+
+    @staticmethod
+    def _hot_fraction(thumb):
+        hsv = cv2.cvtColor(thumb, cv2.COLOR_BGR2HSV)
+        hue, saturation, value = hsv[..., 0], hsv[..., 1], hsv[..., 2]
+        # OpenCV hue is 0-180: red wraps around 0, orange and yellow run up to ~35
+        hot = ((hue <= 35) | (hue >= 170)) & (saturation >= 150) & (value >= 150)
+        return float(np.count_nonzero(hot)) / hot.size
+
+    def assess_frame(self, frame, previous=None):
+        """(assessment, grey thumbnail) of one frame; `previous` is the grey thumbnail of the last kept frame.
+
+        The thumbnail is None for an unusable frame, which does not become
+        the reference for the next one.
+        """
+        thumb = self._thumbnail(frame)
+        grey = cv2.cvtColor(thumb, cv2.COLOR_BGR2GRAY)
+        # Hot pixels first: they overrule every reason to drop the frame
+        hot_fraction = self._hot_fraction(thumb)
+        brightness = float(np.percentile(grey, BRIGHTNESS_PERCENTILE))
+        contrast = float(grey.std())
+        sharpness = float(cv2.Laplacian(grey, cv2.CV_64F).var())
+        assessment = {
+            "brightness": round(brightness, 1),
+            "contrast": round(contrast, 1),
+            "sharpness": round(sharpness, 1),
+            "hot_fraction": round(hot_fraction, 3),
+            "usable": True,
+            "salient": False,
+            "reason": None
+        }
+        if hot_fraction == 0:
+            if brightness < self.min_brightness:
+                assessment.update(usable=False, reason="dark")
+            elif contrast < self.min_contrast:
+                assessment.update(usable=False, reason="flat")
+            elif sharpness < self.min_sharpness:
+                assessment.update(usable=False, reason="blurry")
+            if not assessment["usable"]:
+                return assessment, None
+        change = 1.0 if previous is None else AdaptiveFrameSampler._change_score(grey, previous)
+        assessment.update(
+            change=round(change, 3),
+            salient=change >= self.salient_change or hot_fraction >= self.salient_hot_fraction
+        )
+        return assessment, grey
+
+    def assess(self, frames):
+        """[{"usable", "salient", "reason", ...metrics}] for BGR frames in time order"""
+        assessments = []
+        previous = None
+        for frame in frames:
+            assessment, grey = self.assess_frame(frame, previous)
+            if grey is not None:
+                previous = grey
+            assessments.append(assessment)
+        return assessments
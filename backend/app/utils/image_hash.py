@@ -0,0 +1,23 @@
+import cv2
+
+
+def dhash(frame, hash_size=8):
+    """64-bit difference hash of a BGR or grayscale frame.
+
+    Shrinks the image to (hash_size + 1) x hash_size grey pixels and records
+    whether each pixel is brighter than its right-hand neighbour. Nearly
+    identical scenes give hashes a few bits apart regardless of resolution
+    or JPEG noise.
+    """
+    if frame.ndim == 3:
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(frame, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def hamming_distance(a, b):
+    return (a ^ b).bit_count()
@@ -0,0 +1,185 @@
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = tuple(
+    float(bound) for bound in os.getenv(
+        'METRICS_LATENCY_BUCKETS', '0.001,0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10,30,60'
+    ).split(',')
+)
+
+# Spans are logged here at DEBUG; raise this logger's level to keep the histograms without the log lines
+span_logger = logging.getLogger('app.spans')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    """Metrics of this process, rendered in the Prometheus text exposition format"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=(), registry=REGISTRY):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+        registry.register(self)
+
+    def _key(self, labels):
+        if len(labels) != len(self.labels):
+            raise ValueError(f"{self.name} takes labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def _snapshot(self):
+        with self._lock:
+            return sorted(self._values.items())
+
+
+class Counter(_Metric):
+    """Monotonic count per label set"""
+
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def render(self):
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}" for key, value in self._snapshot()]
+
+
+class Histogram(_Metric):
+    """Observations per label set, counted into cumulative `buckets` with their sum and count"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS, registry=REGISTRY):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labels, registry)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        position = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                # One slot per bucket, one for +Inf, then the sum
+                counts = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[position] += 1
+            counts[-1] += value
+
+    def _snapshot(self):
+        with self._lock:
+            return sorted((key, list(counts)) for key, counts in self._values.items())
+
+    def render(self):
+        lines = []
+        for key, counts in self._snapshot():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else _format_value(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(counts[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+STAGE_SECONDS = Histogram(
+    'accident_stage_seconds', 'Wall time of instrumented processing steps', ('stage',)
+)
+STAGE_CPU_SECONDS = Counter(
+    'accident_stage_cpu_seconds_total', 'CPU time of the thread running each instrumented step', ('stage',)
+)
+STAGE_ERRORS = Counter(
+    'accident_stage_errors_total', 'Instrumented processing steps that raised', ('stage',)
+)
+
+
+def record_span(stage, seconds, cpu_seconds=None, **fields):
+    """Record a step timed by the caller, as `span` does"""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    if cpu_seconds is not None:
+        STAGE_CPU_SECONDS.inc(cpu_seconds, stage=stage)
+    if span_logger.isEnabledFor(logging.DEBUG):
+        span_logger.debug(
+            "span stage=%s seconds=%.4f%s", stage, seconds,
+            ''.join(f" {name}={value}" for name, value in fields.items())
+        )
+
+
+@contextmanager
+def span(stage, **fields):
+    """Time a step into STAGE_SECONDS and log it at DEBUG with `fields`.
+
+    CPU time is that of the calling thread only, so a step that waits on
+    other threads or processes counts its wall time but not their CPU.
+
+    The yielded dict can be filled in while the step runs (e.g. token counts
+    once a response is back). Fields are only formatted when DEBUG logging
+    is on for `app.spans`, so pass sizes and ids, never payloads.
+    """
+    started = time.perf_counter()
+    cpu_started = time.thread_time()
+    try:
+        yield fields
+    except BaseException as e:
+        STAGE_ERRORS.inc(stage=stage)
+        fields["error"] = type(e).__name__
+        raise
+    finally:
+        record_span(stage, time.perf_counter() - started, time.thread_time() - cpu_started, **fields)
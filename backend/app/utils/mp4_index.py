@@ -0,0 +1,211 @@
+"""Minimal MP4/MOV sample-table reader.
+
+Just enough of ISO BMFF to find where the video samples for a handful of
+frame indices live in the file, so they can be fetched with ranged reads
+instead of downloading the whole object.
+"""
+import bisect
+import struct
+
+# Container boxes we descend into on the way to the sample tables
+_CONTAINER_BOXES = {b'moov', b'trak', b'mdia', b'minf', b'stbl', b'edts'}
+
+
+class MP4IndexError(ValueError):
+    """The file is not an MP4 we can index (fragmented, no video track, corrupt...)"""
+
+
+def parse_box_header(data, offset=0):
+    """Return (box_type, header_size, box_size) for the box at `offset`"""
+    if len(data) < offset + 8:
+        raise MP4IndexError("Truncated box header")
+    size, box_type = struct.unpack_from('>I4s', data, offset)
+    header_size = 8
+    if size == 1:
+        if len(data) < offset + 16:
+            raise MP4IndexError("Truncated 64-bit box header")
+        size = struct.unpack_from('>Q', data, offset + 8)[0]
+        header_size = 16
+    elif size == 0:
+        size = None  # extends to end of file
+    return box_type, header_size, size
+
+
+def scan_top_level_boxes(read_range, file_size, head=None):
+    """List top-level boxes as (type, offset, size, header_bytes).
+
+    `read_range(start, end)` returns bytes [start, end] inclusive. `head`
+    can hold bytes already fetched from the start of the file to avoid
+    extra round trips for the first few boxes.
+    """
+    boxes = []
+    offset = 0
+    while offset < file_size:
+        if head is not None and offset + 16 <= len(head):
+            header = head[offset:offset + 16]
+        else:
+            header = read_range(offset, min(offset + 15, file_size - 1))
+        box_type, header_size, size = parse_box_header(header)
+        if size is None:
+            size = file_size - offset
+        if size < header_size:
+            raise MP4IndexError(f"Invalid size for box {box_type!r}")
+        boxes.append((box_type, offset, size, header[:header_size]))
+        offset += size
+    return boxes
+
+
+def _children(data, start, end):
+    offset = start
+    while offset + 8 <= end:
+        box_type, header_size, size = parse_box_header(data, offset)
+        if size is None:
+            size = end - offset
+        yield box_type, offset + header_size, offset + size
+        offset += size
+
+
+def _full_box_entries(data, start):
+    # version(1) + flags(3) + entry_count(4)
+    return struct.unpack_from('>I', data, start + 4)[0], start + 8
+
+
+class VideoTrackIndex:
+    """Per-sample byte offsets, sizes and sync flags for the first video track"""
+
+    def __init__(self, offsets, sizes, sync_samples, timescale, sample_deltas):
+        self.offsets = offsets
+        self.sizes = sizes
+        # None means every sample is a sync sample
+        self.sync_samples = sync_samples
+        self.timescale = timescale
+        self.sample_deltas = sample_deltas
+
+    @property
+    def sample_count(self):
+        return len(self.sizes)
+
+    @property
+    def fps(self):
+        """Average frame rate from the sample durations; None if the track has none"""
+        duration = sum(self.sample_deltas)
+        return self.sample_count * self.timescale / duration if duration else None
+
+    def sync_sample_before(self, index):
+        if self.sync_samples is None:
+            return index
+        position = bisect.bisect_right(self.sync_samples, index) - 1
+        return self.sync_samples[position] if position >= 0 else 0
+
+    def byte_ranges_for(self, indices, seek_preroll=16, reorder_margin=8):
+        """Inclusive byte ranges needed to decode each frame in `indices`.
+
+        Each range starts at the sync sample the decoder will seek to and runs
+        a few samples past the target so B-frame reordering can complete.
+        OpenCV's FFmpeg backend seeks to `seek_preroll` frames before the
+        target and decodes forward from the keyframe preceding that.
+        """
+        ranges = []
+        last = self.sample_count - 1
+        for index in indices:
+            index = max(0, min(index, last))
+            first = self.sync_sample_before(max(0, index - seek_preroll))
+            final = min(last, index + reorder_margin)
+            start = min(self.offsets[first:final + 1])
+            end = max(o + s for o, s in zip(self.offsets[first:final + 1], self.sizes[first:final + 1])) - 1
+            ranges.append((start, end))
+        return ranges
+
+
+def parse_video_track(moov):
+    """Build a VideoTrackIndex from the raw bytes of a `moov` box"""
+    _, header_size, size = parse_box_header(moov)
+    for trak_type, trak_start, trak_end in _children(moov, header_size, size):
+        if trak_type != b'trak':
+            continue
+        tables = {}
+        handler = None
+        timescale = None
+
+        def walk(start, end):
+            nonlocal handler, timescale
+            for box_type, box_start, box_end in _children(moov, start, end):
+                if box_type in _CONTAINER_BOXES:
+                    walk(box_start, box_end)
+                elif box_type == b'hdlr':
+                    handler = moov[box_start + 8:box_start + 12]
+                elif box_type == b'mdhd':
+                    version = moov[box_start]
+                    timescale = struct.unpack_from('>I', moov, box_start + (20 if version == 1 else 12))[0]
+                elif box_type in (b'stts', b'stss', b'stsc', b'stsz', b'stco', b'co64'):
+                    tables[box_type] = box_start
+
+        walk(trak_start, trak_end)
+        if handler != b'vide':
+            continue
+        if b'stsz' not in tables or b'stsc' not in tables or not (b'stco' in tables or b'co64' in tables):
+            raise MP4IndexError("Video track has no sample table (fragmented MP4?)")
+        return _build_index(moov, tables, timescale or 1)
+
+    raise MP4IndexError("No video track found")
+
+
+def _build_index(moov, tables, timescale):
+    # Sample sizes
+    start = tables[b'stsz']
+    uniform_size, count = struct.unpack_from('>II', moov, start + 4)
+    if uniform_size:
+        sizes = [uniform_size] * count
+    else:
+        sizes = list(struct.unpack_from(f'>{count}I', moov, start + 12))
+
+    # Chunk offsets
+    if b'co64' in tables:
+        n, pos = _full_box_entries(moov, tables[b'co64'])
+        chunk_offsets = struct.unpack_from(f'>{n}Q', moov, pos)
+    else:
+        n, pos = _full_box_entries(moov, tables[b'stco'])
+        chunk_offsets = struct.unpack_from(f'>{n}I', moov, pos)
+
+    # Samples per chunk, expanded over every chunk
+    n, pos = _full_box_entries(moov, tables[b'stsc'])
+    runs = [struct.unpack_from('>III', moov, pos + 12 * i) for i in range(n)]
+    offsets = []
+    sample = 0
+    for i, (first_chunk, samples_per_chunk, _) in enumerate(runs):
+        last_chunk = runs[i + 1][0] - 1 if i + 1 < len(runs) else len(chunk_offsets)
+        for chunk in range(first_chunk - 1, last_chunk):
+            offset = chunk_offsets[chunk]
+            for _ in range(samples_per_chunk):
+                if sample >= count:
+                    break
+                offsets.append(offset)
+                offset += sizes[sample]
+                sample += 1
+    if len(offsets) != count:
+        raise MP4IndexError("Sample-to-chunk table does not cover every sample")
+
+    sync_samples = None
+    if b'stss' in tables:
+        n, pos = _full_box_entries(moov, tables[b'stss'])
+        sync_samples = [s - 1 for s in struct.unpack_from(f'>{n}I', moov, pos)]
+
+    sample_deltas = []
+    if b'stts' in tables:
+        n, pos = _full_box_entries(moov, tables[b'stts'])
+        for i in range(n):
+            run, delta = struct.unpack_from('>II', moov, pos + 8 * i)
+            sample_deltas.extend([delta] * run)
+
+    return VideoTrackIndex(offsets, sizes, sync_samples, timescale, sample_deltas)
+
+
+def merge_ranges(ranges, max_gap=0):
+    """Sort and merge inclusive byte ranges that overlap or sit within `max_gap` bytes"""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1 + max_gap:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
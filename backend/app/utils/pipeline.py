@@ -0,0 +1,229 @@
+import contextvars
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Items a stage's input queue holds before the stage feeding it blocks
+PIPELINE_QUEUE_SIZE = int(os.getenv('PIPELINE_QUEUE_SIZE', '4'))
+# How often a thread blocked on a queue checks whether the pipeline was stopped
+POLL_SECONDS = 0.05
+
+# End of input, passed along from stage to stage once a stage's workers are all done
+_DONE = object()
+
+
+class PipelineStopped(Exception):
+    """Raised by a stage to end the pipeline early without an error"""
+
+
+class StageTimings:
+    """Where the time of one run went, per stage.
+
+    For each stage: items in and out, busy seconds (summed over its
+    workers), seconds blocked handing outputs to a full downstream queue,
+    and when it first started and last finished relative to the start of
+    the run. Stages that overlap show up as overlapping start/finish times;
+    the slowest stage is the one with the most busy seconds per worker.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._stages = {}
+
+    def stage(self, name, workers=1):
+        with self._lock:
+            return self._stages.setdefault(name, {
+                "workers": workers, "items_in": 0, "items_out": 0, "busy_seconds": 0.0,
+                "blocked_seconds": 0.0, "started_at": None, "finished_at": None
+            })
+
+    def record(self, name, started, finished, blocked=0.0, items_in=1, items_out=0):
+        stats = self.stage(name)
+        with self._lock:
+            stats["items_in"] += items_in
+            stats["items_out"] += items_out
+            stats["busy_seconds"] += finished - started - blocked
+            stats["blocked_seconds"] += blocked
+            started, finished = started - self.started, finished - self.started
+            stats["started_at"] = started if stats["started_at"] is None else min(stats["started_at"], started)
+            stats["finished_at"] = finished if stats["finished_at"] is None else max(stats["finished_at"], finished)
+
+    @contextmanager
+    def timed(self, name):
+        """Time a step run outside the pipeline (e.g. the summary) into the same report"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, started, time.perf_counter())
+
+    def to_dict(self):
+        with self._lock:
+            stages = {name: dict(stats) for name, stats in self._stages.items()}
+        for stats in stages.values():
+            for key in ("busy_seconds", "blocked_seconds", "started_at", "finished_at"):
+                if stats[key] is not None:
+                    stats[key] = round(stats[key], 3)
+        finished = [stats["finished_at"] for stats in stages.values() if stats["finished_at"] is not None]
+        slowest = max(stages, key=lambda name: stages[name]["busy_seconds"] / stages[name]["workers"], default=None)
+        return {
+            "wall_seconds": max(finished, default=0.0),
+            "busy_seconds": round(sum(stats["busy_seconds"] for stats in stages.values()), 3),
+            "slowest_stage": slowest,
+            "stages": stages
+        }
+
+
+class PipelineStage:
+    """One step of a StagePipeline: `fn(item, emit)` run by `workers` threads"""
+
+    def __init__(self, name, fn, workers=1, queue_size=PIPELINE_QUEUE_SIZE):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.queue_size = queue_size
+
+
+class StagePipeline:
+    """Runs items through a chain of stages connected by bounded queues.
+
+    Each stage has its own worker threads and calls `fn(item, emit)` for
+    every item that reaches it; `emit(output)` hands an output to the next
+    stage, or to the list `run` returns after the last one. A stage may emit
+    any number of outputs per item and the next stage starts on the first
+    one straight away, so stages overlap and the end-to-end time tends to
+    that of the slowest stage instead of the sum. `emit` blocks while the
+    next stage's queue is full, so a fast stage never runs more than a queue
+    ahead of a slow one.
+
+    Workers run in a copy of the caller's context, so calls they make keep
+    its priority lane. The first exception a stage raises stops every stage
+    and is re-raised from `run`; PipelineStopped stops them quietly and sets
+    `stopped`. Per-stage timings are kept in `timings`.
+    """
+
+    def __init__(self, stages, timings=None):
+        self.stages = stages
+        self.timings = timings or StageTimings()
+        self.stopped = False
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._error = None
+        self._results = []
+
+    def _put(self, target, item):
+        while not self._stop.is_set():
+            try:
+                target.put(item, timeout=POLL_SECONDS)
+                return
+            except queue.Full:
+                continue
+        raise PipelineStopped()
+
+    def _get(self, source):
+        while not self._stop.is_set():
+            try:
+                return source.get(timeout=POLL_SECONDS)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _fail(self, error):
+        with self._lock:
+            if error is None:
+                self.stopped = True
+            elif self._error is None:
+                self._error = error
+        self._stop.set()
+
+    def _work(self, position, queues, remaining):
+        stage = self.stages[position]
+        source = queues[position]
+        target = queues[position + 1] if position + 1 < len(queues) else None
+
+        while True:
+            item = self._get(source)
+            if item is _DONE:
+                break
+            started = time.perf_counter()
+            handed = {"blocked": 0.0, "items": 0}
+
+            def emit(output):
+                waited = time.perf_counter()
+                if target is None:
+                    with self._lock:
+                        self._results.append(output)
+                else:
+                    self._put(target, output)
+                handed["blocked"] += time.perf_counter() - waited
+                handed["items"] += 1
+
+            try:
+                stage.fn(item, emit)
+            except PipelineStopped:
+                self._fail(None)
+            except Exception as e:
+                logger.error("Pipeline stage %s failed: %s", stage.name, e)
+                self._fail(e)
+            finally:
+                self.timings.record(
+                    stage.name, started, time.perf_counter(), handed["blocked"], items_out=handed["items"]
+                )
+
+        with self._lock:
+            remaining[position] -= 1
+            last = remaining[position] == 0
+        if self._stop.is_set():
+            return
+        try:
+            if not last:
+                # Let the stage's other workers see the end of input too
+                self._put(source, _DONE)
+            elif target is not None:
+                self._put(target, _DONE)
+        except PipelineStopped:
+            pass
+
+    def run(self, items):
+        """Feed `items` to the first stage and return what the last stage emitted, in emit order"""
+        queues = [queue.Queue(maxsize=stage.queue_size) for stage in self.stages]
+        remaining = [stage.workers for stage in self.stages]
+        threads = []
+        for position, stage in enumerate(self.stages):
+            self.timings.stage(stage.name, stage.workers)
+            for number in range(stage.workers):
+                thread = threading.Thread(
+                    target=contextvars.copy_context().run, args=(self._work, position, queues, remaining),
+                    name=f"pipeline-{stage.name}-{number}", daemon=True
+                )
+                thread.start()
+                threads.append(thread)
+
+        try:
+            for item in items:
+                self._put(queues[0], item)
+            self._put(queues[0], _DONE)
+        except PipelineStopped:
+            pass
+        except Exception as e:
+            self._fail(e)
+        for thread in threads:
+            thread.join()
+
+        if self._error is not None:
+            raise self._error
+        return list(self._results)
+
+    def stop(self):
+        """End the run early; stages finish the item in hand and exit"""
+        self._fail(None)
@@ -0,0 +1,124 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+
+import cv2
+import numpy as np
+from dotenv import load_dotenv
+
+from .executors import BoundedPool
+from .video_utils import fit_size, open_video, segment_frame_indices
+
+load_dotenv()
+
+EXTRACTION_PROCESSES = int(os.getenv('EXTRACTION_PROCESSES', str(os.cpu_count() or 2)))
+EXTRACTION_QUEUE = int(os.getenv('EXTRACTION_QUEUE', '8'))
+# Workers are replaced after this many videos, so decoder leaks and heap fragmentation cannot build up
+EXTRACTION_MAX_TASKS_PER_CHILD = int(os.getenv('EXTRACTION_MAX_TASKS_PER_CHILD', '50'))
+# Codec threads per worker; one process per core already uses every core
+EXTRACTION_DECODE_THREADS = int(os.getenv('EXTRACTION_DECODE_THREADS', '1'))
+
+
+def extract_to_shared_memory(video_path, max_size, sampler=None, count=4, decode_threads=1, start=0, end=None):
+    """Worker-process side: decode the sampled frames into one shared memory block.
+
+    Uniform sampling takes `count` evenly spaced frames from [start, end)
+    (default: the whole video); pass an AdaptiveFrameSampler as `sampler`
+    to use it instead. Returns
+    (block name, frame shape, frame indices, fps), or (None, None, [], fps)
+    when nothing could be decoded. Ownership of the block passes to the
+    caller, which must attach to it with SharedFrameBlock.
+    """
+    with open_video(video_path, threads=decode_threads, max_size=max_size) as decoder:
+        fps = decoder.fps
+        end = decoder.frame_count if end is None else end
+        if sampler is not None:
+            sampled = sampler.sample_decoder(decoder, start=start, end=end)
+        else:
+            sampled = list(decoder.read_frames(segment_frame_indices(start, end, count)))
+        width, height = fit_size(decoder.width, decoder.height, max_size)
+    if not sampled:
+        return None, None, [], fps
+
+    shape = (height, width, 3)
+    block = shared_memory.SharedMemory(create=True, size=len(sampled) * height * width * 3)
+    try:
+        slots = np.ndarray((len(sampled),) + shape, dtype=np.uint8, buffer=block.buf)
+        for slot, (_, frame) in zip(slots, sampled):
+            if frame.shape == shape:
+                slot[...] = frame
+            else:
+                cv2.resize(frame, (width, height), dst=slot, interpolation=cv2.INTER_AREA)
+        del slots
+    except BaseException:
+        block.close()
+        block.unlink()
+        raise
+    # The parent unlinks it; stop this process's resource tracker from doing so when the worker exits
+    resource_tracker.unregister(block._name, 'shared_memory')
+    block.close()
+    return block.name, shape, [idx for idx, _ in sampled], fps
+
+
+class SharedFrameBlock:
+    """Parent-side mapping of a worker's frame block.
+
+    The name is unlinked as soon as it is attached, so a crash cannot leak
+    it; the memory stays mapped until this object and every frame array
+    viewing it are gone.
+    """
+
+    def __init__(self, name):
+        self._block = shared_memory.SharedMemory(name=name)
+        self._block.unlink()
+
+    def frames(self, count, shape):
+        """Zero-copy array views, one per frame"""
+        frames = np.ndarray((count,) + tuple(shape), dtype=np.uint8, buffer=self._block.buf)
+        return list(frames)
+
+    def __del__(self):
+        try:
+            self._block.close()
+        except BufferError:
+            # A frame array outlived its ExtractedFrame; the mapping is released with it
+            pass
+
+
+class ProcessExtractionPool:
+    """Process pool for frame extraction, bounded like the thread pools.
+
+    Decoding, sampling and resizing run in worker processes, outside this
+    process's GIL. Frames come back through shared memory rather than as
+    pickled arrays.
+    """
+
+    def __init__(self, max_workers=None, max_queue=None, max_tasks_per_child=None, decode_threads=None):
+        max_workers = max_workers or EXTRACTION_PROCESSES
+        self.decode_threads = decode_threads or EXTRACTION_DECODE_THREADS
+        # max_tasks_per_child needs a non-fork start method; spawn also keeps
+        # the app's threads and open clients out of the workers
+        executor = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            max_tasks_per_child=max_tasks_per_child or EXTRACTION_MAX_TASKS_PER_CHILD
+        )
+        self.pool = BoundedPool('extraction', max_workers, max_queue or EXTRACTION_QUEUE, executor=executor)
+
+    def extract(self, video_path, max_size, sampler=None, count=4, block=False, start=0, end=None):
+        """([(frame_index, frame)], fps, block): frames are views into `block`, which they must keep alive"""
+        name, shape, indices, fps = self.pool.submit(
+            extract_to_shared_memory, video_path, max_size, sampler, count, self.decode_threads, start, end,
+            block=block
+        ).result()
+        if name is None:
+            return [], fps, None
+        shared = SharedFrameBlock(name)
+        return list(zip(indices, shared.frames(len(indices), shape))), fps, shared
+
+    def stats(self):
+        return self.pool.stats()
+
+    def shutdown(self, wait=True):
+        self.pool.shutdown(wait=wait)
@@ -0,0 +1,321 @@
+import os
+from abc import ABC, abstractmethod
+
+import cv2
+from dotenv import load_dotenv
+
+from .metrics import span
+from .mp4_index import MP4IndexError, parse_video_track, scan_top_level_boxes
+
+try:
+    import av
+except ImportError:  # optional backend
+    av = None
+
+load_dotenv()
+
+# "opencv", "pyav", or "auto" (PyAV when installed, else OpenCV). PyAV is opt-in:
+# having `av` installed (e.g. for the benchmarks) does not change the decoder
+VIDEO_DECODER = os.getenv('VIDEO_DECODER', 'opencv')
+# Codec threads per decoder; 0 lets the backend pick (usually one per core)
+VIDEO_DECODE_THREADS = int(os.getenv('VIDEO_DECODE_THREADS', '0'))
+# Hardware decode: "true" asks OpenCV for any available accelerator; for PyAV
+# name the device type instead (e.g. "cuda", "vaapi", "qsv")
+VIDEO_HWACCEL = os.getenv('VIDEO_HWACCEL', '')
+# Sequential decode is cheaper than a seek when the next wanted frame is this close
+SEQUENTIAL_READ_GAP = int(os.getenv('SEQUENTIAL_READ_GAP', '32'))
+# Largest codec-level downscale (1/2**n) FFmpeg's lowres option offers
+MAX_LOWRES = 3
+
+
+def fit_size(width, height, max_size):
+    """(width, height) scaled so the longer side is at most `max_size`"""
+    if not max_size or max(width, height) <= max_size:
+        return width, height
+    ratio = max_size / max(width, height)
+    return max(1, int(width * ratio)), max(1, int(height * ratio))
+
+
+def uniform_frame_indices(total_frames, count=4):
+    """`count` evenly spaced frame indices"""
+    return [int(i * total_frames / count) for i in range(count)]
+
+
+def plan_segments(frame_count, fps, segment_seconds):
+    """Split [0, frame_count) into consecutive (start, end) frame ranges of about `segment_seconds`.
+
+    A short tail is folded into the last segment rather than left as a sliver.
+    """
+    segment_frames = max(1, int(round(segment_seconds * fps)))
+    starts = list(range(0, frame_count, segment_frames))
+    if len(starts) > 1 and frame_count - starts[-1] < segment_frames / 2:
+        starts.pop()
+    return [(start, starts[i + 1] if i + 1 < len(starts) else frame_count) for i, start in enumerate(starts)]
+
+
+def segment_frame_indices(start, end, count):
+    """`count` evenly spaced frame indices within [start, end)"""
+    return [start + index for index in uniform_frame_indices(end - start, count)]
+
+
+def mp4_sync_samples(video_path):
+    """Keyframe indices from a local MP4's sample table; None if every frame is one or it is not an MP4"""
+    try:
+        size = os.path.getsize(video_path)
+        with open(video_path, 'rb') as f:
+            def read(start, end):
+                f.seek(start)
+                return f.read(end - start + 1)
+
+            moov = next((box for box in scan_top_level_boxes(read, size) if box[0] == b'moov'), None)
+            if moov is None:
+                return None
+            _, offset, box_size, _ = moov
+            return parse_video_track(read(offset, offset + box_size - 1)).sync_samples
+    except (MP4IndexError, OSError, ValueError):
+        return None
+
+
+class VideoDecoder(ABC):
+    """Common interface of the decode backends.
+
+    Frames come back as BGR arrays, already fitted to `max_size` when one is
+    given. `read_frames` is frame-accurate and decodes forward instead of
+    seeking when wanted frames are close together; `iter_frames` is a
+    sequential pass over [start, end) that only converts every `stride`-th
+    frame; `keyframes` decodes keyframes only.
+    """
+
+    backend = None
+
+    def __init__(self, video_path, threads=None, max_size=None):
+        self.video_path = video_path
+        self.threads = VIDEO_DECODE_THREADS if threads is None else threads
+        self.max_size = max_size
+        self.fps = 30.0
+        self.frame_count = 0
+        self.width = 0
+        self.height = 0
+
+    @abstractmethod
+    def read_frames(self, indices):
+        """(index, frame) for each of `indices` that decodes, in ascending order"""
+
+    @abstractmethod
+    def iter_frames(self, stride=1, start=0, end=None):
+        """(index, frame) for every `stride`-th frame of [start, end)"""
+
+    @abstractmethod
+    def keyframes(self):
+        """(index, frame) for each keyframe"""
+
+    @abstractmethod
+    def close(self):
+        """Release the file and the codec"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _fit(self, frame):
+        width, height = fit_size(frame.shape[1], frame.shape[0], self.max_size)
+        if width == frame.shape[1]:
+            return frame
+        with span("resize", width=width, height=height):
+            return cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+
+
+class OpenCVDecoder(VideoDecoder):
+    """cv2.VideoCapture (FFmpeg backend) with thread-count and hardware-decode control"""
+
+    backend = 'opencv'
+
+    def __init__(self, video_path, threads=None, max_size=None):
+        super().__init__(video_path, threads, max_size)
+        params = [cv2.CAP_PROP_N_THREADS, self.threads]
+        if VIDEO_HWACCEL:
+            params += [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY]
+        self.cap = cv2.VideoCapture(video_path, cv2.CAP_FFMPEG, params)
+        if not self.cap.isOpened():
+            # Builds without the FFmpeg backend or open params
+            self.cap = cv2.VideoCapture(video_path)
+        if not self.cap.isOpened():
+            raise ValueError(f"Failed to open video file: {video_path}")
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self.frame_count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self._position = 0
+
+    def _seek(self, index):
+        if index == self._position:
+            return
+        if self._position < index <= self._position + SEQUENTIAL_READ_GAP:
+            # grab() decodes without the colour conversion; cheaper than a seek
+            while self._position < index and self.cap.grab():
+                self._position += 1
+            return
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+        self._position = index
+
+    def read_frames(self, indices):
+        for index in sorted(set(indices)):
+            self._seek(index)
+            ok, frame = self.cap.read()
+            if not ok:
+                continue
+            self._position = index + 1
+            yield index, self._fit(frame)
+
+    def iter_frames(self, stride=1, start=0, end=None):
+        self._seek(start)
+        index = start - 1
+        while (end is None or index + 1 < end) and self.cap.grab():
+            index += 1
+            self._position = index + 1
+            if index % stride:
+                continue
+            ok, frame = self.cap.retrieve()
+            if not ok:
+                break
+            yield index, self._fit(frame)
+
+    def keyframes(self):
+        # OpenCV cannot skip non-key frames itself; with the MP4 sample table
+        # each keyframe is one seek plus one decode
+        sync_samples = mp4_sync_samples(self.video_path)
+        if sync_samples is None:
+            yield from self.iter_frames()
+            return
+        yield from self.read_frames(sync_samples)
+
+    def close(self):
+        self.cap.release()
+
+
+class PyAVDecoder(VideoDecoder):
+    """PyAV (FFmpeg bindings): frame-accurate seeks, keyframe-only and reduced-resolution decode.
+
+    With `max_size`, codecs that support it (MPEG-4 part 2, H.263, MJPEG)
+    decode at 1/2, 1/4 or 1/8 resolution via the `lowres` option; the rest
+    are scaled by swscale in the same pass as the BGR conversion, so no
+    full-size BGR frame is ever built.
+    """
+
+    backend = 'pyav'
+
+    def __init__(self, video_path, threads=None, max_size=None):
+        if av is None:
+            raise ImportError("PyAV is not installed; pip install av or set VIDEO_DECODER=opencv")
+        super().__init__(video_path, threads, max_size)
+        options = {}
+        if VIDEO_HWACCEL and VIDEO_HWACCEL != 'true':
+            options['hwaccel'] = av.codec.hwaccel.HWAccel(device_type=VIDEO_HWACCEL, allow_software_fallback=True)
+        try:
+            self.container = av.open(video_path, **options)
+        except av.FFmpegError as e:
+            raise ValueError(f"Failed to open video file: {video_path}: {e}")
+        self.stream = self.container.streams.video[0]
+        self.stream.thread_type = 'AUTO'
+        if self.threads:
+            self.stream.thread_count = self.threads
+        codec = self.stream.codec_context
+        self.width, self.height = codec.width, codec.height
+        self.fps = float(self.stream.average_rate or self.stream.guessed_rate or 30.0)
+        self.frame_count = self.stream.frames or int(float(self.stream.duration * self.stream.time_base) * self.fps
+                                                     if self.stream.duration else 0)
+        self._apply_lowres()
+
+    def _apply_lowres(self):
+        if not self.max_size or max(self.width, self.height) <= self.max_size:
+            return
+        # FFmpeg clamps this to what the codec supports (0 for H.264/HEVC)
+        lowres = 0
+        while lowres < MAX_LOWRES and max(self.width, self.height) >> (lowres + 1) >= self.max_size:
+            lowres += 1
+        if lowres:
+            self.stream.codec_context.options = {'lowres': str(lowres)}
+
+    def _to_bgr(self, frame):
+        width, height = fit_size(frame.width, frame.height, self.max_size)
+        return frame.to_ndarray(format='bgr24', width=width, height=height)
+
+    def _index_of(self, frame):
+        if frame.time is None:
+            return None
+        start = float(self.stream.start_time * self.stream.time_base) if self.stream.start_time else 0.0
+        return int(round((frame.time - start) * self.fps))
+
+    def _seek_before(self, index):
+        # Seeks land on the keyframe at or before the target; callers decode forward from there
+        start = float(self.stream.start_time * self.stream.time_base) if self.stream.start_time else 0.0
+        pts = int((start + index / self.fps) / self.stream.time_base)
+        self.container.seek(pts, stream=self.stream, backward=True, any_frame=False)
+
+    def _decoded(self):
+        for packet in self.container.demux(self.stream):
+            for frame in packet.decode():
+                yield frame
+
+    def read_frames(self, indices):
+        wanted = sorted(set(indices))
+        position = None
+        position_index = -1
+        for target in wanted:
+            if position is None or not (position_index < target <= position_index + SEQUENTIAL_READ_GAP):
+                self._seek_before(target)
+                position = self._decoded()
+            for frame in position:
+                index = self._index_of(frame)
+                if index is None:
+                    continue
+                position_index = index
+                if index >= target:
+                    yield target, self._to_bgr(frame)
+                    break
+            else:
+                return
+
+    def iter_frames(self, stride=1, start=0, end=None):
+        self._seek_before(start)
+        for frame in self._decoded():
+            index = self._index_of(frame)
+            if index is None or index < start:
+                continue
+            if end is not None and index >= end:
+                return
+            if index % stride == 0:
+                yield index, self._to_bgr(frame)
+
+    def keyframes(self):
+        # The decoder drops every non-key frame before decoding it
+        self.stream.codec_context.skip_frame = 'NONKEY'
+        try:
+            self.container.seek(0, stream=self.stream)
+            for frame in self._decoded():
+                index = self._index_of(frame)
+                if index is not None:
+                    yield index, self._to_bgr(frame)
+        finally:
+            self.stream.codec_context.skip_frame = 'DEFAULT'
+
+    def close(self):
+        self.container.close()
+
+
+DECODERS = {
+    'opencv': OpenCVDecoder,
+    'pyav': PyAVDecoder,
+}
+
+
+def open_video(video_path, backend=None, threads=None, max_size=None):
+    """Decoder for `video_path` from the configured (or given) backend"""
+    backend = backend or VIDEO_DECODER
+    if backend == 'auto':
+        backend = 'pyav' if av is not None else 'opencv'
+    if backend not in DECODERS:
+        raise ValueError(f"Unknown video decoder: {backend}")
+    return DECODERS[backend](video_path, threads=threads, max_size=max_size)
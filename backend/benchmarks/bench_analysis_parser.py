@@ -0,0 +1,155 @@
+"""Throughput of the single-pass AnalysisParser against the previous line walk and keyword rescans.
+
+Run from the backend directory:
+    python -m benchmarks.bench_analysis_parser --analyses 5000
+
+Generates a corpus of synthetic comprehensive analyses in the format the
+summary prompt asks for, parses every one with both paths, checks that they
+agree on sections, keywords, services and severity, and reports analyses
+per second for each.
+"""
+import argparse
+import random
+import time
+
+from app.services.analysis_parser import DEFAULT_RULES, AnalysisParser
+
+HEADERS = [
+    "**Vehicle Details:**", "**Casualties and Trapped Persons:**", "**Hazard Assessment:**",
+    "**Environmental Conditions:**", "**Emergency Services Required:**",
+]
+BULLETS = [
+    "Two vehicles involved: a silver sedan and a pickup truck",
+    "Severe front-end damage to the sedan",
+    "Vehicles came to rest across both lanes after the collision",
+    "One occupant appears trapped in the driver's seat",
+    "Minor injuries visible on a passenger",
+    "No visible injuries",
+    "Light smoke rising from the engine compartment",
+    "Fuel leak under the pickup",
+    "Flames visible near the rear wheel",
+    "Wet road surface, light rain, daytime",
+    "Debris scattered across the intersection",
+    "Fire Department for fire suppression",
+    "Emergency Medical Services for the injured",
+    "Police for traffic control",
+    "Hydraulic rescue tools required:",
+]
+
+
+def make_analysis(rng):
+    lines = ["Here is the comprehensive incident analysis:", ""]
+    for header in HEADERS:
+        lines.append(header)
+        for bullet in rng.sample(BULLETS, rng.randint(2, 5)):
+            marker = rng.choice(["-", "*", "•", "  -"])
+            lines.append(f"{marker} {bullet}")
+        lines.append("")
+    return "\n".join(lines)
+
+
+# The terms legacy_parse checks; DEFAULT_RULES has since gained more word forms
+LEGACY_TERMS = {
+    "Fire Hazard": ("fire", "flames"),
+    "Smoke": ("smoke",),
+    "Trapped Occupants": ("trapped",),
+    "Injuries": ("injury", "injured"),
+    "Vehicle Collision": ("collision", "crash"),
+    "Fuel Leak": ("fuel", "leak"),
+}
+
+
+def legacy_parse(analysis_text):
+    """format_analysis_response + extract_keywords + generate_report's severity + get_recommended_services, as before"""
+    sections = {'vehicleDetails': [], 'casualties': [], 'hazards': [], 'environment': [], 'services': []}
+    current_section = None
+    for line in analysis_text.split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+        if "**Vehicle Details:**" in line:
+            current_section = 'vehicleDetails'
+            continue
+        elif "**Casualties and Trapped Persons:**" in line:
+            current_section = 'casualties'
+            continue
+        elif "**Hazard Assessment:**" in line:
+            current_section = 'hazards'
+            continue
+        elif "**Environmental Conditions:**" in line:
+            current_section = 'environment'
+            continue
+        elif "**Emergency Services Required:**" in line:
+            current_section = 'services'
+            continue
+        if current_section and (line.startswith('-') or line.startswith('*') or line.startswith('•')):
+            cleaned_line = line.lstrip('-*• ').strip()
+            if cleaned_line and not cleaned_line.endswith(':'):
+                sections[current_section].append(cleaned_line)
+
+    keywords = []
+    combined_text = analysis_text.lower()
+    if "fire" in combined_text or "flames" in combined_text:
+        keywords.append("Fire Hazard")
+    if "smoke" in combined_text:
+        keywords.append("Smoke")
+    if "trapped" in combined_text:
+        keywords.append("Trapped Occupants")
+    if "injury" in combined_text or "injured" in combined_text:
+        keywords.append("Injuries")
+    if "collision" in combined_text or "crash" in combined_text:
+        keywords.append("Vehicle Collision")
+    if "fuel" in combined_text or "leak" in combined_text:
+        keywords.append("Fuel Leak")
+    keywords = list(set(keywords))
+
+    severity = "HIGH" if any(k in ["Fire Hazard", "Trapped Occupants"] for k in keywords) else "MODERATE"
+    services = []
+    if "Fire Hazard" in keywords or "Smoke" in keywords:
+        services.append("Fire Department (URGENT)")
+    if "Injuries" in keywords or "Trapped Occupants" in keywords:
+        services.append("Emergency Medical Services")
+    if "Vehicle Collision" in keywords:
+        services.append("Police")
+    if "Fuel Leak" in keywords:
+        services.append("Hazmat Team")
+    return sections, keywords, services, severity
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--analyses', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    corpus = [make_analysis(rng) for _ in range(args.analyses)]
+    analysis_parser = AnalysisParser(rules=[rule._replace(terms=LEGACY_TERMS[rule.keyword]) for rule in DEFAULT_RULES])
+
+    mismatches = 0
+    for text in corpus:
+        sections, keywords, services, severity = legacy_parse(text)
+        parsed = analysis_parser.parse(text)
+        if (parsed.sections != sections or set(parsed.keywords) != set(keywords)
+                or parsed.services != services or parsed.severity != severity):
+            mismatches += 1
+
+    def best(parse):
+        times = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            for text in corpus:
+                parse(text)
+            times.append(time.perf_counter() - started)
+        return min(times)
+
+    legacy = best(legacy_parse)
+    single_pass = best(analysis_parser.parse)
+    print(f"{args.analyses} analyses, {sum(map(len, corpus)) / len(corpus):.0f} chars each, {mismatches} mismatches")
+    print(f"{'path':<14}{'analyses/s':>12}")
+    print(f"{'line walk':<14}{args.analyses / legacy:>12.0f}")
+    print(f"{'single pass':<14}{args.analyses / single_pass:>12.0f}")
+
+
+if __name__ == '__main__':
+    main()
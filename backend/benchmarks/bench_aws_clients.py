@@ -0,0 +1,103 @@
+"""App cold-start time and connection reuse of the shared AWS client registry.
+
+Run from the backend directory:
+    python -m benchmarks.bench_aws_clients --threads 20 --calls 400
+
+Cold start is the time to import app.main in a fresh interpreter. Connection
+reuse is measured against a local HTTP server standing in for S3, counting
+the TCP connections opened for concurrent HeadObject calls made through one
+shared client versus a new client per call (what ad-hoc boto3.client()
+calls amount to).
+"""
+import argparse
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BENCH_ENV = {
+    'AWS_ACCESS_KEY_ID': 'testing',
+    'AWS_SECRET_ACCESS_KEY': 'testing',
+    'AWS_REGION': 'us-west-2',
+    'AWS_BUCKET_NAME': 'bench-videos',
+    'AWS_ACCESS_KEY_ID1': 'testing',
+    'AWS_SECRET_ACCESS_KEY1': 'testing',
+    'AWS_REGION1': 'us-west-2',
+    'BEDROCK_MODEL_ID': 'bench',
+}
+for name, value in BENCH_ENV.items():
+    os.environ.setdefault(name, value)
+
+import boto3
+
+from app.services.aws_clients import get_client
+
+
+class FakeS3Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    connections = 0
+    lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with FakeS3Handler.lock:
+            FakeS3Handler.connections += 1
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header('ETag', '"bench"')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def cold_start(runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', 'import app.main'], check=True,
+                       env={**os.environ, 'VIDEO_JOB_DB': ':memory:'}, capture_output=True)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def hammer(make_client, threads, calls):
+    FakeS3Handler.connections = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(lambda _: make_client().head_object(Bucket='bench-videos', Key='k'), range(calls)))
+    return time.perf_counter() - start, FakeS3Handler.connections
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type=int, default=20)
+    parser.add_argument('--calls', type=int, default=400)
+    parser.add_argument('--cold-start-runs', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"cold start (import app.main): {cold_start(args.cold_start_runs) * 1000:.0f} ms")
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeS3Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ['AWS_ENDPOINT_URL_S3'] = f"http://127.0.0.1:{server.server_address[1]}"
+
+    def new_client():
+        return boto3.client('s3')
+
+    def shared_client():
+        return get_client('s3')
+
+    for label, factory in (('client per call', new_client), ('shared registry', shared_client)):
+        elapsed, connections = hammer(factory, args.threads, args.calls)
+        print(f"{label:<16}: {args.calls} calls in {elapsed:.2f}s, {connections} TCP connections")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
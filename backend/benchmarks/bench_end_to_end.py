@@ -0,0 +1,311 @@
+"""End-to-end throughput and latency of the API, offline, against local stand-ins for AWS.
+
+Run from the backend directory (needs `pip install moto`):
+    python -m benchmarks.bench_end_to_end --clips 640x360x10,1280x720x15 --concurrency 1,4
+    python -m benchmarks.bench_end_to_end --output before.json
+    python -m benchmarks.bench_end_to_end --baseline before.json --tolerance 0.25
+
+The FastAPI app is imported and driven in-process through httpx's ASGI
+transport, with S3 and DynamoDB served by moto and Bedrock replaced by
+FakeBedrockClient (`--latency` seconds per call, `--throttle-rate` of calls
+throttled at random, at most `--quota` calls per second). Synthetic clips
+are generated with OpenCV at each `--clips` WIDTHxHEIGHTxSECONDS.
+
+Each scenario sends `--requests` requests at a fixed concurrency (closed
+loop: every worker waits for its response before sending the next):
+/api/process-video once per clip and concurrency level, then a mix of
+/api/save-incident and /api/past-incidents. The result and frame caches
+are disabled unless `--warm`, so every request does the full work.
+
+Reports per scenario the throughput, p50/p95/p99 latency, statuses, the
+process CPU seconds and peak RSS; and per instrumented stage (the spans
+behind /metrics) how often it ran, its mean and p95 wall time and its
+CPU seconds. Moto runs in this process, so S3 and DynamoDB CPU counts
+under their spans and in the process total. With `--baseline`, scenarios
+whose throughput dropped or whose p95 rose by more than `--tolerance`
+are listed and the exit status is 1.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+WORK_DIR = tempfile.mkdtemp(prefix='bench-e2e-')
+
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+os.environ.setdefault('AWS_REGION', 'us-west-2')
+os.environ.setdefault('AWS_BUCKET_NAME', 'bench-videos')
+os.environ.setdefault('BEDROCK_MODEL_ID', 'us.meta.llama3-2-11b-instruct-v1:0')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+os.environ['VIDEO_JOB_DB'] = os.path.join(WORK_DIR, 'video_jobs.db')
+os.environ['INCIDENT_JOURNAL_PATH'] = os.path.join(WORK_DIR, 'incident_writes.journal')
+if '--warm' not in sys.argv:
+    # Nothing fits in a one-byte result cache, and no frame is within -1 bits of another
+    os.environ['RESULT_CACHE_MAX_BYTES'] = '1'
+    os.environ['FRAME_HASH_MAX_DISTANCE'] = '-1'
+
+import httpx
+from moto import mock_aws
+
+from app.utils.metrics import STAGE_CPU_SECONDS, STAGE_SECONDS
+from benchmarks.fakes import FakeBedrockClient, make_test_video
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def rss_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except OSError:
+        # Peak rather than current on platforms without /proc
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class MemorySampler:
+    """Peak resident memory of this process while the block runs, sampled every `interval` seconds"""
+
+    def __init__(self, interval=0.02):
+        self.interval = interval
+        self.start = self.peak = 0
+        self._stop = threading.Event()
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, rss_bytes())
+
+    def __enter__(self):
+        self.start = self.peak = rss_bytes()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, rss_bytes())
+
+
+def stage_snapshot():
+    """Per stage: [bucket counts..., +Inf count, sum of seconds] and CPU seconds"""
+    cpu = {key[0]: value for key, value in STAGE_CPU_SECONDS._snapshot()}
+    return {key[0]: (counts, cpu.get(key[0], 0.0)) for key, counts in STAGE_SECONDS._snapshot()}
+
+
+def stage_report(before, after):
+    """What each stage did between two snapshots: runs, mean and p95 wall seconds, CPU seconds"""
+    report = {}
+    for stage, (counts, cpu) in after.items():
+        previous, previous_cpu = before.get(stage, ([0] * len(counts), 0.0))
+        delta = [now - then for now, then in zip(counts, previous)]
+        runs = sum(delta[:-1])
+        if not runs:
+            continue
+        # p95 as the upper bound of the bucket holding the 95th percentile observation
+        cumulative, p95 = 0, float('inf')
+        for bound, count in zip(STAGE_SECONDS.buckets + (float('inf'),), delta[:-1]):
+            cumulative += count
+            if cumulative >= 0.95 * runs:
+                p95 = bound
+                break
+        report[stage] = {
+            "runs": runs,
+            "mean_seconds": delta[-1] / runs,
+            "p95_seconds": p95,
+            "cpu_seconds": cpu - previous_cpu,
+        }
+    return report
+
+
+def incident(i):
+    return {
+        "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "incidentReport": f"Benchmark incident {i}",
+        "selectedServices": ["police"],
+        "notes": "end-to-end benchmark",
+    }
+
+
+async def drive(client, build, requests, concurrency):
+    """Send `requests` requests built by `build(i)` from `concurrency` workers, one at a time each"""
+    latencies, statuses = [], defaultdict(int)
+    counter = iter(range(requests))
+
+    async def worker():
+        for i in counter:
+            method, path, body = build(i)
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body)
+                status = response.status_code
+            except httpx.HTTPError:
+                status = 'error'
+            latencies.append(time.perf_counter() - started)
+            statuses[status] += 1
+
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return latencies, dict(statuses)
+
+
+async def run_scenario(client, name, build, requests, concurrency):
+    before = stage_snapshot()
+    cpu_before = resource.getrusage(resource.RUSAGE_SELF)
+    started = time.perf_counter()
+    with MemorySampler() as memory:
+        latencies, statuses = await drive(client, build, requests, concurrency)
+    seconds = time.perf_counter() - started
+    cpu_after = resource.getrusage(resource.RUSAGE_SELF)
+    return {
+        "name": name,
+        "concurrency": concurrency,
+        "requests": requests,
+        "seconds": seconds,
+        "throughput": requests / seconds,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "statuses": {str(status): count for status, count in statuses.items()},
+        "cpu_seconds": (cpu_after.ru_utime + cpu_after.ru_stime) - (cpu_before.ru_utime + cpu_before.ru_stime),
+        "rss_start_mib": memory.start / 2 ** 20,
+        "rss_peak_mib": memory.peak / 2 ** 20,
+        "stages": stage_report(before, stage_snapshot()),
+    }
+
+
+def print_scenario(result):
+    print(f"\n{result['name']}  concurrency {result['concurrency']}, {result['requests']} requests")
+    print(f"  {result['throughput']:.2f} req/s  p50 {result['p50'] * 1000:.0f} ms  "
+          f"p95 {result['p95'] * 1000:.0f} ms  p99 {result['p99'] * 1000:.0f} ms  statuses {result['statuses']}")
+    print(f"  process CPU {result['cpu_seconds']:.2f} s  RSS {result['rss_start_mib']:.0f} -> "
+          f"peak {result['rss_peak_mib']:.0f} MiB")
+    print(f"  {'stage':<22}{'runs':>6}{'mean ms':>10}{'p95 bound':>11}{'CPU s':>9}")
+    for stage, stats in sorted(result["stages"].items(), key=lambda item: -item[1]["mean_seconds"] * item[1]["runs"]):
+        p95 = '>' + f"{STAGE_SECONDS.buckets[-1]:g}s" if stats["p95_seconds"] == float('inf') else \
+            f"{stats['p95_seconds'] * 1000:.0f}"
+        print(f"  {stage:<22}{stats['runs']:>6}{stats['mean_seconds'] * 1000:>10.1f}{p95:>11}"
+              f"{stats['cpu_seconds']:>9.2f}")
+
+
+def compare(results, baseline, tolerance):
+    """Scenarios that got slower than `baseline` by more than `tolerance`"""
+    previous = {(result["name"], result["concurrency"]): result for result in baseline}
+    regressions = []
+    for result in results:
+        old = previous.get((result["name"], result["concurrency"]))
+        if old is None:
+            continue
+        if result["throughput"] < old["throughput"] * (1 - tolerance):
+            regressions.append(f"{result['name']} x{result['concurrency']}: throughput "
+                               f"{old['throughput']:.2f} -> {result['throughput']:.2f} req/s")
+        if result["p95"] > old["p95"] * (1 + tolerance):
+            regressions.append(f"{result['name']} x{result['concurrency']}: p95 "
+                               f"{old['p95'] * 1000:.0f} -> {result['p95'] * 1000:.0f} ms")
+    return regressions
+
+
+def parse_clips(value):
+    return [tuple(int(part) for part in clip.split('x')) for clip in value.split(',')]
+
+
+async def run(args, main_module, keys):
+    results = []
+    transport = httpx.ASGITransport(app=main_module.app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=600) as client:
+        for label, key in keys:
+            for concurrency in args.concurrency:
+                build = lambda i, key=key: ('POST', '/api/process-video', {"videoKey": key})
+                results.append(await run_scenario(client, f"process-video {label}", build, args.requests, concurrency))
+                print_scenario(results[-1])
+
+        rng = random.Random(0)
+
+        def incidents(i):
+            if rng.random() < 0.5:
+                return 'POST', '/api/save-incident', incident(i)
+            return 'GET', '/api/past-incidents', None
+
+        concurrency = max(args.concurrency)
+        results.append(await run_scenario(client, "incidents save/list", incidents, args.incident_requests, concurrency))
+        print_scenario(results[-1])
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clips', type=parse_clips, default=parse_clips('640x360x10,1280x720x15,1920x1080x6'),
+                        help="comma-separated WIDTHxHEIGHTxSECONDS")
+    parser.add_argument('--concurrency', type=lambda value: [int(part) for part in value.split(',')],
+                        default=[1, 4], help="comma-separated concurrency levels")
+    parser.add_argument('--requests', type=int, default=8, help="process-video requests per scenario")
+    parser.add_argument('--incident-requests', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.3, help="seconds per fake Bedrock call")
+    parser.add_argument('--throttle-rate', type=float, default=0.02)
+    parser.add_argument('--quota', type=int, default=0, help="Bedrock calls accepted per second, 0 for no quota")
+    parser.add_argument('--warm', action='store_true', help="keep the result and frame caches on")
+    parser.add_argument('--output', help="write the results as JSON, for a later --baseline")
+    parser.add_argument('--baseline', help="results JSON of an earlier run to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+
+    with mock_aws():
+        from app import main as main_module
+
+        s3 = main_module.s3_service
+        s3.client.create_bucket(Bucket=s3.bucket_name, CreateBucketConfiguration={'LocationConstraint': s3.region})
+        main_module.dynamodb_service.ensure_table()
+        main_module.analysis_service.bedrock_client = FakeBedrockClient(
+            latency=args.latency, throttle_rate=args.throttle_rate,
+            quota=(args.quota, 1.0) if args.quota else None
+        )
+
+        keys = []
+        for width, height, seconds in args.clips:
+            path = make_test_video(width, height, seconds, event_at=seconds / 2)
+            key = f"videos/bench_{width}x{height}_{seconds}s.mp4"
+            s3.client.upload_file(path, s3.bucket_name, key)
+            # Sizes stay out of the scenario names, which match runs against a baseline
+            print(f"{key}: {os.path.getsize(path) / 2 ** 20:.1f} MiB")
+            keys.append((f"{width}x{height} {seconds}s", key))
+            os.unlink(path)
+
+        # The ASGI transport does not run the app's startup and shutdown hooks
+        main_module.video_job_service.start()
+        main_module.dynamodb_service.start()
+        print(f"Fake Bedrock: {args.latency}s per call, {args.throttle_rate:.0%} throttled"
+              f"{f', quota {args.quota}/s' if args.quota else ''}; caches {'on' if args.warm else 'off'}")
+        try:
+            results = asyncio.run(run(args, main_module, keys))
+        finally:
+            main_module.dynamodb_service.close()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, default=str)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        print(f"\nAgainst {args.baseline} (tolerance {args.tolerance:.0%}): "
+              f"{len(regressions)} regression{'s' if len(regressions) != 1 else ''}")
+        for line in regressions:
+            print(f"  {line}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
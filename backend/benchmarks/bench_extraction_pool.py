@@ -0,0 +1,73 @@
+"""Concurrent frame extraction: in-process threads vs the shared-memory process pool.
+
+Run from the backend directory:
+    python -m benchmarks.bench_extraction_pool --videos 8 --sampling adaptive
+
+Extracts frames from `--videos` clips at once with 1, 2, 4 ... up to the
+core count workers, and reports videos per second for each mode. Adaptive
+sampling decodes every frame, so it shows the CPU-bound case best; the
+process pool should scale with cores where threads stay bound by the
+Python-side work under the GIL.
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.services.analysis_service import AnalysisService
+from app.utils.shared_frames import ProcessExtractionPool
+from benchmarks.fakes import make_test_video
+
+
+def worker_counts():
+    counts, n = [], 1
+    while n < (os.cpu_count() or 1):
+        counts.append(n)
+        n *= 2
+    return counts + [os.cpu_count() or 1]
+
+
+def run_threads(service, paths, workers):
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        start = time.perf_counter()
+        list(pool.map(service.extract_accident_frames, paths))
+        return time.perf_counter() - start
+
+
+def run_processes(service, paths, workers):
+    pool = ProcessExtractionPool(max_workers=workers, max_queue=len(paths))
+    try:
+        with ThreadPoolExecutor(max_workers=len(paths)) as callers:
+            # Start the workers (spawn + imports) before timing
+            list(callers.map(lambda p: service.extract_frames_in_process(p, pool, block=True), paths[:workers]))
+            start = time.perf_counter()
+            list(callers.map(lambda p: service.extract_frames_in_process(p, pool, block=True), paths))
+            return time.perf_counter() - start
+    finally:
+        pool.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--videos', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--sampling', choices=['uniform', 'adaptive'], default='adaptive')
+    args = parser.parse_args()
+
+    service = AnalysisService(bedrock_client=object())
+    service.sampling_mode = args.sampling
+    paths = [make_test_video(1280, 720, args.seconds, event_at=args.seconds / 2) for _ in range(args.videos)]
+    try:
+        print(f"{os.cpu_count()} cores, {args.videos} x 1280x720 {args.seconds:.0f}s clips, {args.sampling} sampling")
+        print(f"{'workers':>8}{'threads videos/s':>18}{'processes videos/s':>20}")
+        for workers in worker_counts():
+            threads = run_threads(service, paths, workers)
+            processes = run_processes(service, paths, workers)
+            print(f"{workers:>8}{args.videos / threads:>18.2f}{args.videos / processes:>20.2f}")
+    finally:
+        for path in paths:
+            os.unlink(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+"""Wall-clock time and converse calls of AnalysisService.process_video per frame analysis mode.
+
+Run from the backend directory:
+    python -m benchmarks.bench_frame_analysis --latency 0.5
+"""
+import argparse
+import os
+import time
+
+from app.services.analysis_service import AnalysisService
+from benchmarks.fakes import FakeBedrockClient, make_test_video
+
+
+def run(mode, video_path, latency):
+    client = FakeBedrockClient(latency=latency)
+    service = AnalysisService(bedrock_client=client)
+    service.analysis_mode = mode
+
+    start = time.perf_counter()
+    service.process_video(video_path)
+    elapsed = time.perf_counter() - start
+    return elapsed, client.calls
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--latency', type=float, default=0.5, help="stub converse latency in seconds")
+    args = parser.parse_args()
+
+    video_path = make_test_video()
+    try:
+        for mode in ('sequential', 'concurrent', 'batched'):
+            elapsed, calls = run(mode, video_path, args.latency)
+            print(f"{mode:>10}: {elapsed:6.2f}s wall clock, {calls} converse calls")
+    finally:
+        os.unlink(video_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""CPU time and peak memory per frame: old encode->base64->decode->re-encode path vs ExtractedFrame.
+
+Run from the backend directory:
+    python -m benchmarks.bench_frame_encoding --iterations 20
+
+Peak memory is measured with tracemalloc, which sees NumPy buffers and
+Python objects but not OpenCV's internal scratch allocations.
+"""
+import argparse
+import base64
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from app.models.frame import ExtractedFrame
+from app.services.analysis_service import AnalysisService
+
+RESOLUTIONS = {'1080p': (1920, 1080), '4K': (3840, 2160)}
+
+
+def old_path(service, frame):
+    # extract_accident_frames
+    resized = service.resize_image(frame)
+    _, buffer = cv2.imencode('.jpg', resized, [cv2.IMWRITE_JPEG_QUALITY, 85])
+    image = base64.b64encode(buffer).decode('utf-8')
+    # process_video
+    decoded = cv2.imdecode(np.frombuffer(base64.b64decode(image), np.uint8), cv2.IMREAD_COLOR)
+    # analyze_with_bedrock
+    _, buffer = cv2.imencode('.jpg', service.resize_image(decoded), [cv2.IMWRITE_JPEG_QUALITY, 85])
+    bedrock_bytes = buffer.tobytes()
+    return image, bedrock_bytes
+
+
+def new_path(service, frame):
+    extracted = ExtractedFrame(1, "00:00", service.resize_image(frame))
+    bedrock_bytes = extracted.jpeg_bytes
+    image = extracted.to_dict()["image"]
+    return image, bedrock_bytes
+
+
+def measure(path, service, frame, iterations):
+    tracemalloc.start()
+    start = time.process_time()
+    for _ in range(iterations):
+        path(service, frame)
+    cpu = (time.process_time() - start) / iterations
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return cpu, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--iterations', type=int, default=20)
+    args = parser.parse_args()
+
+    service = AnalysisService(bedrock_client=object())
+    rng = np.random.default_rng(0)
+    print(f"{'resolution':<12}{'path':<6}{'cpu ms/frame':>14}{'peak MiB':>10}")
+    for name, (width, height) in RESOLUTIONS.items():
+        # Smooth gradient plus noise so JPEG sizes resemble camera footage
+        gradient = np.linspace(0, 255, width, dtype=np.uint8)[None, :, None]
+        frame = np.clip(gradient + rng.integers(0, 32, (height, width, 3)), 0, 255).astype(np.uint8)
+        for label, path in (('old', old_path), ('new', new_path)):
+            cpu, peak = measure(path, service, frame, args.iterations)
+            print(f"{name:<12}{label:<6}{cpu * 1000:>14.2f}{peak / 2**20:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
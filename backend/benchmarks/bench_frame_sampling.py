@@ -0,0 +1,48 @@
+"""Seek-based uniform sampling vs the one-pass adaptive sampler.
+
+Run from the backend directory:
+    python -m benchmarks.bench_frame_sampling
+
+Reports decode wall time, frames selected per second of video, and whether
+a frame within one second of the synthetic "crash" was picked.
+"""
+import os
+import time
+
+import cv2
+
+from app.services.analysis_service import AnalysisService
+from benchmarks.fakes import make_test_video
+
+# (width, height, seconds, event second)
+CLIPS = [(1280, 720, 20, 13.3), (640, 360, 120, 71.0)]
+
+
+def run(service, mode, video_path):
+    service.sampling_mode = mode
+    start = time.perf_counter()
+    frames = service.extract_accident_frames(video_path)
+    return frames, time.perf_counter() - start
+
+
+def main():
+    service = AnalysisService(bedrock_client=object())
+    print(f"{'clip':<16}{'mode':<10}{'decode s':>10}{'frames':>8}{'frames/video s':>16}{'caught event':>14}")
+    for width, height, seconds, event_at in CLIPS:
+        video_path = make_test_video(width, height, seconds, event_at=event_at)
+        cap = cv2.VideoCapture(video_path)
+        duration = cap.get(cv2.CAP_PROP_FRAME_COUNT) / cap.get(cv2.CAP_PROP_FPS)
+        cap.release()
+        try:
+            for mode in ('uniform', 'adaptive'):
+                frames, elapsed = run(service, mode, video_path)
+                times = [int(f.timestamp[:2]) * 60 + int(f.timestamp[3:]) for f in frames]
+                caught = any(abs(t - event_at) <= 1 for t in times)
+                print(f"{width}x{height} {seconds}s".ljust(16) + f"{mode:<10}{elapsed:>10.2f}"
+                      f"{len(frames):>8}{len(frames) / duration:>16.3f}{str(caught):>14}")
+        finally:
+            os.unlink(video_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""Full-scan past-incidents listing vs one page from the timeline index, as the table grows.
+
+Run from the backend directory against moto (default):
+    python -m benchmarks.bench_incident_queries --sizes 500 2000 8000
+or against DynamoDB Local:
+    python -m benchmarks.bench_incident_queries --endpoint http://localhost:8000
+
+For each table size it reports latency and items read per request for the
+scan path (get_all_incidents) and the first page of query_incidents, then
+walks every page to check ordering, that no incident is returned twice, and
+that filtered pages only contain matching incidents. moto evaluates a Query
+over the whole partition in Python, so with moto only "items read" is
+meaningful; use DynamoDB Local or a real table for latency.
+"""
+import argparse
+import os
+import random
+import time
+import uuid
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+
+BENCH_ENV = {
+    'AWS_ACCESS_KEY_ID': 'testing',
+    'AWS_SECRET_ACCESS_KEY': 'testing',
+    'AWS_REGION': 'us-west-2',
+}
+for name, value in BENCH_ENV.items():
+    os.environ.setdefault(name, value)
+
+from app.services.dynamodb_service import DynamoDBService
+
+HAZARDS = ['Fire visible under the hood', 'No hazards observed', 'Driver trapped in vehicle', 'Fuel leak on road']
+
+
+def make_incident(when):
+    hazard = random.choice(HAZARDS)
+    return {
+        'timestamp': when.isoformat() + 'Z',
+        'incidentReport': {'analysis': {'hazards': [hazard], 'vehicleDetails': ['Two sedans']}},
+        'selectedServices': {
+            'police': True,
+            'ambulance': random.random() < 0.5,
+            'fire': 'Fire' in hazard,
+        },
+        'notes': random.choice(['', 'caller on scene', 'highway exit 12']),
+    }
+
+
+def populate(service, count, start):
+    months = set()
+    with service.table.batch_writer() as batch:
+        for i in range(count):
+            item = make_incident(start + timedelta(seconds=i))
+            record = {
+                'incident_id': str(uuid.uuid4()),
+                'timestamp': item['timestamp'],
+                'incident_report': item['incidentReport'],
+                'selected_services': item['selectedServices'],
+                'notes': item['notes'],
+                'created_at': item['timestamp'],
+            }
+            record.update(service.index_attributes(record))
+            months.add(record['timestamp'][:7])
+            batch.put_item(Item=record)
+    # save_incident does this for every save
+    service.record_months(months)
+
+
+class CountingDynamoDBService(DynamoDBService):
+    """Sums ScannedCount across the scan/query calls made through `table`"""
+
+    items_read = 0
+
+    @property
+    def table(self):
+        service, table = self, super().table
+
+        class CountingTable:
+            def __getattr__(self, name):
+                return getattr(table, name)
+
+            def scan(self, **kwargs):
+                return service._counted(table.scan, **kwargs)
+
+            def query(self, **kwargs):
+                return service._counted(table.query, **kwargs)
+
+        return CountingTable()
+
+    def _counted(self, method, **kwargs):
+        response = method(**kwargs)
+        self.items_read += response.get('ScannedCount', 0)
+        return response
+
+
+def measure(service, func):
+    service.items_read = 0
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start, service.items_read
+
+
+def walk_pages(dynamodb_service, **filters):
+    seen, timestamps, pages, token = set(), [], 0, None
+    while True:
+        items, token = dynamodb_service.query_incidents(limit=100, page_token=token, **filters)
+        pages += 1
+        for item in items:
+            assert item['incident_id'] not in seen, "incident returned twice"
+            seen.add(item['incident_id'])
+            timestamps.append(item['timestamp'])
+            if filters.get('severity'):
+                assert item['severity'] == filters['severity']
+            if filters.get('service'):
+                assert item['selected_services'][filters['service']]
+        if token is None:
+            break
+    assert timestamps == sorted(timestamps, reverse=True), "pages out of order"
+    return len(seen), pages
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[500, 2000, 8000])
+    parser.add_argument('--endpoint', help="DynamoDB Local URL; moto is used when omitted")
+    args = parser.parse_args()
+
+    if args.endpoint:
+        os.environ['AWS_ENDPOINT_URL_DYNAMODB'] = args.endpoint
+        context = nullcontext()
+    else:
+        from moto import mock_aws
+        context = mock_aws()
+
+    with context:
+        service = CountingDynamoDBService()
+        service.table_name = f"BenchIncidents-{uuid.uuid4().hex[:8]}"
+        service.ensure_table()
+        try:
+            print(f"{'rows':>8}{'scan ms':>10}{'scan read':>11}{'page ms':>10}{'page read':>11}"
+                  f"{'HIGH pages':>12}{'fire rows':>11}")
+            total = 0
+            start = datetime(2024, 1, 1)
+            for size in args.sizes:
+                populate(service, size - total, start + timedelta(seconds=total))
+                total = size
+                _, scan_seconds, scan_read = measure(service, service.get_all_incidents)
+                _, page_seconds, page_read = measure(service, lambda: service.query_incidents(limit=50))
+                count, _ = walk_pages(service)
+                assert count == total, f"paged {count} of {total} incidents"
+                _, high_pages = walk_pages(service, severity='HIGH')
+                fire_rows, _ = walk_pages(service, service='fire')
+                print(f"{total:>8}{scan_seconds * 1000:>10.0f}{scan_read:>11}{page_seconds * 1000:>10.1f}"
+                      f"{page_read:>11}{high_pages:>12}{fire_rows:>11}")
+        finally:
+            service.table.delete()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+"""Save throughput and acknowledgement latency: direct put_item vs the write-behind buffer.
+
+Run from the backend directory against moto (default):
+    python -m benchmarks.bench_incident_writes --saves 5000 --threads 32
+or against DynamoDB Local:
+    python -m benchmarks.bench_incident_writes --endpoint http://localhost:8000
+
+Also checks the two failure paths: a child process is killed right after
+its saves are acknowledged and a fresh writer must replay them all from the
+journal, and a table that leaves half of every batch unprocessed must still
+end up with every incident.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+BENCH_ENV = {
+    'AWS_ACCESS_KEY_ID': 'testing',
+    'AWS_SECRET_ACCESS_KEY': 'testing',
+    'AWS_REGION': 'us-west-2',
+}
+for name, value in BENCH_ENV.items():
+    os.environ.setdefault(name, value)
+
+from boto3.dynamodb.conditions import Attr
+
+from app.services.dynamodb_service import TIMELINE_RANGE_ID, DynamoDBService
+from app.services.incident_writer import IncidentJournal, WriteBehindBuffer
+
+
+def incident(i):
+    return {
+        'timestamp': f"2024-01-01T00:00:{i % 60:02d}.{i:06d}Z",
+        'incidentReport': {'analysis': {'hazards': ['Fuel leak on road']}},
+        'selectedServices': {'police': True, 'ambulance': False, 'fire': False},
+        'notes': f"save {i}",
+    }
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def count_items(service):
+    # The timeline range item is not an incident
+    total, kwargs = 0, {'Select': 'COUNT', 'FilterExpression': Attr('incident_id').ne(TIMELINE_RANGE_ID)}
+    while True:
+        response = service.table.scan(**kwargs)
+        total += response['Count']
+        if 'LastEvaluatedKey' not in response:
+            return total
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def run(mode, saves, threads, journal_dir):
+    service = DynamoDBService()
+    service.table_name = f"BenchIncidents-{uuid.uuid4().hex[:8]}"
+    service.write_mode = mode
+    service.ensure_table()
+    service._writer = WriteBehindBuffer(service.dynamodb, service.table_name,
+                                        journal=IncidentJournal(os.path.join(journal_dir, f"{mode}.journal")))
+    service.start()
+
+    latencies = []
+
+    def save(i):
+        start = time.perf_counter()
+        service.save_incident(incident(i))
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(save, range(saves)))
+    acked = time.perf_counter() - start
+    service.close()
+    drained = time.perf_counter() - start
+    stored = count_items(service)
+    service.table.delete()
+    return acked, drained, latencies, stored
+
+
+CRASH_CHILD = """
+import os, sys
+from app.services.dynamodb_service import DynamoDBService
+from app.services.incident_writer import IncidentJournal, WriteBehindBuffer
+from benchmarks.bench_incident_writes import incident
+
+class NeverWrites:
+    def batch_write_item(self, RequestItems):
+        raise SystemExit  # the writer thread dies; saves are still acknowledged
+
+service = DynamoDBService()
+service._writer = WriteBehindBuffer(NeverWrites(), service.table_name, journal=IncidentJournal(sys.argv[1]))
+for i in range(int(sys.argv[2])):
+    service.save_incident(incident(i))
+os._exit(9)
+"""
+
+
+def crash_replay(journal_dir, saves):
+    journal_path = os.path.join(journal_dir, 'crash.journal')
+    subprocess.run([sys.executable, '-c', CRASH_CHILD, journal_path, str(saves)], env=os.environ)
+
+    service = DynamoDBService()
+    service.table_name = f"BenchIncidents-{uuid.uuid4().hex[:8]}"
+    service.ensure_table()
+    service._writer = WriteBehindBuffer(service.dynamodb, service.table_name, journal=IncidentJournal(journal_path))
+    service.start()
+    service.close()
+    stored = count_items(service)
+    service.table.delete()
+    return stored
+
+
+class HalfUnprocessed:
+    """Leaves every other item of each batch unprocessed, like a throttled table"""
+
+    def __init__(self, dynamodb):
+        self.dynamodb = dynamodb
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    def batch_write_item(self, RequestItems):
+        with self.lock:
+            self.calls += 1
+        (table_name, requests), = RequestItems.items()
+        accepted, rejected = requests[::2], requests[1::2]
+        self.dynamodb.batch_write_item(RequestItems={table_name: accepted})
+        return {'UnprocessedItems': {table_name: rejected} if rejected else {}}
+
+
+def throttled(journal_dir, saves):
+    service = DynamoDBService()
+    service.table_name = f"BenchIncidents-{uuid.uuid4().hex[:8]}"
+    service.ensure_table()
+    fake = HalfUnprocessed(service.dynamodb)
+    service._writer = WriteBehindBuffer(fake, service.table_name,
+                                        journal=IncidentJournal(os.path.join(journal_dir, 'throttled.journal')))
+    service.start()
+    for i in range(saves):
+        service.save_incident(incident(i))
+    service.close()
+    stored = count_items(service)
+    service.table.delete()
+    return stored, fake.calls, service.writer.stats['unprocessed_retries']
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--saves', type=int, default=5000)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--endpoint', help="DynamoDB Local URL; moto is used when omitted")
+    args = parser.parse_args()
+
+    if args.endpoint:
+        os.environ['AWS_ENDPOINT_URL_DYNAMODB'] = args.endpoint
+        context = nullcontext()
+    else:
+        from moto import mock_aws
+        context = mock_aws()
+
+    with context, tempfile.TemporaryDirectory() as journal_dir:
+        print(f"{'mode':<10}{'acked/s':>10}{'p50 ms':>9}{'p99 ms':>9}{'drained s':>11}{'stored':>8}")
+        for mode in ('direct', 'buffered'):
+            acked, drained, latencies, stored = run(mode, args.saves, args.threads, journal_dir)
+            print(f"{mode:<10}{args.saves / acked:>10.0f}{percentile(latencies, 0.5) * 1000:>9.2f}"
+                  f"{percentile(latencies, 0.99) * 1000:>9.2f}{drained:>11.2f}{stored:>8}")
+
+        stored = crash_replay(journal_dir, 500)
+        print(f"killed after 500 acknowledged saves: {stored} replayed from the journal")
+        stored, calls, retries = throttled(journal_dir, 500)
+        print(f"half of each batch unprocessed: {stored}/500 stored in {calls} batch calls ({retries} retries)")
+
+
+if __name__ == '__main__':
+    main()
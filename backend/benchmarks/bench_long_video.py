@@ -0,0 +1,57 @@
+"""Long-video analysis: segments one after another vs in parallel.
+
+Run from the backend directory:
+    python -m benchmarks.bench_long_video --minutes 10 --latency 1.0
+
+Builds a synthetic clip of `--minutes`, splits it into SEGMENT_SECONDS
+segments and runs the full segmented analysis (decode, sampling, per-frame
+calls, timeline summary) against a fake Bedrock with `--latency` seconds per
+call, first with one segment at a time and then with SEGMENT_WORKERS
+segments in flight. With enough workers and Bedrock concurrency the
+parallel wall time approaches one segment's time plus the summary call.
+"""
+import argparse
+import os
+import time
+
+from app.services import analysis_service
+from app.services.analysis_service import SEGMENT_FRAMES, SEGMENT_SECONDS, AnalysisService
+from benchmarks.fakes import FakeBedrockClient, make_test_video
+
+
+def run(path, latency, sampling, workers):
+    analysis_service.SEGMENT_WORKERS = workers
+    client = FakeBedrockClient(latency=latency)
+    # Fresh service per run so no frame descriptions are reused between runs
+    service = AnalysisService(bedrock_client=client)
+    service.sampling_mode = sampling
+    service.analysis_mode = 'concurrent'
+    segments = service.video_segments(*service.probe_video(path))
+    start = time.perf_counter()
+    result = service.analyze_long_video(path, segments)
+    return time.perf_counter() - start, len(segments), len(result["frames"]), client.calls
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--minutes', type=float, default=10)
+    parser.add_argument('--latency', type=float, default=1.0)
+    parser.add_argument('--sampling', choices=['uniform', 'adaptive'], default='uniform')
+    parser.add_argument('--workers', type=int, default=analysis_service.SEGMENT_WORKERS)
+    args = parser.parse_args()
+
+    # Low frame rate and size keep the synthetic clip quick to write
+    path = make_test_video(640, 360, args.minutes * 60, fps=10, event_at=args.minutes * 30)
+    try:
+        print(f"{os.cpu_count()} cores, {args.minutes:g} min clip, {SEGMENT_SECONDS:g}s segments x "
+              f"{SEGMENT_FRAMES} frames, {args.sampling} sampling, {args.latency}s per Bedrock call")
+        print(f"{'mode':>10}{'segments':>10}{'frames':>8}{'calls':>7}{'seconds':>9}")
+        for label, workers in (('serial', 1), ('parallel', args.workers)):
+            seconds, segments, frames, calls = run(path, args.latency, args.sampling, workers)
+            print(f"{label:>10}{segments:>10}{frames:>8}{calls:>7}{seconds:>9.2f}")
+    finally:
+        os.unlink(path)
+
+
+if __name__ == '__main__':
+    main()
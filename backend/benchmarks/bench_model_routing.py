@@ -0,0 +1,128 @@
+"""Per-video latency, model cost and hazard recall: large models only vs tiered routing.
+
+Run from the backend directory:
+    python -m benchmarks.bench_model_routing --videos 40
+
+Builds a corpus of sampled frame sets from synthetic clips: calm scenes,
+scenes where a fire breaks out, and scenes with a dark or motion-blurred
+frame. Each video is analyzed twice against a fake Bedrock whose models
+answer at different speeds (`MODEL_LATENCY`) and that reports flames only
+for frames that actually show them: once with MODEL_ROUTING=off (every
+frame and summary on the large models) and once tiered. Reports median and
+p95 per-video latency, estimated cost at `PRICES`, calls per model, and
+whether tiered routing found the same hazards.
+"""
+import argparse
+import random
+import statistics
+import time
+
+import cv2
+import numpy as np
+
+from app.models.frame import ExtractedFrame
+from app.services.analysis_service import AnalysisService
+from app.services.cache_service import FrameHashIndex
+from app.services.model_router import ModelRouter
+from app.utils.frame_triage import FrameTriage
+from benchmarks.fakes import FakeBedrockClient, make_test_video
+
+# Seconds per call of each model in the default tiers
+MODEL_LATENCY = {
+    "us.meta.llama3-2-90b-instruct-v1:0": 2.0,
+    "us.meta.llama3-2-11b-instruct-v1:0": 1.0,
+    "us.amazon.nova-lite-v1:0": 0.4,
+    "us.meta.llama3-2-3b-instruct-v1:0": 0.4,
+}
+# On-demand $ per 1k (input, output) tokens; list prices at the time of writing, for comparison only
+PRICES = {
+    "us.meta.llama3-2-90b-instruct-v1:0": (0.00072, 0.00072),
+    "us.meta.llama3-2-11b-instruct-v1:0": (0.00016, 0.00016),
+    "us.amazon.nova-lite-v1:0": (0.00006, 0.00024),
+    "us.meta.llama3-2-3b-instruct-v1:0": (0.00015, 0.00015),
+}
+SUMMARY = """**Vehicle Details:**
+- Two vehicles stopped across the lane
+
+**Hazard Assessment:**
+- {hazards}
+"""
+
+
+def responder(model_id, messages):
+    """Describe what a frame shows; flames only where the frame is mostly fire-coloured"""
+    content = messages[-1]["content"]
+    images = [block["image"]["source"]["bytes"] for block in content if "image" in block]
+    if not images:
+        prompt = content[-1]["text"]
+        hazards = "Flames near the sedan" if "flames" in prompt.lower() else "No fire or smoke"
+        return SUMMARY.format(hazards=hazards)
+    frame = cv2.imdecode(np.frombuffer(images[0], np.uint8), cv2.IMREAD_COLOR)
+    if FrameTriage._hot_fraction(FrameTriage._thumbnail(frame)) > 0.1:
+        return "Two vehicles collided. Flames and smoke are rising from the sedan."
+    return "Two vehicles stopped on the road. No fire or smoke visible."
+
+
+def make_corpus(videos, rng):
+    """[(scenario, [frame arrays])] built from the frames a service samples from synthetic clips"""
+    sampler = AnalysisService(bedrock_client=FakeBedrockClient())
+    clips = {}
+    for scenario, event_at in (('calm', None), ('fire', 5)):
+        path = make_test_video(640, 360, 10, fps=10, event_at=event_at)
+        clips[scenario] = [frame.array for frame in sampler.extract_accident_frames(path)]
+    corpus = []
+    for _ in range(videos):
+        scenario = rng.choice(['calm', 'calm', 'fire', 'dark', 'blurry'])
+        frames = [array.copy() for array in clips['fire' if scenario == 'fire' else 'calm']]
+        damaged = rng.randrange(1, len(frames))
+        if scenario == 'dark':
+            frames[damaged] = (frames[damaged] * 0.05).astype(np.uint8)
+        elif scenario == 'blurry':
+            frames[damaged] = cv2.GaussianBlur(frames[damaged], (0, 0), 12)
+        corpus.append((scenario, frames))
+    return corpus
+
+
+def run(corpus, mode):
+    client = FakeBedrockClient(model_latency=MODEL_LATENCY, responder=responder)
+    service = AnalysisService(bedrock_client=client)
+    service.router = ModelRouter(mode=mode)
+    service.analysis_mode = 'concurrent'
+    latencies, hazards = [], []
+    for _, arrays in corpus:
+        # A fresh index per video, so no description is reused from the previous one
+        service.frame_index = FrameHashIndex()
+        frames = [ExtractedFrame(i + 1, f"00:{i * 3:02d}", array) for i, array in enumerate(arrays)]
+        started = time.perf_counter()
+        result = service.analyze_video_frames(frames)
+        latencies.append(time.perf_counter() - started)
+        hazards.append(set(result["timeline"]["first_seen"]))
+    cost = sum(
+        input_tokens / 1000 * PRICES[model][0] + output_tokens / 1000 * PRICES[model][1]
+        for model, (input_tokens, output_tokens) in client.tokens_by_model.items()
+    )
+    return latencies, cost, client.calls_by_model, hazards
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--videos', type=int, default=40)
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.videos, random.Random(3))
+    print(f"{args.videos} videos x {len(corpus[0][1])} frames, "
+          f"scenarios: {', '.join(sorted({scenario for scenario, _ in corpus}))}")
+    print(f"{'routing':<8}{'p50 s':>8}{'p95 s':>8}{'cost $':>10}  calls per model")
+    results = {}
+    for mode in ('off', 'tiered'):
+        latencies, cost, calls, hazards = run(corpus, mode)
+        results[mode] = hazards
+        p95 = sorted(latencies)[int(0.95 * (len(latencies) - 1))]
+        calls_text = ", ".join(f"{model.split('.')[-1]}={count}" for model, count in sorted(calls.items()))
+        print(f"{mode:<8}{statistics.median(latencies):>8.2f}{p95:>8.2f}{cost:>10.4f}  {calls_text}")
+    missed = sum(1 for off, tiered in zip(results['off'], results['tiered']) if off - tiered)
+    print(f"videos where tiered routing missed a hazard the large model found: {missed}")
+
+
+if __name__ == '__main__':
+    main()
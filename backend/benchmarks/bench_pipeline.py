@@ -0,0 +1,103 @@
+"""End-to-end latency of process_video: steps one after another vs pipelined stages, against moto's S3.
+
+Run from the backend directory (needs `pip install moto`):
+    python -m benchmarks.bench_pipeline --bandwidth 4 --latency 1.0
+
+The S3 service is slowed to `--bandwidth` MB/s plus `--request-ms` per
+request, so the download takes about as long as the model calls, and a fake
+Bedrock answers in `--latency` seconds. Each clip is processed with
+PIPELINE_MODE off (download, then decode, then analyze, then summarize)
+and on (frames decoded and analyzed as their byte ranges land), for each
+frame analysis mode. Reports the end-to-end seconds, the sum of the stage
+times (the summary counts under analyze when not pipelined), the slowest
+stage, and whether both runs described the same frames.
+"""
+import argparse
+import os
+import time
+
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+os.environ.setdefault('AWS_REGION', 'us-west-2')
+os.environ.setdefault('AWS_BUCKET_NAME', 'bench-videos')
+
+from moto import mock_aws
+
+from app.services import analysis_service as analysis_module
+from app.services.analysis_service import AnalysisService
+from app.services.cache_service import ResultCache
+from app.services.s3_service import S3Service
+from app.services.video_service import JobStore, VideoJobService
+from benchmarks.fakes import FakeBedrockClient, make_test_video
+
+CLIPS = [(1280, 720, 30), (640, 360, 60)]
+
+
+class SlowS3Service(S3Service):
+    """S3Service whose transfers take time in proportion to their size"""
+
+    def __init__(self, bandwidth, request_seconds):
+        super().__init__()
+        self.bandwidth = bandwidth
+        self.request_seconds = request_seconds
+
+    def _read_range(self, video_key, start, end, stats):
+        data, total = super()._read_range(video_key, start, end, stats)
+        time.sleep(self.request_seconds + len(data) / self.bandwidth)
+        return data, total
+
+    def download_video(self, video_key, local_path):
+        super().download_video(video_key, local_path)
+        time.sleep(self.request_seconds + os.path.getsize(local_path) / self.bandwidth)
+
+
+def run(s3, key, pipeline_mode, analysis_mode, latency):
+    analysis_module.PIPELINE_MODE = pipeline_mode
+    analysis = AnalysisService(bedrock_client=FakeBedrockClient(latency=latency))
+    analysis.analysis_mode = analysis_mode
+    # Fresh caches, so every run downloads and calls the model
+    service = VideoJobService(s3, analysis, store=JobStore(':memory:'), result_cache=ResultCache())
+    started = time.perf_counter()
+    result = service.process_video(key)
+    seconds = time.perf_counter() - started
+    observations = [
+        (entry["frame_id"], entry["timestamp"], entry["hazards"]) for entry in result["timeline"]["entries"]
+    ]
+    return seconds, result["pipeline"], observations
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--bandwidth', type=float, default=4, help="simulated S3 throughput, MB/s")
+    parser.add_argument('--request-ms', type=float, default=30)
+    parser.add_argument('--latency', type=float, default=1.0)
+    args = parser.parse_args()
+
+    with mock_aws():
+        s3 = SlowS3Service(args.bandwidth * 2 ** 20, args.request_ms / 1000)
+        s3.client.create_bucket(
+            Bucket=s3.bucket_name, CreateBucketConfiguration={'LocationConstraint': s3.region}
+        )
+        keys = []
+        for width, height, seconds in CLIPS:
+            path = make_test_video(width, height, seconds, event_at=seconds / 2)
+            key = f"videos/bench_{width}x{height}_{seconds}s.mp4"
+            s3.client.upload_file(path, s3.bucket_name, key)
+            keys.append((f"{width}x{height} {seconds}s ({os.path.getsize(path) / 2 ** 20:.0f} MiB)", key))
+            os.unlink(path)
+
+        print(f"{args.bandwidth:g} MB/s S3 + {args.request_ms:g} ms per request, {args.latency}s per Bedrock call")
+        print(f"{'clip':<26}{'frames':<12}{'pipeline':<10}{'seconds':>9}{'stage sum':>11}  {'slowest':<10}{'same':>6}")
+        for label, key in keys:
+            for analysis_mode in ('concurrent', 'sequential'):
+                baseline = None
+                for pipeline_mode in ('off', 'on'):
+                    seconds, timings, observations = run(s3, key, pipeline_mode, analysis_mode, args.latency)
+                    baseline = baseline or observations
+                    print(f"{label:<26}{analysis_mode:<12}{pipeline_mode:<10}{seconds:>9.2f}"
+                          f"{timings['busy_seconds']:>11.2f}  "
+                          f"{timings['slowest_stage'] or '-':<10}{str(observations == baseline):>6}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""Bedrock calls under a quota: no limiter vs retries with jitter vs the shared token-bucket limiter.
+
+Run from the backend directory:
+    python -m benchmarks.bench_rate_limiter --batch-calls 120 --live-calls 10
+
+A fake Bedrock accepts `--quota` calls per second and throttles the rest,
+plus `--throttle-rate` of calls at random. `--threads` workers fire the
+batch calls (background re-analysis) and, once they are under way, the live
+calls (dispatch summaries) arrive. For each configuration reports how many
+calls succeeded, how many attempts were throttled, and the p50/p95 latency
+of live and batch calls. The quota window is one second instead of a
+minute so the run is short; the limiter is given the same window.
+
+The last row points every call at a model that always throttles, to show
+the circuit breaker failing calls fast once it opens.
+"""
+import argparse
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.services.rate_limiter import LANE_BATCH, LANE_LIVE, BedrockRateLimiter, priority_lane
+from benchmarks.fakes import FakeBedrockClient
+
+MODEL_ID = "us.meta.llama3-2-11b-instruct-v1:0"
+MESSAGES = [{"role": "user", "content": [{"text": "Summarize the incident."}]}]
+
+
+def p95(values):
+    return sorted(values)[int(0.95 * (len(values) - 1))] if values else 0.0
+
+
+def run(limiter, client, args):
+    latencies = {LANE_LIVE: [], LANE_BATCH: []}
+    failures = {LANE_LIVE: 0, LANE_BATCH: 0}
+    lock = threading.Lock()
+
+    def call(lane):
+        with priority_lane(lane):
+            started = time.perf_counter()
+            try:
+                limiter.call(MODEL_ID, client.converse, messages=MESSAGES, inferenceConfig={"maxTokens": 256})
+            except Exception:
+                with lock:
+                    failures[lane] += 1
+                return
+            with lock:
+                latencies[lane].append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        futures = [pool.submit(call, LANE_BATCH) for _ in range(args.batch_calls)]
+        # Live incidents come in while the batch backlog is queued
+        time.sleep(0.5)
+        futures += [pool.submit(call, LANE_LIVE) for _ in range(args.live_calls)]
+        for future in futures:
+            future.result()
+    return time.perf_counter() - started, latencies, failures
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--batch-calls', type=int, default=120)
+    parser.add_argument('--live-calls', type=int, default=10)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--quota', type=int, default=20, help="calls per second the fake accepts")
+    parser.add_argument('--throttle-rate', type=float, default=0.05)
+    parser.add_argument('--latency', type=float, default=0.2)
+    args = parser.parse_args()
+
+    # The breaker is kept out of the first three rows, which compare pacing and retries
+    no_breaker = dict(failure_threshold=10 ** 6)
+    configs = [
+        ("no limiter", dict(rpm=0, tpm=0, max_attempts=1, **no_breaker), None),
+        ("retries only", dict(rpm=0, tpm=0, max_attempts=6, retry_base=0.05, retry_cap=2, **no_breaker), None),
+        ("limiter", dict(rpm=args.quota, tpm=0, max_attempts=6, retry_base=0.05, retry_cap=2, **no_breaker), None),
+        ("always throttled", dict(rpm=args.quota, tpm=0, max_attempts=6, retry_base=0.05, retry_cap=2,
+                                  failure_threshold=8, reset_seconds=30), 1.0),
+    ]
+    print(f"{args.batch_calls} batch + {args.live_calls} live calls, {args.threads} threads, quota {args.quota}/s, "
+          f"{args.throttle_rate:.0%} random throttling, {args.latency}s per call")
+    print(f"{'config':<18}{'ok':>5}{'failed':>8}{'throttled':>11}{'live p50':>10}{'live p95':>10}"
+          f"{'batch p50':>11}{'batch p95':>11}{'seconds':>9}")
+    for label, options, throttle_rate in configs:
+        client = FakeBedrockClient(
+            latency=args.latency, quota=(args.quota, 1.0),
+            throttle_rate=args.throttle_rate if throttle_rate is None else throttle_rate
+        )
+        limiter = BedrockRateLimiter(period=1.0, queue_timeout=30, **options)
+        seconds, latencies, failures = run(limiter, client, args)
+        live, batch = latencies[LANE_LIVE], latencies[LANE_BATCH]
+        ok = len(live) + len(batch)
+        print(f"{label:<18}{ok:>5}{sum(failures.values()):>8}{client.throttled:>11}"
+              f"{statistics.median(live) if live else 0:>10.2f}{p95(live):>10.2f}"
+              f"{statistics.median(batch) if batch else 0:>11.2f}{p95(batch):>11.2f}{seconds:>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Bytes transferred and time to first frame, full download vs ranged fetch, against moto's S3.
+
+Run from the backend directory (needs `pip install moto`):
+    python -m benchmarks.bench_s3_fetch
+
+Also checks that frames decoded from the ranged sparse file match the ones
+decoded from the full file.
+"""
+import os
+import tempfile
+
+import numpy as np
+from moto import mock_aws
+
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+os.environ.setdefault('AWS_REGION', 'us-west-2')
+os.environ.setdefault('AWS_BUCKET_NAME', 'bench-videos')
+
+from app.services import s3_service as s3_module
+from app.services.analysis_service import AnalysisService
+from benchmarks.fakes import make_test_video
+
+CLIPS = [(640, 360, 10), (1280, 720, 30), (640, 360, 120)]
+
+
+def fetch(service, analysis, key, mode):
+    s3_module.S3_DOWNLOAD_MODE = mode
+    fd, path = tempfile.mkstemp(suffix='.mp4')
+    os.close(fd)
+    stats = service.fetch_video(key, path, analysis.select_frame_indices)
+    segments = analysis.video_segments(*analysis.probe_video(path))
+    if segments:
+        # Long clips are sampled per segment
+        extracted = [
+            frame for start, end in segments
+            for frame in analysis.extract_segment_frames(path, start, end, first_id=1)
+        ]
+    else:
+        extracted = analysis.extract_accident_frames(path)
+    frames = [frame.array for frame in extracted]
+    os.unlink(path)
+    return stats, frames
+
+
+def main():
+    with mock_aws():
+        service = s3_module.S3Service()
+        service.client.create_bucket(
+            Bucket=service.bucket_name,
+            CreateBucketConfiguration={'LocationConstraint': service.region}
+        )
+        analysis = AnalysisService(bedrock_client=object())
+
+        rows = []
+        for width, height, seconds in CLIPS:
+            video_path = make_test_video(width, height, seconds)
+            key = f"videos/bench_{width}x{height}_{seconds}s.mp4"
+            service.client.upload_file(video_path, service.bucket_name, key)
+            os.unlink(video_path)
+
+            full_stats, full_frames = fetch(service, analysis, key, 'full')
+            ranged_stats, ranged_frames = fetch(service, analysis, key, 'ranged')
+            identical = len(full_frames) == len(ranged_frames) and all(
+                np.array_equal(a, b) for a, b in zip(full_frames, ranged_frames)
+            )
+            rows.append((f"{width}x{height} {seconds}s", full_stats, ranged_stats, identical))
+
+    print(f"{'clip':<18}{'mode':<8}{'MiB':>9}{'requests':>10}{'ttff ms':>10}{'frames match':>14}")
+    for clip, full_stats, ranged_stats, identical in rows:
+        for stats in (full_stats, ranged_stats):
+            print(f"{clip:<18}{stats['mode']:<8}{stats['bytes_transferred'] / 2**20:>9.2f}"
+                  f"{stats['requests']:>10}{stats['time_to_first_frame'] * 1000:>10.1f}{str(identical):>14}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Summary prompt size as frame count grows: raw join vs compact timeline vs token budget.
+
+Run from the backend directory:
+    python -m benchmarks.bench_summary_budget --latency 0.2
+
+Builds timelines of 4 to 256 frames whose descriptions repeat the way a
+mostly static scene does (a few sentences change per frame, the rest are
+restated), then reports the estimated tokens of the old ' '.join prompt
+input, the compact timeline, after sentence dedupe, and after map-reduce
+condensing, with the model calls and time each summary took against a fake
+Bedrock with `--latency` seconds per call.
+"""
+import argparse
+import random
+import time
+
+from app.models.timeline import IncidentTimeline
+from app.services.analysis_service import AnalysisService
+from app.services.token_budget import SUMMARY_INPUT_TOKEN_BUDGET, TokenBudget, UsageMeter, estimate_tokens
+from benchmarks.fakes import FakeBedrockClient
+
+SCENE = [
+    "Two vehicles collided at the intersection.",
+    "The silver sedan has front-end damage and a crumpled hood.",
+    "The road surface is wet and traffic is stopped in both lanes.",
+    "Debris and broken glass are scattered across the lane.",
+]
+CHANGES = [
+    "Light smoke rises from the sedan's engine bay.",
+    "A bystander approaches the driver's door.",
+    "The driver of the pickup is standing beside the vehicle.",
+    "Fluid is pooling under the sedan.",
+    "A passenger appears to be holding their arm.",
+    "Traffic begins to back up behind the scene.",
+]
+
+
+def make_timeline(frames, rng):
+    timeline = IncidentTimeline()
+    descriptions = []
+    for i in range(frames):
+        sentences = SCENE + rng.sample(CHANGES, 2) + [f"Frame detail {rng.randint(0, frames // 2)}."]
+        description = " ".join(sentences)
+        descriptions.append(description)
+        seconds = i * 3
+        timeline.add(i + 1, f"{seconds // 60:02d}:{seconds % 60:02d}", description)
+    return timeline, descriptions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--latency', type=float, default=0.2)
+    args = parser.parse_args()
+    rng = random.Random(7)
+
+    print(f"summary budget {SUMMARY_INPUT_TOKEN_BUDGET} tokens, {args.latency}s per Bedrock call")
+    print(f"{'frames':>7}{'joined':>8}{'compact':>9}{'deduped':>9}{'final':>7}{'levels':>8}{'calls':>7}{'seconds':>9}")
+    for frames in (4, 16, 64, 256):
+        timeline, descriptions = make_timeline(frames, rng)
+        compact = timeline.compact()
+        client = FakeBedrockClient(latency=args.latency)
+        service = AnalysisService(bedrock_client=client)
+        usage = UsageMeter()
+        started = time.perf_counter()
+        service.summarize_observations(timeline, usage=usage)
+        seconds = time.perf_counter() - started
+        budget = usage.to_dict()["summary_budget"]
+        print(f"{frames:>7}{estimate_tokens(' '.join(descriptions)):>8}{TokenBudget.estimate(compact):>9}"
+              f"{budget['deduped_tokens']:>9}{budget['final_tokens']:>7}{budget['levels']:>8}"
+              f"{client.calls:>7}{seconds:>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Decoded frames per second per decoder backend, by resolution and codec.
+
+Run from the backend directory (the PyAV rows and H.264 clips need `pip install av`):
+    python -m benchmarks.bench_video_decode --seconds 4
+
+For each clip and backend it reports:
+  full        sequential decode of every frame to full-size BGR
+  1 thread    the same with the codec limited to one thread
+  fit 1024    sequential decode fitted to the Bedrock frame size (PyAV: lowres/swscale, OpenCV: cv2.resize)
+  keyframes   keyframe-only decode, as video frames covered per second
+  4 frames    wall time of the four-frame uniform extraction the pipeline runs
+"""
+import argparse
+import os
+import time
+
+from app.services.analysis_service import FRAME_MAX_SIZE, AnalysisService
+from app.utils import video_utils
+from benchmarks.fakes import make_test_video
+
+RESOLUTIONS = [(640, 360), (1280, 720), (1920, 1080), (3840, 2160)]
+
+
+def frames_per_second(video_path, backend, threads=None, max_size=None, keyframes_only=False):
+    with video_utils.open_video(video_path, backend=backend, threads=threads, max_size=max_size) as decoder:
+        start = time.perf_counter()
+        if keyframes_only:
+            # Video frames covered per second: what a keyframe scan of the clip costs
+            sum(1 for _ in decoder.keyframes())
+            count = decoder.frame_count
+        else:
+            count = sum(1 for _ in decoder.iter_frames())
+        return count / (time.perf_counter() - start)
+
+
+def uniform_extraction(video_path, backend):
+    video_utils.VIDEO_DECODER = backend
+    service = AnalysisService(bedrock_client=object())
+    start = time.perf_counter()
+    service.extract_accident_frames(video_path)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seconds', type=float, default=4)
+    args = parser.parse_args()
+
+    codecs = [('mpeg4', None)]
+    backends = ['opencv']
+    if video_utils.av is not None:
+        codecs.append(('h264', 'libx264'))
+        backends.append('pyav')
+
+    print(f"{'clip':<18}{'backend':<8}{'full fps':>10}{'1 thread':>10}{f'fit {FRAME_MAX_SIZE}':>10}"
+          f"{'keyframes':>11}{'4 frames ms':>13}")
+    for codec_name, codec in codecs:
+        for width, height in RESOLUTIONS:
+            video_path = make_test_video(width, height, args.seconds, codec=codec)
+            try:
+                for backend in backends:
+                    full = frames_per_second(video_path, backend)
+                    single = frames_per_second(video_path, backend, threads=1)
+                    fitted = frames_per_second(video_path, backend, max_size=FRAME_MAX_SIZE)
+                    keyframes = frames_per_second(video_path, backend, keyframes_only=True)
+                    extraction = uniform_extraction(video_path, backend)
+                    print(f"{codec_name} {width}x{height}".ljust(18) + f"{backend:<8}{full:>10.0f}{single:>10.0f}"
+                          f"{fitted:>10.0f}{keyframes:>11.0f}{extraction * 1000:>13.0f}")
+            finally:
+                os.unlink(video_path)
+
+
+if __name__ == '__main__':
+    main()
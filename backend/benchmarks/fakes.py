@@ -0,0 +1,165 @@
+"""Local stand-ins used by the benchmark scripts so they run without AWS."""
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+from botocore.exceptions import ClientError
+
+
+class FakeBedrockClient:
+    """Mimics bedrock-runtime `converse` with a fixed per-call latency.
+
+    `model_latency` ({model id: seconds}) overrides the latency per model,
+    and `responder(model_id, messages)`, if given, writes single-frame and
+    text replies instead of the fixed `text`. Calls per model are counted in
+    `calls_by_model` and tokens in `tokens_by_model`; reported usage is
+    estimated from the request, at four characters per text token and
+    IMAGE_TOKENS per image.
+
+    Throttling is injected as the ClientError boto3 raises: at random for
+    `throttle_rate` of calls, and for every call beyond `quota` (calls,
+    window seconds) accepted in a sliding window, the way a Bedrock quota
+    pushes back. `throttled` counts them.
+    """
+
+    IMAGE_TOKENS = 1600
+
+    def __init__(self, latency=0.5, text="Two vehicles collided. Light smoke visible. No fire.",
+                 model_latency=None, responder=None, throttle_rate=0.0, quota=None, seed=0):
+        self.latency = latency
+        self.text = text
+        self.model_latency = model_latency or {}
+        self.responder = responder
+        self.calls = 0
+        self.calls_by_model = {}
+        self.tokens_by_model = {}
+        self.throttle_rate = throttle_rate
+        self.quota = quota
+        self.throttled = 0
+        self._random = random.Random(seed)
+        self._accepted = deque()
+        self._lock = threading.Lock()
+
+    def _start_call(self, modelId):
+        with self._lock:
+            self.calls += 1
+            self.calls_by_model[modelId] = self.calls_by_model.get(modelId, 0) + 1
+            throttle = self._random.random() < self.throttle_rate
+            if self.quota and not throttle:
+                limit, window = self.quota
+                now = time.monotonic()
+                while self._accepted and now - self._accepted[0] >= window:
+                    self._accepted.popleft()
+                throttle = len(self._accepted) >= limit
+                if not throttle:
+                    self._accepted.append(now)
+            self.throttled += throttle
+        if throttle:
+            raise ClientError(
+                {"Error": {"Code": "ThrottlingException", "Message": "Too many requests, please wait before trying again."}},
+                "Converse"
+            )
+        return self.model_latency.get(modelId, self.latency)
+
+    def _usage(self, modelId, messages, text):
+        input_tokens = sum(
+            self.IMAGE_TOKENS if "image" in block else len(block.get("text", "")) // 4
+            for message in messages for block in message["content"]
+        )
+        output_tokens = len(text) // 4
+        with self._lock:
+            totals = self.tokens_by_model.setdefault(modelId, [0, 0])
+            totals[0] += input_tokens
+            totals[1] += output_tokens
+        return {"inputTokens": input_tokens, "outputTokens": output_tokens, "totalTokens": input_tokens + output_tokens}
+
+    def _reply_text(self, messages, modelId=None):
+        content = messages[-1]["content"]
+        frame_labels = [block["text"] for block in content if block.get("text", "").startswith("Frame ")]
+        if len(frame_labels) < 2:
+            return self.responder(modelId, messages) if self.responder else self.text
+        # Batched request: answer in the per-frame format the prompt asks for
+        parts = []
+        for label in frame_labels:
+            number = label.split()[1]
+            parts.append(f"### Frame {number}\n- {self.text}")
+        if "### Comprehensive Analysis" in content[-1]["text"]:
+            parts.append(f"### Comprehensive Analysis\n**Hazard Assessment:**\n- {self.text}")
+        return "\n\n".join(parts)
+
+    def converse(self, modelId, messages, inferenceConfig=None, **kwargs):
+        time.sleep(self._start_call(modelId))
+        text = self._reply_text(messages, modelId)
+        return {
+            "output": {"message": {"role": "assistant", "content": [{"text": text}]}},
+            "usage": self._usage(modelId, messages, text),
+            "stopReason": "end_turn",
+        }
+
+
+    def converse_stream(self, modelId, messages, inferenceConfig=None, **kwargs):
+        latency = self._start_call(modelId)
+        text = self._reply_text(messages, modelId)
+        words = text.split(' ')
+        usage = self._usage(modelId, messages, text)
+
+        def stream():
+            # First token after half the latency, the rest spread over the remainder
+            time.sleep(latency / 2)
+            yield {"messageStart": {"role": "assistant"}}
+            for i, word in enumerate(words):
+                yield {"contentBlockDelta": {"delta": {"text": word if i == 0 else f" {word}"}, "contentBlockIndex": 0}}
+                time.sleep(latency / 2 / len(words))
+            yield {"messageStop": {"stopReason": "end_turn"}}
+            yield {"metadata": {"usage": usage, "metrics": {"latencyMs": int(latency * 1000)}}}
+
+        return {"stream": stream()}
+
+
+def make_test_video(width=1280, height=720, seconds=10, fps=30, path=None, event_at=None, codec=None):
+    """Write a synthetic MP4 with a moving block so frames differ, return its path.
+
+    `event_at` (seconds) adds an abrupt scene change, standing in for the crash.
+    `codec` (e.g. "libx264") encodes through PyAV instead of OpenCV's MPEG-4 writer.
+    """
+    if path is None:
+        fd, path = tempfile.mkstemp(suffix='.mp4')
+        os.close(fd)
+
+    if codec:
+        import av
+        container = av.open(path, 'w')
+        stream = container.add_stream(codec, rate=fps)
+        stream.width, stream.height, stream.pix_fmt = width, height, 'yuv420p'
+
+        def write(frame):
+            for packet in stream.encode(av.VideoFrame.from_ndarray(frame, format='bgr24')):
+                container.mux(packet)
+
+        def release():
+            for packet in stream.encode():
+                container.mux(packet)
+            container.close()
+    else:
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+        write, release = writer.write, writer.release
+
+    rng = np.random.default_rng(0)
+    background = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+    block = max(16, width // 10)
+    total = int(seconds * fps)
+    for i in range(total):
+        frame = background.copy()
+        x = int((width - block) * i / max(total - 1, 1))
+        frame[height // 3:height // 3 + block, x:x + block] = (0, 0, 255)
+        if event_at is not None and i >= event_at * fps:
+            # Bright flash that then lingers as a large hot region
+            frame[height // 2:, :width // 2] = (40, 160, 255)
+        write(frame)
+    release()
+    return path
@@ -0,0 +1,86 @@
+"""Mixed-traffic load test reporting p50/p99 latency per endpoint.
+
+Start the API (uvicorn app.main:app) and run from the backend directory:
+    python -m benchmarks.load_test --url http://localhost:8000 --video-key videos/sample.mp4
+
+Run it once on the old code and once on the new to compare. Every slow
+/api/process-video call should no longer drag up the latency of the cheap
+endpoints, and saturation shows up as 503s instead of growing latency.
+"""
+import argparse
+import asyncio
+import random
+import time
+from collections import defaultdict
+
+import httpx
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def build_request(kind, video_key):
+    if kind == 'process-video':
+        return 'POST', '/api/process-video', {"videoKey": video_key}
+    if kind == 'save-incident':
+        return 'POST', '/api/save-incident', {
+            "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'),
+            "incidentReport": "Load test incident",
+            "selectedServices": ["police"],
+            "notes": "load test",
+        }
+    return 'GET', '/api/past-incidents', None
+
+
+async def worker(client, deadline, mix, video_key, latencies, statuses):
+    kinds, weights = zip(*mix.items())
+    while time.perf_counter() < deadline:
+        kind = random.choices(kinds, weights)[0]
+        method, path, body = build_request(kind, video_key)
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, path, json=body)
+            status = response.status_code
+        except httpx.HTTPError:
+            status = 'error'
+        latencies[kind].append(time.perf_counter() - start)
+        statuses[kind][status] += 1
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--video-key', default='videos/sample.mp4')
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--duration', type=float, default=30.0)
+    parser.add_argument('--video-share', type=float, default=0.2,
+                        help="fraction of requests that are /api/process-video")
+    args = parser.parse_args()
+
+    rest = (1 - args.video_share) / 2
+    mix = {'process-video': args.video_share, 'past-incidents': rest, 'save-incident': rest}
+    latencies = defaultdict(list)
+    statuses = defaultdict(lambda: defaultdict(int))
+
+    deadline = time.perf_counter() + args.duration
+    async with httpx.AsyncClient(base_url=args.url, timeout=300) as client:
+        await asyncio.gather(*[
+            worker(client, deadline, mix, args.video_key, latencies, statuses)
+            for _ in range(args.concurrency)
+        ])
+
+    print(f"{'endpoint':<16}{'count':>7}{'p50 ms':>10}{'p99 ms':>10}  statuses")
+    for kind in mix:
+        values = latencies[kind]
+        print(f"{kind:<16}{len(values):>7}"
+              f"{percentile(values, 50) * 1000:>10.1f}{percentile(values, 99) * 1000:>10.1f}"
+              f"  {dict(statuses[kind])}")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,16 @@
+import os
+
+import pytest
+
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+os.environ.setdefault('AWS_REGION', 'us-west-2')
+os.environ.setdefault('AWS_BUCKET_NAME', 'test-videos')
+
+
+@pytest.fixture(scope='session')
+def aws():
+    """moto for the whole session: the shared clients in aws_clients outlive a single test"""
+    from moto import mock_aws
+    with mock_aws():
+        yield
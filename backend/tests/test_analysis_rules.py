@@ -0,0 +1,55 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from app.models.timeline import IncidentTimeline
+from app.services.analysis_parser import AnalysisParser, load_rules
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FLOOD_RULES = [{"keyword": "Flooding", "terms": ["flood", "water"], "services": ["Water Rescue"],
+                "weight": 0.6, "high": True}]
+DESCRIPTION = "Water is rising around the car. The engine bay is on fire."
+
+
+@pytest.fixture
+def rules_path(tmp_path):
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps(FLOOD_RULES))
+    return str(path)
+
+
+def test_one_rules_file_drives_report_and_timeline(rules_path):
+    parser = AnalysisParser(load_rules(rules_path))
+    timeline = IncidentTimeline(parser.rules)
+    entry = timeline.add(1, "00:04", DESCRIPTION)
+
+    assert parser.parse(DESCRIPTION).keywords == ["Flooding"]
+    assert entry.hazards == ("Flooding",)
+    assert entry.severity == 0.6
+    assert timeline.onsets() == {"Flooding": "00:04"}
+
+
+def test_rules_path_setting_reaches_the_default_timeline(rules_path):
+    script = (
+        "from app.models.timeline import IncidentTimeline, detect_hazards\n"
+        "from app.services.analysis_parser import AnalysisParser\n"
+        f"text = {DESCRIPTION!r}\n"
+        "print(AnalysisParser().parse(text).keywords, IncidentTimeline().add(1, '00:04', text).hazards,"
+        " sorted(detect_hazards(text)))\n"
+    )
+    env = dict(os.environ, ANALYSIS_RULES_PATH=rules_path)
+    output = subprocess.run([sys.executable, "-c", script], cwd=BACKEND, env=env, capture_output=True,
+                            text=True, check=True).stdout
+    assert output.strip() == "['Flooding'] ('Flooding',) ['Flooding']"
+
+
+def test_default_timeline_matches_word_forms_and_negations():
+    timeline = IncidentTimeline()
+    entry = timeline.add(1, "00:02", "Driver pinned and bleeding; no fire, but smoking engine")
+
+    assert entry.hazards == ("Trapped Occupants", "Injuries", "Smoke")
+    assert "Fire Hazard" not in timeline.onsets()
@@ -0,0 +1,74 @@
+import numpy as np
+
+from app.models.frame import ExtractedFrame
+from app.services.analysis_service import AnalysisService
+from benchmarks.fakes import FakeBedrockClient
+
+REPLY = """Here is what each frame shows.
+
+### Frame 1 (00:00)
+- Two cars, front damage
+
+## frame 2
+- Light smoke from the hood
+
+### Frame 3
+
+### Comprehensive Analysis
+**Hazard Assessment:**
+- Smoke, no fire
+"""
+
+
+class ScriptedClient:
+    """converse that always answers with `text`, counting calls"""
+
+    def __init__(self, text):
+        self.text = text
+        self.calls = 0
+
+    def converse(self, modelId, messages, **kwargs):
+        self.calls += 1
+        return {"output": {"message": {"role": "assistant", "content": [{"text": self.text}]}}}
+
+
+def frames(count):
+    rng = np.random.default_rng(1)
+    return [
+        ExtractedFrame(i + 1, f"00:{i * 2:02d}", rng.integers(0, 255, (48, 64, 3), dtype=np.uint8))
+        for i in range(count)
+    ]
+
+
+def test_split_reads_each_frame_heading_and_the_summary():
+    observations, comprehensive = AnalysisService._split_batched_response(REPLY)
+
+    # Headings at any level and case; an empty section and the preamble give nothing
+    assert observations == {1: "- Two cars, front damage", 2: "- Light smoke from the hood"}
+    assert comprehensive == "**Hazard Assessment:**\n- Smoke, no fire"
+
+
+def test_split_without_summary_or_headings():
+    assert AnalysisService._split_batched_response("### Frame 4\n- Clear road") == ({4: "- Clear road"}, None)
+    assert AnalysisService._split_batched_response("I cannot see the images.") == ({}, None)
+
+
+def test_batched_call_describes_every_frame_in_one_call():
+    client = FakeBedrockClient(latency=0, text="Two vehicles collided.")
+    service = AnalysisService(bedrock_client=client)
+
+    results, comprehensive, calls = service._call_bedrock_batched(frames(3))
+
+    assert calls == client.calls == 1
+    assert [description for description, _, _ in results] == ["- Two vehicles collided."] * 3
+    assert comprehensive == "**Hazard Assessment:**\n- Two vehicles collided."
+
+
+def test_frame_missing_from_the_reply_has_no_description():
+    service = AnalysisService(bedrock_client=ScriptedClient(REPLY))
+
+    results, _, _ = service._call_bedrock_batched(frames(3))
+
+    assert [description for description, _, _ in results] == [
+        "- Two cars, front damage", "- Light smoke from the hood", None
+    ]
@@ -0,0 +1,43 @@
+import threading
+import time
+
+import pytest
+
+from app.services.analysis_service import BEDROCK_MAX_CONCURRENCY, _submit_call, _wait_calls
+from app.utils.executors import PoolSaturatedError
+
+
+@pytest.fixture
+def busy_executor():
+    """Every frame executor slot taken by another request's call until the event is set"""
+    release = threading.Event()
+    blockers = [_submit_call(release.wait) for _ in range(BEDROCK_MAX_CONCURRENCY)]
+    yield release
+    release.set()
+    _wait_calls(blockers, 5)
+
+
+def test_time_queued_behind_other_requests_does_not_count_as_call_time(busy_executor):
+    calls = [_submit_call(time.sleep, 0.1) for _ in range(2)]
+    threading.Timer(0.5, busy_executor.set).start()
+
+    _wait_calls(calls, call_timeout=0.3, queue_wait=5)
+
+    assert not any(call.timed_out for call in calls)
+    assert all(call.future.done() and not call.future.cancelled() for call in calls)
+
+
+def test_call_that_runs_too_long_times_out():
+    call = _submit_call(time.sleep, 0.5)
+
+    _wait_calls([call], call_timeout=0.1, queue_wait=5)
+
+    assert call.timed_out
+
+
+def test_calls_queued_past_the_queue_wait_shed_the_request(busy_executor):
+    calls = [_submit_call(time.sleep, 0.1) for _ in range(2)]
+
+    with pytest.raises(PoolSaturatedError):
+        _wait_calls(calls, call_timeout=5, queue_wait=0.2)
+    assert all(call.future.cancelled() for call in calls)
@@ -0,0 +1,54 @@
+import random
+
+from app.services import cache_service
+from app.services.cache_service import FrameHashIndex
+from app.utils.image_hash import hamming_distance
+
+NAMESPACE = "model|v1"
+
+
+def test_reuse_across_videos_is_exact_by_default():
+    index = FrameHashIndex(max_distance=6)
+    index.add(0b1011, NAMESPACE, "no fire visible")
+
+    assert index.lookup(0b1011, NAMESPACE) == "no fire visible"
+    # Two bits off is a near-duplicate within a video, but not reused from another one
+    assert index.lookup(0b1000, NAMESPACE) is None
+    assert index.lookup(0b1011, "other-model|v1") is None
+
+
+def test_banded_lookup_matches_a_full_scan():
+    rng = random.Random(3)
+    index = FrameHashIndex(max_distance=6, reuse_distance=4)
+    stored = [rng.getrandbits(64) for _ in range(500)]
+    for position, frame_hash in enumerate(stored):
+        index.add(frame_hash, NAMESPACE, position)
+
+    for _ in range(300):
+        query = rng.choice(stored) ^ sum(1 << bit for bit in rng.sample(range(64), rng.randint(0, 6)))
+        distances = [hamming_distance(query, frame_hash) for frame_hash in stored]
+        best = min(distances)
+        found = index.lookup(query, NAMESPACE)
+        if best <= 4:
+            assert found is not None and distances[found] == best
+        else:
+            assert found is None
+
+
+def test_entries_expire_and_leave_no_bands(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_service.time, 'time', lambda: now[0])
+    first, second, third, fourth = (0xFFFF << shift for shift in (0, 16, 32, 48))
+    index = FrameHashIndex(max_distance=6, reuse_distance=2, ttl=60, max_entries=2)
+    index.add(first, NAMESPACE, "first")
+    now[0] += 30
+    index.add(second, NAMESPACE, "second")
+    index.add(third, NAMESPACE, "third")
+    assert len(index) == 2 and index.lookup(first, NAMESPACE) is None
+
+    now[0] += 65
+    assert index.lookup(second, NAMESPACE) is None
+    index.add(fourth, NAMESPACE, "fourth")
+    assert len(index) == 1
+    assert index.lookup(fourth ^ 1, NAMESPACE) == "fourth"
+    assert all(bucket <= {fourth} for bucket in index._bands.values())
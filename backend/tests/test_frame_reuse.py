@@ -0,0 +1,109 @@
+import numpy as np
+from botocore.exceptions import ClientError
+
+from app.models.frame import ExtractedFrame
+from app.services.analysis_service import AnalysisService, FrameStreamAnalysis, frame_namespace
+from app.services.model_router import ModelRouter
+from app.services.rate_limiter import BedrockRateLimiter
+from app.utils.image_hash import dhash
+from benchmarks.fakes import FakeBedrockClient
+
+TIERS = {'vision_large': ['large', 'large-fallback'], 'vision_small': ['small']}
+
+
+class UnavailableModelClient(FakeBedrockClient):
+    """FakeBedrockClient without access to the models in `unavailable`"""
+
+    def __init__(self, unavailable):
+        super().__init__(latency=0, text="Two parked cars, no damage.")
+        self.unavailable = unavailable
+
+    def converse(self, modelId, messages, **kwargs):
+        if modelId in self.unavailable:
+            raise ClientError({'Error': {'Code': 'AccessDeniedException', 'Message': 'no access'}}, 'Converse')
+        return super().converse(modelId, messages, **kwargs)
+
+
+def make_service(client, mode='off'):
+    service = AnalysisService(bedrock_client=client)
+    service.router = ModelRouter(tiers=TIERS, mode=mode, limiter=BedrockRateLimiter(rpm=0, tpm=0))
+    return service
+
+
+def frame(seed, frame_id=1):
+    grey = np.random.default_rng(seed).integers(40, 200, (48, 64), dtype=np.uint8)
+    return ExtractedFrame(frame_id, "00:00", np.dstack([grey] * 3))
+
+
+def test_fallback_description_is_indexed_under_the_fallback_model():
+    service = make_service(UnavailableModelClient({'large'}))
+    scene = frame(1)
+
+    results, _ = service.analyze_frames([scene], mode='concurrent')
+
+    frame_hash = dhash(scene.array)
+    assert service.frame_index.lookup(frame_hash, frame_namespace('large-fallback')) == results[0]
+    assert service.frame_index.lookup(frame_hash, frame_namespace('large')) is None
+    # Still reused for the next video: any large-tier model's description will do
+    stats = {}
+    service.analyze_frames([scene], mode='concurrent', cache_stats=stats)
+    assert stats["model_calls"] == 0
+
+
+def test_small_model_descriptions_are_reused_only_while_routing_to_it():
+    client = FakeBedrockClient(latency=0, text="Two parked cars, no damage.")
+    service = make_service(client, mode='tiered')
+    service.router.frame_tier = lambda salient: 'vision_small'
+    scene = frame(2)
+
+    service.analyze_frames([scene], mode='concurrent')
+    assert service.frame_index.lookup(dhash(scene.array), frame_namespace('small')) is not None
+
+    stats = {}
+    service.analyze_frames([scene], mode='concurrent', cache_stats=stats)
+    assert stats["model_calls"] == 0
+
+    service.router.mode = 'off'
+    del service.router.frame_tier
+    service.analyze_frames([scene], mode='concurrent', cache_stats=stats)
+    assert stats["model_calls"] == 1
+    assert client.calls_by_model == {'small': 1, 'large': 1}
+
+
+def test_streamed_frames_are_indexed_under_the_model_that_described_them():
+    service = make_service(UnavailableModelClient({'large'}))
+    scenes = [frame(3, 1), frame(3, 2), frame(4, 3)]
+
+    stream = FrameStreamAnalysis(service)
+    for scene in scenes:
+        if stream.admit(scene):
+            stream.analyze(scene)
+    _, results, cache_stats, _ = stream.finish()
+
+    assert results[0] == results[1] is not None
+    assert cache_stats["model_calls"] == 2 and cache_stats["hits"] == 1
+    for scene in (scenes[0], scenes[2]):
+        assert service.frame_index.lookup(dhash(scene.array), frame_namespace('large-fallback')) is not None
+
+
+def test_streamed_and_whole_video_analysis_agree():
+    scenes = [frame(5, 1), frame(5, 2), frame(6, 3), frame(5, 4)]
+    whole = make_service(FakeBedrockClient(latency=0))
+    streamed = make_service(FakeBedrockClient(latency=0))
+    for service in (whole, streamed):
+        # One description already indexed from an earlier video
+        service.frame_index.add(dhash(scenes[2].array), frame_namespace('large'), "From an earlier video")
+
+    cache_stats, routing = {}, {}
+    results, _ = whole.analyze_frames(scenes, mode='concurrent', cache_stats=cache_stats, routing=routing)
+    stream = FrameStreamAnalysis(streamed)
+    for scene in scenes:
+        if stream.admit(scene):
+            stream.analyze(scene)
+    _, stream_results, stream_cache_stats, stream_routing = stream.finish()
+
+    assert results == stream_results
+    assert results[2] == "From an earlier video" and results[0] == results[1] == results[3]
+    assert {**cache_stats, "latency_saved_seconds": 0} == {**stream_cache_stats, "latency_saved_seconds": 0}
+    assert cache_stats["model_calls"] == 1 and cache_stats["hits"] == 3
+    assert routing == stream_routing
@@ -0,0 +1,34 @@
+import numpy as np
+
+from app.utils.frame_triage import FrameTriage
+
+
+def test_dark_frame_with_flames_is_kept_and_salient():
+    frame = np.zeros((360, 640, 3), dtype=np.uint8)
+    frame[150:210, 280:360] = (0, 140, 255)  # orange, BGR
+
+    assessment, grey = FrameTriage().assess_frame(frame)
+
+    assert assessment["usable"]
+    assert assessment["salient"]
+    assert grey is not None
+
+
+def test_black_frame_is_dropped_as_dark():
+    assessment, grey = FrameTriage().assess_frame(np.zeros((360, 640, 3), dtype=np.uint8))
+
+    assert assessment["reason"] == "dark"
+    assert grey is None
+
+
+def test_night_scene_lit_in_one_corner_is_not_dark():
+    rng = np.random.default_rng(0)
+    grey = rng.integers(0, 12, (360, 640), dtype=np.uint8)
+    # A streetlit area on a tenth of the frame keeps the mean below the brightness threshold
+    grey[:120, :200] = rng.integers(60, 200, (120, 200), dtype=np.uint8)
+    frame = np.dstack([grey] * 3)
+
+    assessment, _ = FrameTriage().assess_frame(frame)
+
+    assert assessment["hot_fraction"] == 0
+    assert assessment["usable"]
@@ -0,0 +1,67 @@
+import threading
+import time
+
+from app.services.cache_service import IncidentFeedCache
+
+
+def test_hit_after_load_and_etag_follows_content():
+    cache = IncidentFeedCache(max_entries=4, ttl=60)
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return {'incidents': [{'incident_id': 'a'}]}
+
+    value, etag = cache.get_or_load('page', loader)
+
+    assert cache.get_or_load('page', loader) == (value, etag)
+    assert cache.peek_etag('page') == etag == IncidentFeedCache.make_etag(value)
+    assert len(loads) == 1
+    assert cache.stats()['hits'] == 2 and cache.stats()['misses'] == 1
+
+
+def test_invalidate_drops_every_page():
+    cache = IncidentFeedCache(max_entries=4, ttl=60)
+    cache.get_or_load('first', lambda: 1)
+    cache.get_or_load('second', lambda: 2)
+
+    cache.invalidate()
+
+    assert cache.peek_etag('first') is None and cache.peek_etag('second') is None
+    assert cache.get_or_load('first', lambda: 3)[0] == 3
+    assert cache.stats()['invalidations'] == 1
+
+
+def test_load_racing_an_invalidation_is_returned_but_not_stored():
+    cache = IncidentFeedCache(max_entries=4, ttl=60)
+    loading, invalidated = threading.Event(), threading.Event()
+
+    def stale_loader():
+        loading.set()
+        invalidated.wait(5)
+        return 'stale'
+
+    result = []
+    reader = threading.Thread(target=lambda: result.append(cache.get_or_load('page', stale_loader)))
+    reader.start()
+    loading.wait(5)
+    cache.invalidate()
+    invalidated.set()
+    reader.join(5)
+
+    assert result[0][0] == 'stale'
+    assert cache.peek_etag('page') is None
+    assert cache.get_or_load('page', lambda: 'fresh')[0] == 'fresh'
+
+
+def test_expired_and_evicted_pages_are_reloaded():
+    cache = IncidentFeedCache(max_entries=2, ttl=60)
+    for key in ('a', 'b', 'c'):
+        cache.get_or_load(key, lambda: key)
+
+    assert cache.peek_etag('a') is None and cache.stats()['entries'] == 2
+
+    short = IncidentFeedCache(max_entries=2, ttl=0.001)
+    short.get_or_load('a', lambda: 1)
+    time.sleep(0.01)
+    assert short.get_or_load('a', lambda: 2)[0] == 2
@@ -0,0 +1,143 @@
+import uuid
+
+import pytest
+
+from app.services import dynamodb_service
+from app.services.dynamodb_service import DynamoDBService
+
+
+@pytest.fixture
+def service(aws):
+    service = DynamoDBService()
+    service.table_name = f"TestIncidents-{uuid.uuid4().hex[:8]}"
+    service.write_mode = 'direct'
+    service.ensure_table()
+    yield service
+    service.table.delete()
+
+
+@pytest.fixture
+def queries(service):
+    """Number of Query calls made so far, as a one-element list"""
+    count = [0]
+
+    def counter(**kwargs):
+        count[0] += 1
+
+    events = service.dynamodb.meta.client.meta.events
+    events.register('before-call.dynamodb.Query', counter)
+    yield count
+    events.unregister('before-call.dynamodb.Query', counter)
+
+
+def save(service, timestamp, report='Two vehicles collided', services=None, notes=''):
+    return service.save_incident({
+        'timestamp': timestamp,
+        'incidentReport': report,
+        'selectedServices': services or {'police': True, 'ambulance': False, 'fire': False},
+        'notes': notes,
+    })['incident_id']
+
+
+def walk(service, /, **params):
+    """Every page of a query: [[incident ids]]"""
+    pages, token = [], None
+    while True:
+        items, token = service.query_incidents(page_token=token, **params)
+        pages.append([item['incident_id'] for item in items])
+        if token is None:
+            return pages
+
+
+def test_empty_table_makes_no_queries(service, queries):
+    assert service.query_incidents() == ([], None)
+    assert queries[0] == 0
+
+
+def test_first_page_starts_at_the_newest_month_with_incidents(service, queries):
+    ids = [save(service, f"2023-05-0{day}T10:00:00") for day in range(1, 4)]
+
+    items, token = service.query_incidents()
+
+    assert [item['incident_id'] for item in items] == ids[::-1]
+    assert token is None
+    # One month, one query per shard, instead of a walk from today back to INCIDENT_TIMELINE_START
+    assert queries[0] == dynamodb_service.INCIDENT_BUCKET_SHARDS
+
+
+def test_a_page_visits_at_most_max_buckets(service, queries, monkeypatch):
+    monkeypatch.setattr(dynamodb_service, 'INCIDENT_MAX_BUCKETS', 3)
+    old = save(service, '2021-01-15T10:00:00')
+    new = save(service, '2022-06-15T10:00:00')
+
+    pages = walk(service)
+
+    assert pages[0] == [new]
+    assert [incident_id for page in pages for incident_id in page] == [new, old]
+    # 18 months apart: every page but the last stops after three buckets and hands back a token
+    assert len(pages) == 6
+    assert queries[0] == 18 * dynamodb_service.INCIDENT_BUCKET_SHARDS
+
+
+def test_range_is_not_listed_as_an_incident(service):
+    incident_id = save(service, '2024-02-01T08:00:00')
+
+    assert [item['incident_id'] for item in service.get_all_incidents()] == [incident_id]
+
+
+def test_pages_cover_every_incident_once_newest_first(service):
+    ids = [save(service, f"2024-{month:02d}-{day:02d}T10:00:00") for month in (1, 2, 3) for day in range(1, 8)]
+
+    pages = walk(service, limit=4)
+
+    assert [len(page) for page in pages] == [4, 4, 4, 4, 4, 1]
+    assert [incident_id for page in pages for incident_id in page] == ids[::-1]
+
+
+def test_filters_apply_across_pages(service):
+    fire = {'police': False, 'ambulance': False, 'fire': True}
+    matching = []
+    for day in range(1, 10):
+        if day % 3 == 0:
+            matching.append(save(service, f"2024-05-{day:02d}T10:00:00", report='Car on fire', services=fire))
+        else:
+            save(service, f"2024-05-{day:02d}T10:00:00", notes='minor dent')
+
+    for params in ({'severity': 'high'}, {'service': 'fire'}, {'keyword': 'ON FIRE'}):
+        pages = walk(service, limit=2, **params)
+        assert [incident_id for page in pages for incident_id in page] == matching[::-1], params
+    assert walk(service, keyword='dent', limit=50) == [[
+        item['incident_id'] for item in service.get_all_incidents() if item['notes'] == 'minor dent'
+    ]]
+
+
+def test_since_returns_only_later_incidents(service):
+    save(service, '2024-04-30T23:00:00')
+    at = save(service, '2024-05-02T08:00:00')
+    later = [save(service, '2024-05-02T08:00:01'), save(service, '2024-06-01T00:00:00')]
+
+    items, token = service.query_incidents(since='2024-05-02T08:00:00')
+
+    assert [item['incident_id'] for item in items] == later[::-1]
+    assert at not in [item['incident_id'] for item in items] and token is None
+
+
+def test_page_token_round_trip_and_tampering(service):
+    ids = [save(service, f"2024-07-{day:02d}T10:00:00") for day in range(1, 4)]
+
+    first, token = service.query_incidents(limit=2)
+    position = dynamodb_service.decode_page_token(token)
+    rest, end = service.query_incidents(limit=2, page_token=dynamodb_service.encode_page_token(position))
+
+    assert position['bucket'] == '2024-07'
+    assert [item['incident_id'] for item in first + rest] == ids[::-1] and end is None
+    for bad in ('not base64!', dynamodb_service.encode_page_token({'bucket': 'July', 'after': ''}),
+                dynamodb_service.encode_page_token({'incident_id': 'x'})):
+        with pytest.raises(dynamodb_service.InvalidPageTokenError):
+            service.query_incidents(page_token=bad)
+
+
+def test_unknown_filters_are_refused(service):
+    for params in ({'service': 'coastguard'}, {'severity': 'low'}):
+        with pytest.raises(ValueError):
+            service.query_incidents(**params)
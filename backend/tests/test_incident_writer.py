@@ -0,0 +1,158 @@
+import json
+import time
+import uuid
+from decimal import Decimal
+
+import pytest
+from botocore.exceptions import ClientError
+
+from app.services import incident_writer
+from app.services.dynamodb_service import DynamoDBService
+from app.services.incident_writer import IncidentJournal, WriteBehindBuffer
+
+
+@pytest.fixture
+def service(aws, tmp_path):
+    service = DynamoDBService()
+    service.table_name = f"TestIncidents-{uuid.uuid4().hex[:8]}"
+    service.ensure_table()
+    service._writer = WriteBehindBuffer(
+        service.dynamodb, service.table_name, journal=IncidentJournal(str(tmp_path / 'writes.journal')),
+        flush_interval=0.1, on_written=service._on_written
+    )
+    service.start()
+    yield service
+    service.close()
+    service.table.delete()
+
+
+def incident(**overrides):
+    return {
+        'timestamp': '2024-11-20T10:00:00',
+        'incidentReport': 'Two vehicles collided',
+        'selectedServices': ['police'],
+        'notes': 'test',
+        **overrides,
+    }
+
+
+def wait_for_item(service, incident_id, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if 'Item' in service.table.get_item(Key={'incident_id': incident_id}):
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_single_save_is_written_within_flush_interval(service):
+    incident_id = service.save_incident(incident())['incident_id']
+
+    # No flush(): the writer has to pick up a lone item by itself
+    assert wait_for_item(service, incident_id, service.writer.flush_interval + 0.5)
+
+
+def test_floats_are_stored_as_decimals(service):
+    incident_id = service.save_incident(incident(notes={'speed': 42.5}))['incident_id']
+
+    assert wait_for_item(service, incident_id, 1)
+    assert service.table.get_item(Key={'incident_id': incident_id})['Item']['notes'] == {'speed': Decimal('42.5')}
+
+
+def test_written_save_invalidates_the_feed(service):
+    service.save_incident(incident(timestamp='2024-11-19T10:00:00'))
+    service.writer.flush()
+    before, _ = service.list_incidents()
+
+    incident_id = service.save_incident(incident())['incident_id']
+    service.writer.flush()
+
+    page, _ = service.list_incidents()
+    assert [item['incident_id'] for item in page['incidents']] == [incident_id] + [
+        item['incident_id'] for item in before['incidents']
+    ]
+
+
+def test_unstorable_item_is_refused_by_the_caller(service):
+    with pytest.raises(ValueError):
+        service.save_incident(incident(notes=float('nan')))
+    assert service.writer.stats['accepted'] == 0
+
+
+class RejectingTable:
+    """Refuses batches holding a 'bad' incident the way DynamoDB refuses an invalid item"""
+
+    def __init__(self, dynamodb):
+        self.dynamodb = dynamodb
+
+    def batch_write_item(self, RequestItems):
+        (table_name, requests), = RequestItems.items()
+        if any(request['PutRequest']['Item'].get('notes') == 'bad' for request in requests):
+            raise ClientError({'Error': {'Code': 'ValidationException', 'Message': 'invalid item'}}, 'BatchWriteItem')
+        return self.dynamodb.batch_write_item(RequestItems=RequestItems)
+
+
+def test_rejected_item_is_dead_lettered_and_the_writer_keeps_going(service):
+    service.writer.dynamodb = RejectingTable(service.dynamodb)
+    bad = service.save_incident(incident(notes='bad'))['incident_id']
+    good = service.save_incident(incident())['incident_id']
+    assert service.writer.flush(timeout=5)
+
+    assert wait_for_item(service, good, 1)
+    later = service.save_incident(incident())['incident_id']
+    assert wait_for_item(service, later, 1)
+    with open(service.writer.journal.dead_letter_path) as f:
+        dead = [json.loads(line) for line in f]
+    assert [record['item']['incident_id'] for record in dead] == [bad]
+    # Dead-lettered items are not replayed on the next start
+    service.writer.journal.close()
+    assert service.writer.journal.open() == []
+
+
+class FailingTable:
+    """Fails every batch with ServiceUnavailable until `until` (time.monotonic())"""
+
+    def __init__(self, dynamodb, until):
+        self.dynamodb = dynamodb
+        self.until = until
+        self.failures = 0
+
+    def batch_write_item(self, RequestItems):
+        if time.monotonic() < self.until:
+            self.failures += 1
+            raise ClientError({'Error': {'Code': 'ServiceUnavailable', 'Message': 'try again'}}, 'BatchWriteItem')
+        return self.dynamodb.batch_write_item(RequestItems=RequestItems)
+
+
+def test_outage_longer_than_the_retries_loses_nothing(service, monkeypatch):
+    monkeypatch.setattr(incident_writer, 'WRITE_RETRY_BASE_DELAY', 0.01)
+    monkeypatch.setattr(incident_writer, 'WRITE_RETRY_MAX_DELAY', 0.05)
+    table = FailingTable(service.dynamodb, until=time.monotonic() + 1)
+    service.writer.dynamodb = table
+    ids = [service.save_incident(incident())['incident_id'] for _ in range(3)]
+
+    assert service.writer.flush(timeout=5)
+
+    # Far more failed attempts than WRITE_MAX_ATTEMPTS, and still every incident got in
+    assert table.failures > 3 * incident_writer.WRITE_MAX_ATTEMPTS
+    assert all(wait_for_item(service, incident_id, 1) for incident_id in ids)
+    assert service.writer.stats['dead_lettered'] == 0
+    assert service.writer.stats['requeued'] > 0
+
+
+def test_journal_compacts_up_to_the_oldest_outstanding_put(tmp_path, monkeypatch):
+    monkeypatch.setattr(incident_writer, 'INCIDENT_JOURNAL_COMPACT_BYTES', 4096)
+    journal = IncidentJournal(str(tmp_path / 'writes.journal'), fsync=False)
+    journal.open()
+    # Steady traffic: something is always outstanding, so the file never empties out
+    previous = None
+    for i in range(500):
+        journal.append_put({'incident_id': f"incident-{i}", 'notes': 'x' * 100})
+        if previous is not None:
+            journal.append_done([previous])
+        previous = f"incident-{i}"
+    journal.close()
+
+    assert (tmp_path / 'writes.journal').stat().st_size < 2 * 4096
+    assert [item['incident_id'] for item in journal.open()] == ['incident-499']
+    journal.close()
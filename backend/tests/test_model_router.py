@@ -0,0 +1,22 @@
+from app.services.model_router import ModelRouter
+from benchmarks.fakes import FakeBedrockClient
+
+SMALL_TEXT = 'us.meta.llama3-2-3b-instruct-v1:0'
+MESSAGES = [{"role": "user", "content": [{"text": "Summarize the incident"}]}]
+
+
+def test_dispatch_summary_stays_on_the_small_model_with_routing_off():
+    router = ModelRouter(mode='off')
+    client = FakeBedrockClient(latency=0)
+
+    # Even for the most serious incident
+    router.converse(client, router.dispatch_tier(1.0), messages=MESSAGES)
+
+    assert client.calls_by_model == {SMALL_TEXT: 1}
+
+
+def test_tiered_dispatch_summary_follows_severity():
+    router = ModelRouter(mode='tiered', large_severity=0.5)
+
+    assert router.dispatch_tier(0.2) == 'text_small'
+    assert router.dispatch_tier(0.9) == 'text_large'
@@ -0,0 +1,132 @@
+import threading
+import time
+
+import pytest
+from botocore.exceptions import ClientError
+
+from app.services.rate_limiter import (
+    LANE_BATCH, LANE_INTERACTIVE, LANE_LIVE, BedrockRateLimiter, CircuitBreaker, CircuitOpenError,
+    RequestBudget, priority_lane,
+)
+
+MODEL = 'us.amazon.nova-lite-v1:0'
+
+
+def error(code):
+    return ClientError({'Error': {'Code': code, 'Message': code}}, 'Converse')
+
+
+def failing(*codes):
+    """Operation raising each of `codes` in turn, then answering; records its calls"""
+    calls = []
+
+    def operation(**kwargs):
+        calls.append(kwargs)
+        if len(calls) <= len(codes):
+            raise error(codes[len(calls) - 1])
+        return {'output': {}, 'usage': {'totalTokens': 10}}
+    operation.calls = calls
+    return operation
+
+
+def test_live_call_is_served_before_batch_calls_queued_earlier():
+    budget = RequestBudget(rpm=2, tpm=0, period=1)
+    assert budget.acquire(0) is not None and budget.acquire(0) is not None
+    order = []
+
+    def take(lane, name):
+        assert budget.acquire(0, lane, timeout=5) is not None
+        order.append(name)
+
+    batch = threading.Thread(target=take, args=(LANE_BATCH, 'batch'))
+    batch.start()
+    time.sleep(0.05)
+    live = threading.Thread(target=take, args=(LANE_LIVE, 'live'))
+    live.start()
+    batch.join(5)
+    live.join(5)
+
+    assert order == ['live', 'batch']
+
+
+def test_batch_lane_leaves_its_reserve_to_other_lanes():
+    budget = RequestBudget(rpm=10, tpm=0, period=60)
+    for _ in range(8):
+        budget.acquire(0, LANE_INTERACTIVE)
+
+    # Two requests left, both inside the 20% a batch call may not touch
+    assert budget.acquire(0, LANE_BATCH, timeout=0.05) is None
+    assert budget.acquire(0, LANE_LIVE, timeout=0.05) is not None
+
+
+def test_breaker_opens_half_opens_and_closes():
+    breaker = CircuitBreaker(failure_threshold=3, reset_seconds=0.05)
+    for _ in range(3):
+        assert breaker.state == 'closed'
+        breaker.before_call(MODEL)
+        breaker.record_failure()
+
+    assert breaker.state == 'open' and breaker.opened == 1
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call(MODEL)
+
+    time.sleep(0.06)
+    assert breaker.state == 'half_open'
+    breaker.before_call(MODEL)
+    # Only one trial call at a time
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call(MODEL)
+    breaker.record_success()
+    assert breaker.state == 'closed'
+    breaker.before_call(MODEL)
+
+
+def test_failed_trial_opens_the_breaker_again():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=0.05)
+    breaker.record_failure()
+    breaker.record_failure()
+    time.sleep(0.06)
+
+    breaker.before_call(MODEL)
+    breaker.record_failure()
+
+    assert breaker.state == 'open' and breaker.opened == 2
+
+
+def test_throttled_call_is_retried_with_growing_jittered_delays():
+    sleeps = []
+    limiter = BedrockRateLimiter(rpm=0, tpm=0, retry_base=0.1, retry_cap=1, sleep=sleeps.append)
+    operation = failing('ThrottlingException', 'ServiceUnavailableException')
+
+    response = limiter.call(MODEL, operation, messages=[])
+
+    assert response['usage']['totalTokens'] == 10
+    assert len(operation.calls) == 3 and all(call['modelId'] == MODEL for call in operation.calls)
+    assert len(sleeps) == 2 and all(0.1 <= delay <= 1 for delay in sleeps)
+    stats = limiter.stats()['models'][MODEL]
+    assert (stats['retries'], stats['throttled'], stats['circuit']) == (2, 1, 'closed')
+
+
+def test_bad_request_is_not_retried_and_does_not_trip_the_breaker():
+    limiter = BedrockRateLimiter(rpm=0, tpm=0, failure_threshold=1, sleep=lambda delay: None)
+    operation = failing('ValidationException')
+
+    with pytest.raises(ClientError):
+        limiter.call(MODEL, operation, messages=[])
+
+    assert len(operation.calls) == 1
+    assert limiter.breaker(MODEL).state == 'closed'
+
+
+def test_open_circuit_fails_fast_without_calling_the_model():
+    limiter = BedrockRateLimiter(rpm=0, tpm=0, max_attempts=2, failure_threshold=2, reset_seconds=60,
+                                 sleep=lambda delay: None)
+    with pytest.raises(ClientError):
+        limiter.call(MODEL, failing('ThrottlingException', 'ThrottlingException'), messages=[])
+
+    operation = failing()
+    with priority_lane(LANE_LIVE), pytest.raises(CircuitOpenError):
+        limiter.call(MODEL, operation, messages=[])
+
+    assert operation.calls == []
+    assert limiter.stats()['models'][MODEL]['circuit_rejected'] == 1
@@ -0,0 +1,105 @@
+import os
+import uuid
+
+import numpy as np
+import pytest
+
+from app.services import s3_service
+from app.services.s3_service import S3Service
+from app.utils.mp4_index import MP4IndexError, merge_ranges, parse_video_track, scan_top_level_boxes
+from app.utils.video_utils import open_video
+from benchmarks.fakes import make_test_video
+
+WANTED = [10, 150, 290]
+
+
+@pytest.fixture(scope='module')
+def video_path():
+    path = make_test_video(640, 480, seconds=10)
+    yield path
+    os.remove(path)
+
+
+@pytest.fixture(scope='module')
+def bucket(aws):
+    service = S3Service()
+    service.client.create_bucket(
+        Bucket=service.bucket_name, CreateBucketConfiguration={'LocationConstraint': service.region}
+    )
+    return service.bucket_name
+
+
+@pytest.fixture
+def service(bucket, video_path):
+    service = S3Service()
+    service.key = f"videos/{uuid.uuid4().hex}.mp4"
+    service.client.upload_file(video_path, service.bucket_name, service.key)
+    return service
+
+
+def index_of(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    read = lambda start, end: data[start:end + 1]
+    boxes = scan_top_level_boxes(read, len(data))
+    _, offset, size, _ = next(box for box in boxes if box[0] == b'moov')
+    return parse_video_track(data[offset:offset + size]), len(data)
+
+
+def test_index_locates_every_sample(video_path):
+    index, size = index_of(video_path)
+
+    assert index.sample_count == 300
+    assert index.fps == pytest.approx(30)
+    assert all(0 < offset and offset + length <= size for offset, length in zip(index.offsets, index.sizes))
+    # Each frame's range starts at a keyframe and covers the frame itself
+    for wanted, (start, end) in zip(WANTED, index.byte_ranges_for(WANTED)):
+        assert start == index.offsets[index.sync_sample_before(max(0, wanted - 16))]
+        assert start <= index.offsets[wanted] and index.offsets[wanted] + index.sizes[wanted] - 1 <= end
+
+
+def test_non_mp4_is_refused():
+    with pytest.raises(MP4IndexError):
+        parse_video_track(b'\x00\x00\x00\x10moov' + b'\x00' * 8)
+    with pytest.raises(MP4IndexError):
+        scan_top_level_boxes(lambda start, end: b'\x00\x00\x00\x04', 64, head=b'\x00\x00\x00\x04junk')
+
+
+def test_merge_ranges_joins_overlapping_and_close_ranges():
+    assert merge_ranges([(50, 60), (0, 10), (12, 20), (100, 120)], max_gap=1) == [(0, 20), (50, 60), (100, 120)]
+
+
+def test_ranged_fetch_decodes_the_same_frames_as_a_full_download(service, video_path, tmp_path):
+    ready = []
+    path = str(tmp_path / 'ranged.mp4')
+
+    stats = service.fetch_video(service.key, path, lambda total, fps: WANTED,
+                                on_ready=lambda indices, _: ready.extend(indices or []))
+
+    assert stats['mode'] == 'ranged'
+    assert stats['bytes_transferred'] < stats['object_size'] == os.path.getsize(video_path)
+    assert sorted(ready) == WANTED
+    with open_video(path) as ranged, open_video(video_path) as full:
+        for (_, expected), (_, actual) in zip(full.read_frames(WANTED), ranged.read_frames(WANTED)):
+            assert np.array_equal(expected, actual)
+
+
+def test_unindexable_object_falls_back_to_a_full_download(service, tmp_path):
+    service.client.put_object(Bucket=service.bucket_name, Key=service.key, Body=b'not a video' * 100)
+    path = str(tmp_path / 'full.mp4')
+
+    stats = service.fetch_video(service.key, path, lambda total, fps: WANTED)
+
+    assert stats['mode'] == 'full'
+    assert os.path.getsize(path) == stats['object_size'] == 1100
+
+
+def test_full_mode_downloads_everything(service, video_path, tmp_path, monkeypatch):
+    monkeypatch.setattr(s3_service, 'S3_DOWNLOAD_MODE', 'full')
+    path = str(tmp_path / 'full.mp4')
+
+    stats = service.fetch_video(service.key, path, lambda total, fps: WANTED)
+
+    assert stats['mode'] == 'full' and stats['requests'] == 1
+    with open(path, 'rb') as fetched, open(video_path, 'rb') as original:
+        assert fetched.read() == original.read()
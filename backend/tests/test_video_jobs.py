@@ -0,0 +1,59 @@
+import time
+
+import numpy as np
+
+from app.models.frame import ExtractedFrame
+from app.services.video_service import JOB_STATUS_COMPLETED, JobProgress, JobStore
+
+
+class CountingStore(JobStore):
+    """JobStore that counts progress writes"""
+
+    def __init__(self, db_path):
+        super().__init__(db_path)
+        self.writes = 0
+
+    def update(self, job_id, **fields):
+        self.writes += 'partial' in fields
+        super().update(job_id, **fields)
+
+
+def frames(count):
+    return [ExtractedFrame(i + 1, f"00:{i:02d}", np.zeros((48, 64, 3), dtype=np.uint8)) for i in range(count)]
+
+
+def test_progress_is_written_without_images_and_spaced_out(tmp_path):
+    store = CountingStore(str(tmp_path / 'jobs.db'))
+    job_id = store.create('videos/clip.mp4')
+    progress = JobProgress(store, job_id, interval=0.2)
+
+    progress.stage("analyzing")
+    for frame_data in frames(50):
+        progress.frame_extracted(frame_data)
+        progress.frame_result(frame_data, f"Frame {frame_data.id}")
+
+    # The stage, then the first change, then at most the trailing write once the interval is up
+    assert store.writes <= 3
+    time.sleep(0.3)
+    partial = store.get(job_id)["partial"]
+    assert partial["frames"][-1] == {"id": 50, "timestamp": "00:49"}
+    assert len(partial["observations"]) == 50
+
+    progress.finish(status=JOB_STATUS_COMPLETED, result={"frames": []})
+    job = store.get(job_id)
+    assert job["status"] == JOB_STATUS_COMPLETED and job["partial"]["stage"] == "done"
+
+
+def test_nothing_is_written_after_the_job_ends(tmp_path):
+    store = CountingStore(str(tmp_path / 'jobs.db'))
+    job_id = store.create('videos/clip.mp4')
+    progress = JobProgress(store, job_id, interval=0.1)
+    first, second = frames(2)
+
+    progress.frame_result(first, "Two cars")
+    progress.frame_result(second, "Smoke")
+    progress.cancel()
+    time.sleep(0.2)
+
+    assert store.writes == 1
+    assert store.get(job_id)["partial"]["observations"] == {"1": "Two cars"}
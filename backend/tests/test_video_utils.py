@@ -0,0 +1,31 @@
+import os
+
+import pytest
+
+from app.utils import video_utils
+from benchmarks.fakes import make_test_video
+
+
+@pytest.fixture
+def video_path():
+    path = make_test_video(160, 120, seconds=1)
+    yield path
+    os.remove(path)
+
+
+def test_opencv_is_the_default_decoder_even_with_pyav_installed(video_path, monkeypatch):
+    monkeypatch.setattr(video_utils, 'av', object())
+    with video_utils.open_video(video_path) as decoder:
+        assert isinstance(decoder, video_utils.OpenCVDecoder)
+
+
+def test_backend_missing_part_of_the_interface_cannot_be_opened(video_path):
+    class SequentialOnly(video_utils.VideoDecoder):
+        def iter_frames(self, stride=1, start=0, end=None):
+            return iter(())
+
+        def close(self):
+            pass
+
+    with pytest.raises(TypeError, match="keyframes, read_frames"):
+        SequentialOnly(video_path)
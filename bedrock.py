@@ -1,4 +1,11 @@
+"""Standalone check that Bedrock credentials work: one converse call, printed.
+
+Not used by the backend, whose calls go through ModelRouter and the shared
+BedrockRateLimiter (backend/app/services). Only the retry attempt count is
+shared, through BEDROCK_RETRY_ATTEMPTS.
+"""
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError
 import os
 from dotenv import load_dotenv
@@ -14,6 +21,8 @@ client = boto3.client(
     aws_access_key_id=access_key_id,
     aws_secret_access_key=secret_access_key,
     region_name="us-west-2",
+    # Throttled calls back off and retry, as many times as the backend's rate limiter would
+    config=Config(retries={"mode": "standard", "max_attempts": int(os.getenv("BEDROCK_RETRY_ATTEMPTS", "4"))}),
 )
 
 # The model ID for the model you want to use
@@ -6,10 +6,17 @@ export function PastIncidentsModal({ open, onOpenChange }) {
   const [incidents, setIncidents] = useState([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
+  const [nextPageToken, setNextPageToken] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   useEffect(() => {
     if (open) {
-      fetchPastIncidents();
+      // Reopening only asks for incidents newer than the ones already shown
+      if (incidents.length > 0) {
+        fetchNewIncidents();
+      } else {
+        fetchPastIncidents();
+      }
     }
   }, [open]);
 
@@ -20,6 +27,7 @@ export function PastIncidentsModal({ open, onOpenChange }) {
       if (!response.ok) throw new Error('Failed to fetch incidents');
       const data = await response.json();
       setIncidents(data.incidents);
+      setNextPageToken(data.nextPageToken);
     } catch (error) {
       console.error('Error fetching incidents:', error);
       setError(error.message);
@@ -28,6 +36,45 @@ export function PastIncidentsModal({ open, onOpenChange }) {
     }
   };
 
+  const fetchNewIncidents = async () => {
+    try {
+      const params = new URLSearchParams({ since: incidents[0].timestamp });
+      // The browser revalidates with If-None-Match and gets a bodyless 304 when nothing changed
+      const response = await fetch(`http://localhost:8000/api/past-incidents?${params}`);
+      if (!response.ok) throw new Error('Failed to fetch incidents');
+      const data = await response.json();
+      if (data.nextPageToken) {
+        // More than a page arrived since the last open; start over from the newest
+        fetchPastIncidents();
+        return;
+      }
+      setIncidents((previous) => {
+        const known = new Set(previous.map((incident) => incident.incident_id));
+        return [...data.incidents.filter((incident) => !known.has(incident.incident_id)), ...previous];
+      });
+    } catch (error) {
+      console.error('Error fetching incidents:', error);
+      setError(error.message);
+    }
+  };
+
+  const fetchMoreIncidents = async () => {
+    try {
+      setLoadingMore(true);
+      const params = new URLSearchParams({ pageToken: nextPageToken });
+      const response = await fetch(`http://localhost:8000/api/past-incidents?${params}`);
+      if (!response.ok) throw new Error('Failed to fetch incidents');
+      const data = await response.json();
+      setIncidents((previous) => [...previous, ...data.incidents]);
+      setNextPageToken(data.nextPageToken);
+    } catch (error) {
+      console.error('Error fetching incidents:', error);
+      setError(error.message);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   if (!open) return null;
 
   const renderAnalysis = (analysis) => {
@@ -140,6 +187,15 @@ export function PastIncidentsModal({ open, onOpenChange }) {
                   </div>
                 </div>
               ))}
+
+              {nextPageToken && (
+                <div className="flex justify-center">
+                  <Button variant="outline" onClick={fetchMoreIncidents} disabled={loadingMore}>
+                    {loadingMore && <Loader2 className="h-4 w-4 animate-spin mr-2" />}
+                    Load more
+                  </Button>
+                </div>
+              )}
             </div>
           )}
         </div>